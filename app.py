@@ -3,50 +3,218 @@
 import json
 import os
 import sys
+import threading
+import time
 from flask import Flask, request, Response, jsonify
 
 sys.stdout.reconfigure(encoding="utf-8")
 
-# Import generation logic from server
-from server import initialize_model, generate_story
+# Generation logic shared with server.py (without grpc, which this entry point doesn't need)
+import metrics
+import profiling
+from constraints import Constraints
+from detokenizer import Detokenizer
+from generator import (MODEL_STATE, REGISTRY, SCHEDULER, SESSIONS, STORY_POOL, load_in_background, load_status, open_session,
+                       predict_next, score_texts, session_chunks, wait_ready)
+from registry import ModelNotFound
+from sessions import SessionBusy, SessionNotFound
+from scheduler import DEFAULT_MAX_LENGTH, GENERATION_TIMEOUT, Deadline, Rejected, clamp_length
 
 app = Flask(__name__)
 
-# Token replacement: EOS->full stop, EOP->newline, EOT->full stop
-def format_output(text):
-    return (text
-        .replace("<EOS>", "۔")   # Urdu full stop
-        .replace("<EOP>", "\n")
-        .replace("<EOT>", "۔"))
+def token_text(token):
+    """Display text of a predicted token after the context: " word" starts a word, "piece" extends one"""
+    return Detokenizer(MODEL_STATE['word_start'], started=True).feed(token)
 
 @app.route("/")
 def health():
     return jsonify({"status": "ok", "service": "urdu-story-api"}), 200
 
+@app.route("/healthz")
+def liveness():
+    # Alive while the model loads; a failed startup load needs a restart
+    status = load_status()
+    return jsonify(status), 503 if status["status"] == "failed" else 200
+
+@app.route("/readyz")
+def readiness():
+    status = load_status()
+    return jsonify(status), 200 if status["status"] == "ready" else 503
+
+def not_ready():
+    """Wait (bounded by READY_TIMEOUT_SECONDS) for the startup load; a 503 response if it isn't done"""
+    if wait_ready():
+        return None
+    status = load_status()
+    return jsonify({**status, "error": status["error"] or "model still loading"}), 503, {"Retry-After": "1"}
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+@app.route("/stats")
+def stats():
+    return jsonify({**SCHEDULER.stats(), "sessions": SESSIONS.stats(), "story_pool": STORY_POOL.stats(),
+                    "models": REGISTRY.stats()}), 200
+
+@app.route("/admin/profiling", methods=["GET", "POST"])
+def admin_profiling():
+    """Global profiling switch; disabled unless ADMIN_TOKEN is set"""
+    token = os.environ.get("ADMIN_TOKEN")
+    if not token:
+        return jsonify({"error": "admin endpoints disabled (set ADMIN_TOKEN)"}), 404
+    if not profiling.authorized(request.headers.get(profiling.ADMIN_HEADER)):
+        return jsonify({"error": "forbidden"}), 403
+    if request.method == "POST":
+        try:
+            profiling.set_mode((request.get_json() or {}).get("mode", "off"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify({"mode": profiling.get_mode()}), 200
+
+@app.route("/predict", methods=["POST"])
+def predict():
+    error = not_ready()
+    if error is not None:
+        return error
+    data = request.get_json() or {}
+    try:
+        predictions, order = predict_next(data.get("context", ""), int(data.get("k", 10)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "predictions": [{"token": t, "text": token_text(t), "probability": p} for t, p in predictions],
+        "contextOrder": order,
+    }), 200
+
+@app.route("/score", methods=["POST"])
+def score():
+    error = not_ready()
+    if error is not None:
+        return error
+    data = request.get_json() or {}
+    texts = data.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+    try:
+        scores = score_texts(texts, data.get("format", "raw"), bool(data.get("perToken")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Rejected as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"scores": [{
+        "numTokens": s["num_tokens"], "logProb": s["log_prob"], "perplexity": s["perplexity"],
+        "oovTokens": s["oov_tokens"],
+        **({"tokens": s["tokens"], "tokenLogProbs": s["token_log_probs"]} if "tokens" in s else {}),
+    } for s in scores]}), 200
+
 @app.route("/generate", methods=["POST"])
 def generate():
+    started = time.perf_counter()
+    error = not_ready()
+    if error is not None:
+        return error
     data = request.get_json() or {}
     prefix = data.get("prefix", "")
-    max_length = int(data.get("maxLength", 500))
+    max_length = clamp_length(int(data.get("maxLength", DEFAULT_MAX_LENGTH)))
+    delta = bool(data.get("delta", False))
+    deadline = Deadline(GENERATION_TIMEOUT)
+    profile = profiling.start("http.generate", request.headers.get(profiling.HEADER),
+                              admin=profiling.authorized(request.headers.get(profiling.ADMIN_HEADER)))
+
+    # sessionId continues a story: prefix is only the new text, maxLength the new tokens
+    try:
+        c = data.get("constraints") or {}
+        constraints = Constraints(c.get("bannedTokens") or (), c.get("bannedWords") or (), c.get("endings") or (),
+                                  c.get("minTokens") or 0, c.get("maxTokens") or 0) if c else None
+        session, loaded, decoder = open_session(data.get("sessionId") or "", data.get("model") or "", constraints)
+    except (SessionNotFound, ModelNotFound) as e:
+        metrics.REQUESTS.inc("http", "not_found")
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        metrics.REQUESTS.inc("http", "invalid")
+        return jsonify({"error": str(e)}), 400
+    except SessionBusy as e:
+        metrics.REQUESTS.inc("http", "busy")
+        return jsonify({"error": str(e)}), 409
+
+    # Admit before streaming so overload is a fast 429, not a stalled stream
+    try:
+        SCHEDULER.acquire(deadline)
+    except Rejected as e:
+        SESSIONS.checkin(session)
+        metrics.REQUESTS.inc("http", "rejected")
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+    if profile is not None:
+        profile.lap("admission")
+
+    checked_in = threading.Event()
+    def checkin():
+        # Once per request: at the end of the stream (so an immediate continuation finds the
+        # session free), or on close if the stream never ran
+        if not checked_in.is_set():
+            checked_in.set()
+            SESSIONS.checkin(session)
 
     def stream():
-        for chunk in generate_story(prefix=prefix, max_length=max_length):
-            formatted = format_output(chunk)
-            is_final = chunk.endswith("<EOT>") or len(chunk.split()) >= max_length
-            payload = json.dumps({"chunk": formatted, "isFinal": is_final, "numTokens": len(chunk.split())})
-            yield f"data: {payload}\n\n"
-            if is_final:
-                break
-
-    return Response(
+        # Closed by the server when the client disconnects → generation stops at the next token
+        if profile is not None:
+            profile.start_sampling()  # the streaming thread, which runs the generation
+        try:
+            for chunk, num_tokens, is_final in session_chunks(session, prefix, max_length, delta,
+                                                              deadline.expired, started, profile, loaded.state,
+                                                              decoder=decoder):
+                if profile is not None:
+                    profile.lap()
+                payload = json.dumps({"chunk": chunk, "isFinal": is_final, "numTokens": num_tokens,
+                                      "sessionId": session.id, "model": loaded.name})
+                event = f"data: {payload}\n\n"
+                if profile is not None:
+                    profile.lap("format")
+                if is_final:
+                    checkin()  # before the client sees the end, so it can continue right away
+                metrics.STREAM_MESSAGES.inc("http")
+                yield event
+                if profile is not None:
+                    profile.lap("send")
+                if is_final:
+                    break
+            else:
+                if deadline.expired():
+                    SCHEDULER.cancelled()
+                    metrics.REQUESTS.inc("http", "deadline_exceeded")
+                    error = {"error": "generation deadline exceeded", "code": "DEADLINE_EXCEEDED", "isFinal": True}
+                    yield f"data: {json.dumps(error)}\n\n"
+                    return
+            metrics.REQUESTS.inc("http", "ok")
+            if profile is not None:
+                yield f"event: profile\ndata: {json.dumps(profile.finish())}\n\n"
+        except GeneratorExit:
+            SCHEDULER.cancelled()
+            metrics.REQUESTS.inc("http", "cancelled")
+            raise
+        except Exception:
+            metrics.REQUESTS.inc("http", "error")
+            yield f"data: {json.dumps({'error': 'generation failed', 'code': 'INTERNAL', 'isFinal': True})}\n\n"
+            raise
+        finally:
+            checkin()
+            if profile is not None:
+                profile.finish()
+
+    response = Response(
         stream(),
         mimetype="text/event-stream",
         headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
     )
+    # Release on close, which also runs if the stream is never started
+    response.call_on_close(SCHEDULER.release)
+    response.call_on_close(checkin)
+    return response
 
 if __name__ == "__main__":
-    if not initialize_model():
-        sys.exit(1)
+    # Bind right away; requests wait for the model (up to READY_TIMEOUT_SECONDS) while it loads
+    load_in_background(on_ready=STORY_POOL.start)
     port = int(os.environ.get("PORT", 50051))
     print(f"[✓] HTTP API listening on port {port}")
     app.run(host="0.0.0.0", port=port)
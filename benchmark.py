@@ -0,0 +1,237 @@
+"""Stage-level microbenchmarks for the offline pipeline and the generation step
+
+Each stage runs on the real corpus (1x) and on synthetic scaled corpora:
+  - clean:            story_to_line over the raw CSV stories, replicated
+  - bpe_learn/encode: word frequencies scaled by N, plus novel words built from
+                      halves of existing words so the vocabulary grows ~sqrt(N)
+                      (Heaps' law) instead of staying fixed
+  - count/tune/save/load/generate: token lines resampled with replacement to N x
+
+Wall time (best of --repeat at 1x, one run at larger scales), peak traced
+memory (separate tracemalloc pass) and throughput go to a JSON results file.
+With --baseline, results are compared and the exit status is 1 when any stage
+is slower or larger than baseline * (1 + threshold).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import corpus_format
+import generator
+import model
+import preprocess
+import tokenizer
+import train_model
+
+RESULTS = Path("benchmark_results.json")
+SCALES = (1, 10, 100)
+NOVEL_EXPONENT = 0.5
+GENERATE_TOKENS = 200
+
+class Workload:
+    """Inputs at one scale, plus products of earlier stages that later ones consume"""
+
+    def __init__(self, scale, seed=0):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.tmp = Path(tempfile.mkdtemp(prefix="bench-"))
+        self.merges = self.counts = self.lambdas = self.model = None
+
+    def contents(self):
+        stories = [c for p in preprocess.IN_FILES if p.exists() for c in preprocess.read_contents(p)]
+        return stories * self.scale
+
+    def word_freq(self):
+        base = Counter(w for line in tokenizer.load_lines(tokenizer.CORPUS) for w in line.split())
+        freq = Counter({w: n * self.scale for w, n in base.items()})
+        words, counts = list(base), list(base.values())
+        novel = int(len(base) * (self.scale ** NOVEL_EXPONENT - 1))
+        while novel > 0:
+            a, b = self.rng.choice(words), self.rng.choice(words)
+            word = a[:len(a) // 2 + 1] + b[len(b) // 2:]
+            if word not in freq and not word.startswith("<"):
+                freq[word] = self.rng.choice(counts)
+                novel -= 1
+        return freq
+
+    def token_lines(self):
+        corpus = corpus_format.TokenCorpus()
+        lines = list(corpus.lines())
+        n_dev = int(len(corpus) * train_model.DEV_FRACTION)
+        dev = [ids.tolist() for ids in lines[:n_dev]]
+        train = lines[n_dev:]
+        dev = dev + [self.rng.choice(dev) for _ in range(len(dev) * (self.scale - 1))]
+        train = train + [self.rng.choice(train) for _ in range(len(train) * (self.scale - 1))]
+        return corpus.vocab, dev, train
+
+    def serving_state(self):
+        """Serving state of the saved model, built as the servers build it (with the corpus's BPE merges)"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            return generator.load_state(self.tmp / "model.pkl", tokenizer.MERGES)[0]
+
+def _clean(w, data):
+    for content in data:
+        preprocess.story_to_line(content)
+    return sum(len(c) for c in data)
+
+def _bpe_learn(w, freq):
+    w.merges = tokenizer.learn_merges(freq, tokenizer.VOCAB_SIZE, tokenizer.WORD_START)
+    return sum(freq.values())
+
+def _encode(w, freq):
+    for word in freq:
+        tokenizer.encode(word, w.merges, tokenizer.WORD_START)
+    return len(freq)
+
+def _count(w, data):
+    vocab, dev, train = data
+    w.counts = train_model.count_ngrams(train, len(vocab))
+    return sum(len(ids) for ids in train)
+
+def _tune(w, data):
+    vocab, dev, train = data
+    w.lambdas = train_model.tune_lambdas(dev, *w.counts)
+    return sum(len(line) for line in dev)
+
+def _save(w, data):
+    vocab = data[0]
+    uni, bi, tri = train_model.to_strings(vocab, *w.counts)
+    model.save_model(uni, bi, tri, w.lambdas, set(uni), path=w.tmp / "model.pkl")
+    return (w.tmp / "model.pkl").stat().st_size
+
+def _load(w, data):
+    w.model = model.load_model(w.tmp / "model.pkl")
+    return (w.tmp / "model.pkl").stat().st_size
+
+def _generate(w, state):
+    random.seed(0)
+    return sum(1 for _ in generator.generate_story(max_length=GENERATE_TOKENS, state=state))
+
+# (name, input builder, run, throughput unit); stages run in order and may use earlier products
+STAGES = [
+    ("clean", Workload.contents, _clean, "chars"),
+    ("bpe_learn", Workload.word_freq, _bpe_learn, "words"),
+    ("encode", Workload.word_freq, _encode, "distinct words"),
+    ("count_ngrams", Workload.token_lines, _count, "tokens"),
+    ("tune_lambdas", Workload.token_lines, _tune, "tokens"),
+    ("save_model", Workload.token_lines, _save, "bytes"),
+    ("load_model", Workload.token_lines, _load, "bytes"),
+    ("generate_step", Workload.serving_state, _generate, "tokens"),
+]
+# Earlier stages whose products a stage needs; run untimed when only the later stage is selected
+DEPENDS = {"encode": ["bpe_learn"], "tune_lambdas": ["count_ngrams"], "save_model": ["tune_lambdas"],
+           "load_model": ["save_model"], "generate_step": ["load_model"]}
+
+def _needed(stages):
+    needed, todo = set(), list(stages)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(DEPENDS.get(name, []))
+    return needed
+
+def measure(fn, w, data, repeat, memory):
+    """(best wall seconds, peak traced bytes or None, units processed)"""
+    best = float("inf")
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            units = fn(w, data)
+            best = min(best, time.perf_counter() - start)
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                fn(w, data)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return best, peak, units
+
+def run(scales=SCALES, stages=None, repeat=3, memory=True, seed=0):
+    """Benchmark the selected stages at each scale; returns a list of result dicts"""
+    results = []
+    needed = _needed(stages) if stages else None
+    for scale in scales:
+        w = Workload(scale, seed)
+        built = {}
+        for name, build, fn, unit in STAGES:
+            if needed is not None and name not in needed:
+                continue
+            if build not in built:
+                built[build] = build(w)
+            if name not in (stages or [name]):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fn(w, built[build])
+                continue
+            seconds, peak, units = measure(fn, w, built[build], repeat if scale == 1 else 1, memory)
+            results.append({
+                "stage": name, "scale": scale, "seconds": round(seconds, 6), "peak_bytes": peak,
+                "units": units, "unit": unit, "throughput": round(units / seconds, 3) if seconds else None,
+            })
+            r = results[-1]
+            mem = f"{peak / 2**20:9.1f} MB" if peak is not None else "        -   "
+            print(f"[✓] {name:<14} {scale:>4}x {seconds:10.4f}s {mem} {r['throughput']:>14,.0f} {unit}/s")
+        shutil.rmtree(w.tmp, ignore_errors=True)
+    return results
+
+def compare(results, baseline, threshold):
+    """Regressions against a baseline results list as messages"""
+    base = {(r["stage"], r["scale"]): r for r in baseline}
+    failures = []
+    for r in results:
+        b = base.get((r["stage"], r["scale"]))
+        if b is None:
+            continue
+        if r["seconds"] > b["seconds"] * (1 + threshold):
+            failures.append(f"{r['stage']} {r['scale']}x: {r['seconds']:.4f}s vs baseline {b['seconds']:.4f}s "
+                            f"(+{r['seconds'] / b['seconds'] - 1:.0%})")
+        if r["peak_bytes"] and b.get("peak_bytes") and r["peak_bytes"] > b["peak_bytes"] * (1 + threshold):
+            failures.append(f"{r['stage']} {r['scale']}x: peak {r['peak_bytes'] / 2**20:.1f} MB vs baseline "
+                            f"{b['peak_bytes'] / 2**20:.1f} MB (+{r['peak_bytes'] / b['peak_bytes'] - 1:.0%})")
+    return failures
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages at several corpus scales")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES))
+    parser.add_argument("--stages", nargs="+", choices=[s[0] for s in STAGES], help="Subset of stages")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs at 1x (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", default=str(RESULTS))
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown/growth, e.g. 0.10 = 10%%")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"[*] Benchmarking at scales {args.scales}")
+    results = run(args.scales, args.stages, args.repeat, not args.no_memory, args.seed)
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[✓] Results → {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+        failures = compare(results, baseline, args.threshold)
+        for f in failures:
+            print(f"[✗] {f}")
+        if failures:
+            sys.exit(1)
+        print(f"[✓] No regressions beyond {args.threshold:.0%} against {args.baseline}")
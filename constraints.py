@@ -0,0 +1,258 @@
+"""Constrained decoding: banned tokens and words, allowed story endings, length bounds for <EOT>
+
+A request's Constraints are compiled once per model into boolean masks over
+the vocabulary and cached per model (CONSTRAINT_CACHE_SIZE ban lists, least
+recently used dropped), so a ban list shared by many requests costs nothing
+after the first. Each step masks generation's next-token weights
+(Scorer.next_weights, all tokens in one numpy expression) and samples from
+what is left:
+
+  banned_tokens: exact model tokens (a "▁"-marked word piece or a subword) never generated
+  banned_words:  words never completed, however the model splits them into
+                 pieces: a piece is blocked when it would turn the word so far
+                 into a banned word (one dict lookup per step). Longer words
+                 that begin with a banned word may be blocked too.
+  endings:       tokens <EOT> may follow (e.g. "<EOP>"); any token if empty
+  min_tokens:    no <EOT> before this many new tokens
+  max_tokens:    end with <EOT> within this many new tokens (with endings
+                 set, an ending token is forced first)
+
+Run directly to benchmark per-token latency with and without constraints.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+import metrics
+
+CACHE_SIZE = int(os.environ.get("CONSTRAINT_CACHE_SIZE", "256"))
+MAX_ENTRIES = int(os.environ.get("MAX_CONSTRAINT_ENTRIES", "10000"))
+MAX_WORD_PIECES = 32  # how far back to look for the start of the current word
+SPECIAL_TOKENS = {"<EOS>", "<EOP>", "<EOT>"}
+
+class Constraints:
+    """One request's constraints, before compilation
+
+    Raises:
+        ValueError: a banned word containing spaces, min_tokens > max_tokens
+    """
+
+    def __init__(self, banned_tokens=(), banned_words=(), endings=(), min_tokens=0, max_tokens=0):
+        self.banned_tokens = tuple(sorted({t for t in banned_tokens if t}))
+        self.banned_words = tuple(sorted({w.strip() for w in banned_words if w.strip()}))
+        self.endings = tuple(sorted({t for t in endings if t}))
+        self.min_tokens = max(0, int(min_tokens))
+        self.max_tokens = max(0, int(max_tokens))
+        if any(len(w.split()) > 1 for w in self.banned_words):
+            raise ValueError("banned words must be single words")
+        if self.max_tokens and self.min_tokens > self.max_tokens:
+            raise ValueError(f"min_tokens {self.min_tokens} > max_tokens {self.max_tokens}")
+        if len(self.banned_tokens) + len(self.banned_words) + len(self.endings) > MAX_ENTRIES:
+            raise ValueError(f"at most {MAX_ENTRIES} banned tokens, banned words and endings in total")
+
+    def __bool__(self):
+        return bool(self.banned_tokens or self.banned_words or self.endings or self.min_tokens or self.max_tokens)
+
+    def key(self):
+        """What compilation depends on (the length bounds are applied per step)"""
+        return self.banned_tokens, self.banned_words, self.endings
+
+class CompiledMasks:
+    """Constraints compiled against one model's vocabulary"""
+
+    def __init__(self, allowed, word_bans, ending):
+        self.allowed = allowed        # bool (V,): False for banned tokens and whole banned words
+        self.word_bans = word_bans    # word so far → IDs of pieces that would complete a banned word
+        self.ending = ending          # bool (V,): tokens <EOT> may follow; None for any
+
+def compile_masks(constraints, scorer):
+    """Masks for a scorer's vocabulary
+
+    Raises:
+        ValueError: a banned token or ending that is not a model token, or every token banned
+    """
+    ids, V, ws = scorer.ids, scorer.unk, scorer.word_start
+
+    def token_ids(tokens, what):
+        unknown = [t for t in tokens if t not in ids]
+        if unknown:
+            raise ValueError(f"unknown {what} token(s): {', '.join(map(repr, unknown[:5]))}")
+        return np.array([ids[t] for t in tokens], dtype=np.int64)
+
+    allowed = np.ones(V, dtype=bool)
+    allowed[token_ids(constraints.banned_tokens, "banned")] = False
+    word_bans = {}
+    for word in constraints.banned_words:
+        if ws + word in ids:  # the whole word as one piece (a model without markers: one token per piece)
+            allowed[ids[ws + word]] = False
+        if not ws:
+            continue
+        for k in range(len(word)):  # k = 0: the whole word as a piece after a bare "▁" or a special token
+            piece = word[k:]
+            if piece in ids:
+                word_bans.setdefault(word[:k], set()).add(ids[piece])
+    word_bans = {prefix: np.array(sorted(banned), dtype=np.int64) for prefix, banned in word_bans.items()}
+    ending = None
+    if constraints.endings:
+        ending = np.zeros(V, dtype=bool)
+        ending[token_ids(constraints.endings, "ending")] = True
+    if not allowed.any():
+        raise ValueError("constraints ban every token")
+    return CompiledMasks(allowed, word_bans, ending)
+
+_cache = weakref.WeakKeyDictionary()   # scorer → OrderedDict(key → CompiledMasks); dropped with the model
+_cache_lock = threading.Lock()
+
+def cached_masks(constraints, scorer):
+    """compile_masks, reusing the result for the same ban lists on the same model"""
+    key = constraints.key()
+    with _cache_lock:
+        cache = _cache.setdefault(scorer, OrderedDict())
+        masks = cache.get(key)
+        if masks is not None:
+            cache.move_to_end(key)
+    metrics.CACHE_REQUESTS.inc("constraints", "hit" if masks is not None else "miss")
+    if masks is None:
+        masks = compile_masks(constraints, scorer)
+        with _cache_lock:
+            cache[key] = masks
+            while len(cache) > CACHE_SIZE:
+                cache.popitem(last=False)
+    return masks
+
+def current_word(tokens, word_start):
+    """Text of the word being built at the end of `tokens` ("" after a special token)
+
+    The start of `tokens` counts as a word start; None if no start is within MAX_WORD_PIECES.
+    """
+    parts = []
+    for tok in reversed(tokens[-MAX_WORD_PIECES:]):
+        if tok in SPECIAL_TOKENS:
+            break
+        if tok.startswith(word_start):
+            parts.append(tok[len(word_start):])
+            break
+        parts.append(tok)
+    else:
+        if len(tokens) > MAX_WORD_PIECES:
+            return None
+    return "".join(reversed(parts))
+
+class Decoder:
+    """Samples next tokens under one request's compiled constraints"""
+
+    def __init__(self, constraints, scorer, masks=None):
+        self.scorer = scorer
+        self.masks = cached_masks(constraints, scorer) if masks is None else masks
+        self.min_tokens = constraints.min_tokens
+        self.max_tokens = constraints.max_tokens
+        self.eot = scorer.ids.get("<EOT>")
+
+    def budget(self, max_length):
+        """New tokens within which the story must end (0: no forced end)"""
+        return min(self.max_tokens, max_length) if self.max_tokens else 0
+
+    def mask(self, tokens, generated, budget=0):
+        """Tokens allowed next, after `generated` new tokens of `tokens`"""
+        masks = self.masks
+        m = masks.allowed
+        if masks.word_bans:
+            word = current_word(tokens, self.scorer.word_start) if tokens else ""
+            banned = masks.word_bans.get(word) if word is not None else None
+            if banned is not None:
+                m = m.copy()
+                m[banned] = False
+        eot = self.eot
+        if eot is None:
+            return m
+        prev = self.scorer.ids.get(tokens[-1]) if tokens else None
+        after_ending = masks.ending is None or (prev is not None and masks.ending[prev])
+        left = budget - generated if budget else None     # slots left, this one included
+        if left is not None and (left <= 1 or (left == 2 and masks.ending is not None and after_ending)):
+            m = np.zeros_like(m)
+            m[eot] = True
+            return m
+        if left == 2 and masks.ending is not None:
+            ending = m & masks.ending
+            if ending.any():
+                return ending
+        if m[eot] and (generated < self.min_tokens or not after_ending):
+            m = m.copy() if m is masks.allowed else m
+            m[eot] = False
+        return m
+
+    def sample(self, tokens, generated, rng, budget=0):
+        """Next token: generation's distribution restricted to the allowed tokens"""
+        scorer = self.scorer
+        m = self.mask(tokens, generated, budget)
+        if len(tokens) < 2:  # generation samples the first two tokens by unigram counts
+            w = scorer.uni[:scorer.unk]
+        else:
+            ids, unk = scorer.ids, scorer.unk
+            w = scorer.next_weights(ids.get(tokens[-2], unk), ids.get(tokens[-1], unk))
+        c = np.cumsum(np.where(m, w, 0.0))
+        if c[-1] <= 0:  # no allowed token has weight: uniform over the allowed ones
+            c = np.cumsum(m, dtype=np.float64)
+        i = int(np.searchsorted(c, rng.random() * c[-1], side="right"))
+        return scorer.vocab[min(i, len(c) - 1)]
+
+def _per_token(run):
+    t0 = time.perf_counter()
+    tokens = run()
+    return (time.perf_counter() - t0) / max(1, tokens) * 1e6, tokens
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Benchmark constrained vs unconstrained sampling")
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--banned-words", type=int, default=1000)
+    args = parser.parse_args()
+
+    import generator
+    import tokenizer
+    from detokenizer import Detokenizer
+    state, _ = generator.load_state()
+    scorer = state['scorer']
+    freq = Counter(w for line in tokenizer.load_lines() for w in line.split() if w not in tokenizer.SPECIAL)
+    words = [w for w, _ in freq.most_common(100 + args.banned_words)][100:]
+    pieces = [t for t in scorer.vocab if t not in SPECIAL_TOKENS][-50:]
+    heavy = Constraints(banned_tokens=pieces, banned_words=words, endings=["<EOP>"], min_tokens=50,
+                        max_tokens=300)
+
+    t0 = time.perf_counter()
+    masks = compile_masks(heavy, scorer)
+    compile_ms = (time.perf_counter() - t0) * 1e3
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        cached_masks(heavy, scorer)
+    cached_us = (time.perf_counter() - t0) * 1e3
+    print(f"[✓] Compiled {len(pieces)} banned tokens, {len(words)} banned words: {compile_ms:.1f} ms "
+          f"({len(masks.word_bans)} word prefixes); cached: {cached_us:.1f} µs per request")
+
+    def run(decoder=None):
+        rng, produced = random.Random(0), 0
+        while produced < args.tokens:
+            story = list(generator.generate_tokens([], 300, rng, metered=False, state=state, decoder=decoder))
+            produced += len(story)
+            if decoder is not None and decoder.max_tokens:
+                assert story[-1] == "<EOT>" and len(story) > decoder.min_tokens and story[-2] == "<EOP>"
+                assert not set(story) & set(pieces)
+                assert not set(Detokenizer(scorer.word_start).text(story).split()) & set(words)
+        return produced
+
+    loop, n = _per_token(run)
+    print(f"[*] Unconstrained (per-token dict loop):        {loop:7.1f} µs/token ({n} tokens)")
+    plain, n = _per_token(lambda: run(Decoder(Constraints(), scorer)))
+    print(f"[*] Vectorized sampling, no constraints:         {plain:7.1f} µs/token ({n} tokens)")
+    constrained, n = _per_token(lambda: run(Decoder(heavy, scorer)))
+    print(f"[*] Vectorized sampling, all constraints above: {constrained:7.1f} µs/token ({n} tokens)")
+    print(f"[*] Constraint overhead: {constrained - plain:+.1f} µs/token "
+          f"({(constrained - plain) / plain * 100:+.1f}% of vectorized sampling)")
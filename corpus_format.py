@@ -0,0 +1,122 @@
+"""Binary token-ID corpus format shared by tokenizer, trainer and evaluator
+
+Layout (little-endian):
+    magic "URTK" | version u32 | itemsize u32 | n_lines u64 | n_tokens u64 | vocab_len u64
+    vocab JSON (utf-8, list of tokens indexed by ID), zero-padded to 8 bytes
+    offsets uint64[n_lines + 1]  (line i is ids[offsets[i]:offsets[i + 1]])
+    ids uint16/uint32[n_tokens]
+"""
+
+import json
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"URTK"
+VERSION = 1
+HEADER = struct.Struct("<4sIIQQQ")
+TOKEN_CORPUS = Path("tokenized_corpus.bin")
+
+def _pad(n):
+    return (-n) % 8
+
+def write_token_corpus(path, token_lines, vocab):
+    """Write tokenized lines as a binary token-ID corpus
+
+    Args:
+        path: output file
+        token_lines: iterable of token lists
+        vocab: list of tokens, position = token ID
+    """
+    index = {tok: i for i, tok in enumerate(vocab)}
+    itemsize = 2 if len(vocab) <= 0xFFFF else 4
+    ids = array("H" if itemsize == 2 else "I")
+    offsets = array("Q", [0])
+    for tokens in token_lines:
+        ids.extend(index[t] for t in tokens)
+        offsets.append(len(ids))
+
+    vocab_bytes = json.dumps(list(vocab), ensure_ascii=False).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, itemsize, len(offsets) - 1, len(ids), len(vocab_bytes)))
+        f.write(vocab_bytes + b"\0" * _pad(len(vocab_bytes)))
+        offsets.tofile(f)
+        ids.tofile(f)
+
+class TokenCorpus:
+    """Read-only, memory-mapped view of a binary token-ID corpus"""
+
+    def __init__(self, path=TOKEN_CORPUS):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"Token corpus not found: {self.path}\nRun 'python tokenizer.py' first.")
+
+        with open(self.path, "rb") as f:
+            magic, version, itemsize, n_lines, n_tokens, vocab_len = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a token corpus (v{VERSION}): {self.path}")
+            self.vocab = json.loads(f.read(vocab_len).decode("utf-8"))
+
+        start = HEADER.size + vocab_len + _pad(vocab_len)
+        self.offsets = np.memmap(self.path, dtype="<u8", mode="r", offset=start, shape=(n_lines + 1,))
+        start += 8 * (n_lines + 1)
+        dtype = "<u2" if itemsize == 2 else "<u4"
+        self.ids = np.memmap(self.path, dtype=dtype, mode="r", offset=start, shape=(n_tokens,)) \
+            if n_tokens else np.zeros(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def line(self, i):
+        """Token IDs of line i (a view, no copy)"""
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def lines(self, start=0, stop=None):
+        """Iterate token-ID views of lines in [start, stop)"""
+        stop = len(self) if stop is None else stop
+        for i in range(start, stop):
+            yield self.line(i)
+
+    def decode(self, ids):
+        """Map token IDs back to token strings"""
+        return [self.vocab[i] for i in ids]
+
+def _compare(text_path, bin_path):
+    """Round-trip check and load time / memory for text vs binary corpus"""
+    import time
+    import tracemalloc
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with open(text_path, "r", encoding="utf-8") as f:
+        text_lines = [line.strip().split() for line in f if line.strip()]
+    text_time = time.perf_counter() - t0
+    text_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    corpus = TokenCorpus(bin_path)
+    n_tokens = sum(len(ids) for ids in corpus.lines())
+    bin_time = time.perf_counter() - t0
+    bin_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ok = len(corpus) == len(text_lines) and all(
+        corpus.decode(corpus.line(i).tolist()) == toks for i, toks in enumerate(text_lines))
+
+    print(f"Round-trip: {'OK' if ok else 'MISMATCH'} | Lines: {len(corpus)} | Tokens: {n_tokens}")
+    print(f"  text  : {Path(text_path).stat().st_size / 1e6:7.2f} MB on disk | "
+          f"load {text_time * 1e3:8.1f} ms | peak heap {text_peak / 1e6:7.2f} MB")
+    print(f"  binary: {Path(bin_path).stat().st_size / 1e6:7.2f} MB on disk | "
+          f"load {bin_time * 1e3:8.1f} ms | peak heap {bin_peak / 1e6:7.2f} MB")
+    return ok
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    text_file = sys.argv[1] if len(sys.argv) > 1 else "tokenized_corpus.txt"
+    bin_file = sys.argv[2] if len(sys.argv) > 2 else TOKEN_CORPUS
+    sys.exit(0 if _compare(text_file, bin_file) else 1)
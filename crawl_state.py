@@ -0,0 +1,106 @@
+"""Persistent crawl state: story frontier, seen set and HTTP response cache (SQLite)"""
+
+import hashlib
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    url TEXT PRIMARY KEY,
+    page_num INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending | done | failed
+    content_hash TEXT,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS cache (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB,
+    fetched REAL
+);
+"""
+
+def content_hash(title, text):
+    return hashlib.sha256(f"{title}\n{text}".encode("utf-8")).hexdigest()
+
+class CrawlState:
+    """Frontier/seen set and page cache for one category crawl
+
+    Every story URL ever discovered is a row in `stories` (the seen set);
+    rows not yet `done` are the frontier. Changes are committed immediately,
+    so the state on disk is at most one story behind after a crash.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    # Crawl progress
+    def get(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+        self.db.commit()
+
+    # Frontier and seen set
+    def add_stories(self, links, page_num):
+        """Record discovered links; returns the ones never seen before, in order"""
+        new = []
+        for link in links:
+            cur = self.db.execute("INSERT OR IGNORE INTO stories (url, page_num, updated) VALUES (?, ?, ?)",
+                                  (link, page_num, time.time()))
+            if cur.rowcount:
+                new.append(link)
+        self.db.commit()
+        return new
+
+    def import_stories(self, stories):
+        """Record already written (url, content hash) pairs as done, e.g. from an existing CSV"""
+        self.db.executemany("INSERT OR IGNORE INTO stories (url, page_num, status, content_hash, updated) "
+                            "VALUES (?, NULL, 'done', ?, ?)", [(url, digest, time.time()) for url, digest in stories])
+        self.db.commit()
+
+    def pending(self):
+        """Frontier: stories not yet written (interrupted or failed earlier), in discovery order"""
+        return [r[0] for r in self.db.execute("SELECT url FROM stories WHERE status != 'done' ORDER BY rowid")]
+
+    def done(self):
+        return [r[0] for r in self.db.execute("SELECT url FROM stories WHERE status = 'done' ORDER BY rowid")]
+
+    def story_hash(self, url):
+        row = self.db.execute("SELECT content_hash FROM stories WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def finish_story(self, url, status, digest=None):
+        """Checkpoint one story"""
+        self.db.execute("UPDATE stories SET status = ?, content_hash = COALESCE(?, content_hash), updated = ? "
+                        "WHERE url = ?", (status, digest, time.time(), url))
+        self.db.commit()
+
+    def counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM stories GROUP BY status").fetchall())
+
+    # Response cache
+    def cached(self, url):
+        """(etag, last_modified, body) or None"""
+        row = self.db.execute("SELECT etag, last_modified, body FROM cache WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        etag, last_modified, body = row
+        return etag, last_modified, zlib.decompress(body).decode("utf-8")
+
+    def store(self, url, etag, last_modified, body):
+        self.db.execute("INSERT OR REPLACE INTO cache (url, etag, last_modified, body, fetched) VALUES (?, ?, ?, ?, ?)",
+                        (url, etag, last_modified, zlib.compress(body.encode("utf-8")), time.time()))
+        self.db.commit()
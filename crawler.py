@@ -0,0 +1,474 @@
+"""Concurrent async crawler for UrduPoint kids' story categories
+
+Replaces the per-category Selenium/requests scrapers. Category and story pages
+are fetched with aiohttp over a bounded connection pool, with a per-host rate
+limit and retries, and parsed with BeautifulSoup. Selenium is only used as an
+optional fallback for story pages that can't be fetched or parsed over HTTP.
+
+Crawls are resumable: the frontier, seen set and a page cache (revalidated
+with ETag/Last-Modified) are kept in a SQLite file next to the output CSV, so a
+re-crawl only fetches new or changed stories. CSV rows are keyed by story URL:
+new stories are appended and a changed story replaces its row.
+
+Requires: aiohttp, beautifulsoup4 (selenium only for --selenium-fallback)
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import random
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+from crawl_state import CrawlState, content_hash
+
+BASE_URL = "https://www.urdupoint.com"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+CATEGORIES = {
+    "moral": ("moral-stories", "urdu_moral_stories.csv"),
+    "funny": ("funny-stories", "urdu_funny_stories.csv"),
+    "true": ("true-stories", "urdu_true_stories.csv"),
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+BAD_LINES = ["LIVE", "Advertisement", "Tap to unmute", "Learn more", "An error occurred"]
+
+
+def log(msg):
+    print(f"[LOG] {msg}", flush=True)
+
+
+def clean_text(text):
+    lines = text.split("\n")
+    cleaned = [line for line in lines if not any(bad in line for bad in BAD_LINES)]
+    return "\n".join(cleaned).strip()
+
+
+def get_category_url(category, page_num, base_url=BASE_URL):
+    slug = CATEGORIES[category][0]
+    if page_num == 1:
+        return f"{base_url}/kids/category/{slug}.html"
+    return f"{base_url}/kids/category/{slug}-page{page_num}.html"
+
+
+def extract_story_links(category_html, base_url=BASE_URL):
+    soup = BeautifulSoup(category_html, "html.parser")
+    links = []
+    for a_tag in soup.select("a.sharp_box[href]"):
+        href = a_tag.get("href", "").strip()
+        if href:
+            links.append(urljoin(base_url, href))
+    return links
+
+
+def extract_story_data(story_html):
+    soup = BeautifulSoup(story_html, "html.parser")
+
+    title_tag = soup.select_one("h2.txt_blue")
+    title = title_tag.get_text(strip=True) if title_tag else "No title"
+
+    content_tag = soup.select_one("div.txt_detail.urdu")
+    if not content_tag:
+        return title, ""
+
+    for tag in content_tag(["script", "style", "iframe", "noscript"]):
+        tag.decompose()
+
+    return title, clean_text(content_tag.get_text(separator="\n", strip=True))
+
+
+class HostRateLimiter:
+    """Spaces request starts to at most `rate` per second per host"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        async with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Fetcher:
+    """aiohttp GET with a bounded connection pool, per-host rate limit and retries
+
+    With a CrawlState, responses carrying ETag/Last-Modified are cached and
+    later requests for the same URL are conditional; a 304 returns the cached body.
+    """
+
+    def __init__(self, concurrency=8, rate=4.0, retries=4, timeout=30, backoff=1.0, state=None):
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(rate)
+        self.retries = retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.backoff = backoff
+        self.state = state
+        self.session = None
+        self.requests = 0
+        self.not_modified = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                             headers={"User-Agent": USER_AGENT})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def get(self, url):
+        """Fetch a page's text; None after exhausting retries"""
+        last_error = None
+        cached = self.state.cached(url) if self.state else None
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        for attempt in range(1, self.retries + 1):
+            await self.limiter.wait(url)
+            delay = self.backoff * 2 ** (attempt - 1) * (0.5 + random.random())
+            try:
+                self.requests += 1
+                async with self.session.get(url, headers=headers) as resp:
+                    if resp.status == 304 and cached:
+                        self.not_modified += 1
+                        return cached[2]
+                    if resp.status in RETRY_STATUS:
+                        retry_after = resp.headers.get("Retry-After", "")
+                        delay = float(retry_after) if retry_after.isdigit() else delay
+                        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                    resp.raise_for_status()
+                    text = await resp.text()
+                    etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                    if self.state and (etag or last_modified):
+                        self.state.store(url, etag, last_modified, text)
+                    return text
+            except aiohttp.ClientResponseError as err:
+                if err.status not in RETRY_STATUS:
+                    log(f"Failed to fetch URL: {url} | HTTP {err.status}")
+                    return None
+                last_error = f"HTTP {err.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                last_error = repr(err)
+            if attempt < self.retries:
+                log(f"Retrying ({attempt}/{self.retries}) in {delay:.1f}s: {url} | {last_error}")
+                await asyncio.sleep(delay)
+        log(f"Skipping URL after retries: {url} | {last_error}")
+        return None
+
+
+class SeleniumFallback:
+    """Single headless Chrome, driven from a worker thread, for pages HTTP can't handle"""
+
+    def __init__(self):
+        self.driver = None
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def build_driver():
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        for arg in ("--headless=new", "--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox",
+                    "--log-level=3", f"user-agent={USER_AGENT}"):
+            options.add_argument(arg)
+        driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(30)
+        return driver
+
+    def _render(self, url):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        if self.driver is None:
+            self.driver = self.build_driver()
+        self.driver.get(url)
+        WebDriverWait(self.driver, 10).until(EC.presence_of_element_located(
+            (By.XPATH, '//div[contains(@class,"txt_detail") and contains(@class,"urdu")]')))
+        return self.driver.page_source
+
+    async def get(self, url):
+        async with self.lock:
+            try:
+                return await asyncio.to_thread(self._render, url)
+            except Exception as err:
+                log(f"Selenium fallback failed: {url} | {err}")
+                return None
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+
+
+class StoryCSV:
+    """Output CSV (title, content, url) keyed by story URL
+
+    New stories are appended; a story whose URL already has a row replaces it
+    (the file is rewritten atomically). Rows of an older CSV without a url
+    column are kept, and a crawled story with the same content adopts that row
+    instead of being added again.
+    """
+
+    FIELDS = ["title", "content", "url"]
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = {}        # url (or ("", row index) for rows without one) → [title, content, url]
+        self.unclaimed = {}   # content hash → key of a row without url
+        self.dirty = False
+        self.file = None
+        upgrade = True
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with self.path.open(newline="", encoding="utf-8-sig") as f:
+                reader = csv.DictReader(f)
+                for i, row in enumerate(reader):
+                    title, content, url = row.get("title") or "", row.get("content") or "", row.get("url") or ""
+                    key = url or ("", i)
+                    self.rows[key] = [title, content, url]
+                    if not url:
+                        self.unclaimed[content_hash(title, content)] = key
+                upgrade = reader.fieldnames != self.FIELDS
+        if upgrade:
+            self.rewrite()
+        else:
+            self.file = self.path.open("a", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def urls(self):
+        """(url, content hash) of the rows that have a URL"""
+        return [(url, content_hash(title, content)) for title, content, url in self.rows.values() if url]
+
+    def write(self, title, text, url):
+        """Add or update a story's row; returns one of added / replaced / unchanged"""
+        row = [title, text, url]
+        if url in self.rows:
+            if self.rows[url] == row:
+                return "unchanged"
+            self.rows[url] = row
+            self.rewrite()
+            return "replaced"
+        key = self.unclaimed.pop(content_hash(title, text), None)
+        if key is not None:   # already in the file without its URL: label it at the next rewrite
+            del self.rows[key]
+            self.rows[url] = row
+            self.dirty = True
+            return "unchanged"
+        self.rows[url] = row
+        self.writer.writerow(row)
+        self.file.flush()
+        return "added"
+
+    def rewrite(self):
+        if self.file is not None:
+            self.file.close()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.FIELDS)
+            writer.writerows(self.rows.values())
+        os.replace(tmp, self.path)
+        self.dirty = False
+        self.file = self.path.open("a", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+
+    def close(self):
+        if self.dirty:
+            self.rewrite()
+        self.file.close()
+
+
+async def scrape_story(fetcher, link, fallback=None):
+    """(title, text) for a story page; text is empty on failure"""
+    html = await fetcher.get(link)
+    title, text = extract_story_data(html) if html else ("No title", "")
+    if not text and fallback is not None:
+        log(f"Using Selenium fallback: {link}")
+        html = await fallback.get(link)
+        if html:
+            title, text = extract_story_data(html)
+    return title, text
+
+
+async def crawl(
+    category,
+    start_page=1,
+    max_pages=None,
+    max_stories_per_page=None,
+    output_file=None,
+    concurrency=8,
+    rate=4.0,
+    retries=4,
+    base_url=BASE_URL,
+    selenium_fallback=False,
+    state_file=None,
+    revalidate=False,
+):
+    """Crawl one category into a title/content CSV, resuming from saved state
+
+    An interrupted crawl first finishes its saved frontier, then continues
+    pagination where it stopped; a finished crawl re-walks from start_page and
+    stops at the first page without unseen stories. Stories of a category page
+    are fetched concurrently while the next category page is prefetched, and
+    each story is appended and checkpointed as soon as it completes.
+    """
+    output_path = Path(output_file or CATEGORIES[category][1]).resolve()
+    state = CrawlState(state_file or output_path.with_suffix(".crawl.sqlite"))
+    fallback = SeleniumFallback() if selenium_fallback else None
+    stories_written = stories_failed = stories_unchanged = pages_processed = 0
+    start = time.perf_counter()
+
+    out = None
+    try:
+        out = StoryCSV(output_path)
+        if not state.counts() and out.urls():
+            # CSV without its state file: its stories are already crawled
+            state.import_stories(out.urls())
+        log(f"{'Resuming' if len(out) else 'Starting'} crawler: {category} "
+            f"(concurrency={concurrency}, rate={rate}/s per host, state={state.path})")
+        async with Fetcher(concurrency, rate, retries, state=state) as fetcher:
+            async def process(links, recheck=False):
+                nonlocal stories_written, stories_failed, stories_unchanged
+
+                async def one(link):
+                    return link, await scrape_story(fetcher, link, fallback)
+
+                for task in asyncio.as_completed([one(l) for l in links]):
+                    link, (title, text) = await task
+                    if not text:
+                        stories_failed += 1
+                        log(f"Empty content extracted, skipping story: {link}")
+                        state.finish_story(link, "failed")
+                        continue
+                    digest = content_hash(title, text)
+                    if recheck and digest == state.story_hash(link):
+                        stories_unchanged += 1
+                        continue
+                    if out.write(title, text, link) == "unchanged":
+                        stories_unchanged += 1
+                    else:
+                        stories_written += 1
+                    state.finish_story(link, "done", digest)
+
+            frontier = state.pending()
+            if frontier:
+                log(f"Resuming {len(frontier)} stories from saved frontier")
+                await process(frontier)
+            if revalidate:
+                done = state.done()
+                log(f"Revalidating {len(done)} previously crawled stories")
+                await process(done, recheck=True)
+
+            if state.get("complete", "1") == "0":
+                page_num = int(state.get("next_page", start_page))
+            else:
+                page_num = start_page
+            state.set("complete", 0)
+
+            next_page = asyncio.ensure_future(fetcher.get(get_category_url(category, page_num, base_url)))
+            while True:
+                if max_pages is not None and pages_processed >= max_pages:
+                    log(f"Reached max pages limit ({max_pages}), stopping.")
+                    break
+
+                log(f"Opening category page {page_num}")
+                category_html = await next_page
+                if max_pages is None or pages_processed + 1 < max_pages:
+                    next_page = asyncio.ensure_future(
+                        fetcher.get(get_category_url(category, page_num + 1, base_url)))
+                if not category_html:
+                    log("Unable to load category page; stopping.")
+                    break
+
+                links = extract_story_links(category_html, base_url)
+                if max_stories_per_page is not None:
+                    links = links[:max_stories_per_page]
+                story_links = state.add_stories(links, page_num)
+                if not story_links:
+                    log("No new stories found, stopping pagination.")
+                    state.set("complete", 1)
+                    break
+
+                log(f"Found {len(story_links)} new stories on page {page_num}")
+                await process(story_links)
+
+                page_num += 1
+                pages_processed += 1
+                state.set("next_page", page_num)
+            if not next_page.done():
+                next_page.cancel()
+    finally:
+        if out is not None:
+            out.close()
+        if fallback is not None:
+            fallback.close()
+        state.close()
+
+    elapsed = time.perf_counter() - start
+    log(
+        f"Crawl finished. Output: {output_path}. Written: {stories_written}, Failed: {stories_failed}, "
+        f"Unchanged: {stories_unchanged}, Requests: {fetcher.requests} ({fetcher.not_modified} not modified), "
+        f"{elapsed:.1f}s"
+    )
+    return stories_written, stories_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--category", choices=list(CATEGORIES), required=True)
+    parser.add_argument("--start-page", type=int, default=1)
+    parser.add_argument("--max-pages", type=int, default=None, help="Stop after N category pages.")
+    parser.add_argument(
+        "--max-stories-per-page",
+        type=int,
+        default=None,
+        help="Limit stories processed per category page.",
+    )
+    parser.add_argument("--output", default=None, help="Default: the category's CSV used by preprocess.py")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max open connections.")
+    parser.add_argument("--rate", type=float, default=4.0, help="Max requests per second per host (0 = unlimited).")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--selenium-fallback", action="store_true", help="Render failed story pages with Chrome.")
+    parser.add_argument("--state", default=None, help="Crawl state file (default: <output>.crawl.sqlite)")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Re-check already crawled stories and replace the rows of the ones that changed.")
+    args = parser.parse_args()
+
+    log("Program started")
+    try:
+        asyncio.run(crawl(
+            args.category,
+            start_page=args.start_page,
+            max_pages=args.max_pages,
+            max_stories_per_page=args.max_stories_per_page,
+            output_file=args.output,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            retries=args.retries,
+            base_url=args.base_url,
+            selenium_fallback=args.selenium_fallback,
+            state_file=args.state,
+            revalidate=args.revalidate,
+        ))
+    except KeyboardInterrupt:
+        log("Stopped by user interrupt.")
+    log("Program complete")
@@ -0,0 +1,187 @@
+"""Near-duplicate story removal with MinHash signatures and LSH banding
+
+Runs between preprocess.py and tokenizer.py: reads the corpus (one story per
+line), finds near-duplicate stories and writes a corpus keeping the longest
+story of each duplicate cluster, in original order. The output goes to a
+separate file (OUT_FILE) unless in-place rewriting is asked for explicitly.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# Configuration
+IN_FILE = Path("corpus.txt")
+OUT_FILE = Path("corpus.dedup.txt")
+REPORT_FILE = Path("dedup_report.json")
+SHINGLE = 5          # words per shingle
+NUM_PERM = 128       # MinHash permutations (signature length)
+BANDS = 16           # LSH bands; NUM_PERM // BANDS rows per band
+THRESHOLD = 0.8      # estimated Jaccard similarity to count as duplicate
+
+def make_hashers(num_perm=NUM_PERM, seed=1):
+    """Random (a, b) for multiply-shift hashing: h(x) = ((a * x + b) mod 2^64) >> 32"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+MIX = np.uint64(0x9E3779B97F4A7C15)
+_word_hash = {}
+
+def shingles(line, k=SHINGLE):
+    """64-bit hashes of the k-word shingles of a story
+
+    Words are hashed once (and cached across stories); shingle hashes are then
+    combined from word hashes with a vectorized polynomial roll.
+    """
+    words = line.split()
+    wh = np.fromiter((_word_hash.get(w) or _word_hash.setdefault(w, zlib.crc32(w.encode("utf-8")) + 1)
+                      for w in words), dtype=np.uint64, count=len(words))
+    n = max(len(words) - k + 1, 1)
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(min(k, len(words))):
+            h = h * MIX + wh[j:j + n]
+    return h
+
+def minhash(shingle_hashes, hashers):
+    """MinHash signature (uint32[num_perm]) of a set of shingle hashes"""
+    a, b = hashers
+    with np.errstate(over="ignore"):
+        return ((a * np.unique(shingle_hashes)[None, :] + b) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+def signatures(path, hashers):
+    """Signatures and lengths of every line, streamed from disk"""
+    sigs, lengths = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            sigs.append(minhash(shingles(line), hashers))
+            lengths.append(len(line))
+    num_perm = len(hashers[0])
+    return (np.vstack(sigs) if sigs else np.zeros((0, num_perm), np.uint32)), np.array(lengths)
+
+def find_duplicates(sigs, bands=BANDS, threshold=THRESHOLD):
+    """Cluster near-duplicates with LSH banding and union-find
+
+    Each band's rows are hashed to one key per story; stories sharing a key
+    are candidates, and are only linked when their signatures agree on at
+    least `threshold` of positions. Sorting keys per band keeps this
+    O(n log n) per band instead of comparing all pairs.
+
+    Returns:
+        parent array: parent[i] is the cluster root of story i
+    """
+    n, num_perm = sigs.shape
+    rows = num_perm // bands
+    parent = np.arange(n)
+    if n == 0:
+        return parent
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        keys = np.zeros(n, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for col in sigs[:, band * rows:(band + 1) * rows].T:
+                keys = keys * MIX + col
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], n]
+        for s, e in zip(starts, ends):
+            if e - s < 2:
+                continue
+            head = order[s]
+            members = order[s + 1:e]
+            similar = (sigs[members] == sigs[head]).mean(axis=1) >= threshold
+            for m in members[similar]:
+                ra, rb = find(head), find(m)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+    return np.array([find(i) for i in range(n)])
+
+def dedup(in_file=IN_FILE, out_file=OUT_FILE, report_file=REPORT_FILE,
+          num_perm=NUM_PERM, bands=BANDS, threshold=THRESHOLD, seed=1, in_place=False):
+    """Drop near-duplicate stories, keeping the longest of each cluster
+
+    Args:
+        in_file: corpus with one story per line
+        out_file: deduplicated corpus (ignored with in_place)
+        report_file: JSON report of the duplicate clusters
+        in_place: rewrite in_file instead
+    Raises:
+        ValueError: out_file is in_file without in_place
+    """
+    in_file = Path(in_file)
+    out_file = in_file if in_place else Path(out_file)
+    if not in_place and out_file.resolve() == in_file.resolve():
+        raise ValueError(f"{out_file} is the input file; pass in_place=True (--in-place) to rewrite it")
+    start = time.perf_counter()
+
+    hashers = make_hashers(num_perm, seed)
+    sigs, lengths = signatures(in_file, hashers)
+    roots = find_duplicates(sigs, bands, threshold)
+
+    clusters = {}
+    for i, r in enumerate(roots):
+        clusters.setdefault(int(r), []).append(i)
+    keep = np.zeros(len(roots), dtype=bool)
+    report_clusters = []
+    for members in clusters.values():
+        best = max(members, key=lambda i: (lengths[i], -i))
+        keep[best] = True
+        if len(members) > 1:
+            report_clusters.append({
+                "kept": best,
+                "dropped": [i for i in members if i != best],
+                "similarity": [round(float((sigs[i] == sigs[best]).mean()), 3) for i in members if i != best],
+            })
+
+    # Second streaming pass: copy kept lines (line numbers are 0-based story indices)
+    tmp = out_file.with_name(out_file.name + ".tmp")
+    with open(in_file, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8", newline="\n") as dst:
+        for i, line in enumerate(src):
+            if keep[i]:
+                dst.write(line)
+    os.replace(tmp, out_file)
+
+    report = {
+        "input": str(in_file),
+        "output": str(out_file),
+        "stories": len(roots),
+        "kept": int(keep.sum()),
+        "dropped": int(len(roots) - keep.sum()),
+        "clusters": len(report_clusters),
+        "params": {"shingle": SHINGLE, "num_perm": num_perm, "bands": bands, "threshold": threshold, "seed": seed},
+        "seconds": round(time.perf_counter() - start, 3),
+        "duplicate_clusters": sorted(report_clusters, key=lambda c: c["kept"]),
+    }
+    Path(report_file).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Deduplicated {report['stories']} stories → {report['kept']} kept, {report['dropped']} dropped "
+          f"in {report['clusters']} clusters ({report['seconds']}s) → {out_file}, report: {report_file}")
+    return report
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Remove near-duplicate stories from the corpus")
+    parser.add_argument("--input", default=str(IN_FILE))
+    parser.add_argument("--output", default=str(OUT_FILE))
+    parser.add_argument("--in-place", action="store_true", help="Rewrite the input file instead of --output")
+    parser.add_argument("--report", default=str(REPORT_FILE))
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+    dedup(args.input, args.output, args.report, args.num_perm, args.bands, args.threshold, in_place=args.in_place)
@@ -0,0 +1,70 @@
+"""Streaming detokenizer: model tokens to display text, one token at a time
+
+Tokenizers that mark the first piece of each word with tokenizer.WORD_START
+("▁") let subword pieces be joined back into words: a marked piece starts a
+new word (preceded by a space), an unmarked one continues the current word.
+Special tokens become Urdu punctuation and line breaks. Each token costs O(1),
+so servers can stream display-text deltas without re-formatting the story.
+
+Models tokenized without the marker (word_start "") fall back to the old
+rendering: tokens separated by spaces.
+"""
+
+import sys
+import time
+
+import tokenizer
+
+# Display text of special tokens; <EOT> right after a paragraph break adds nothing
+TOKEN_TEXT = {"<EOS>": "۔", "<EOP>": "\n", "<EOT>": "۔"}
+
+class Detokenizer:
+    """Turns tokens into display-text deltas, remembering only whether a line has started
+
+    Args:
+        word_start: the model's word-start marker ("" for models without one)
+        started: text already precedes the first token (a prefix, or the
+            story a continuation extends), so a new word needs a space
+    """
+
+    def __init__(self, word_start="", started=False):
+        self.word_start = word_start
+        self.line_start = not started
+
+    def feed(self, token):
+        """Display text for the next token"""
+        text = TOKEN_TEXT.get(token)
+        if text is not None:
+            if token == "<EOT>" and self.line_start:
+                return ""
+            self.line_start = text == "\n"
+            return text
+        ws = self.word_start
+        if ws and token.startswith(ws):
+            token = token[len(ws):]
+        elif ws:  # continues the current word
+            self.line_start = False
+            return token
+        text = token if self.line_start else " " + token
+        self.line_start = False
+        return text
+
+    def text(self, tokens):
+        """Display text of a token sequence"""
+        return "".join(map(self.feed, tokens))
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    merges, special, word_start = tokenizer.load_merges()
+    lines = tokenizer.load_lines()[:200]
+    tokens = [special.get(t, t) for line in lines for w in line.split()
+              for t in tokenizer.encode(w, merges, word_start, special)]
+    t0 = time.perf_counter()
+    text = Detokenizer(word_start).text(tokens)
+    elapsed = time.perf_counter() - t0
+    words = [w for line in lines for w in line.split() if not tokenizer.is_special(w, special)]
+    ok = text.replace("۔", " ").split() == words
+    print(f"[{'✓' if ok else '✗'}] Round trip: {len(tokens)} tokens → {len(words)} corpus words "
+          f"{'restored' if ok else 'NOT restored'}")
+    print(f"[*] Detokenize: {elapsed / len(tokens) * 1e9:.0f} ns/token")
+    print(text[:300])
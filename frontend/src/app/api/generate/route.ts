@@ -1,7 +1,7 @@
 import { NextRequest } from 'next/server';
 
 export async function POST(request: NextRequest) {
-  const { prefix, maxLength = 500 } = await request.json();
+  const { prefix, maxLength = 500, sessionId, delta, model, constraints } = await request.json();
   let base = process.env.GRPC_BACKEND_URL || 'http://localhost:50051';
   base = base.replace(/\/$/, '');
   if (!base.startsWith('http')) base = `https://${base}`;
@@ -9,7 +9,7 @@ export async function POST(request: NextRequest) {
   const res = await fetch(`${base}/generate`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ prefix: prefix || '', maxLength }),
+    body: JSON.stringify({ prefix: prefix || '', maxLength, sessionId, delta, model, constraints }),
   });
 
   if (!res.ok || !res.body) {
@@ -21,30 +21,31 @@ export default function Home() {
     if (!input.trim()) return;
     setMessages((msgs) => [...msgs, { role: 'user', content: input }]);
     setIsGenerating(true);
-    let story = '';
+    // Deltas are display text from the server; the story is the prefix plus each delta appended
+    let story = input.trim().split(/\s+/).join(' ');
     setMessages((msgs) => [...msgs, { role: 'assistant', content: '' }]);
     try {
       const response = await fetch('/api/generate', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ prefix: input, maxLength: 500 }),
+        body: JSON.stringify({ prefix: input, maxLength: 500, delta: true }),
       });
       const reader = response.body?.getReader();
       const decoder = new TextDecoder();
       if (reader) {
+        let buffered = '';
         while (true) {
           const { done, value } = await reader.read();
           if (done) break;
-          const chunk = decoder.decode(value);
-          const lines = chunk.split('\n');
+          // A read can end mid-event; keep the partial line for the next read
+          const lines = (buffered + decoder.decode(value, { stream: true })).split('\n');
+          buffered = lines.pop() ?? '';
           for (const line of lines) {
             if (line.startsWith('data: ')) {
               try {
                 const data = JSON.parse(line.slice(6));
-                story = data.chunk
-                  .replace(/<EOS>/g, '۔')
-                  .replace(/<EOP>/g, '\n')
-                  .replace(/<EOT>/g, '۔');
+                if (typeof data.chunk !== 'string') continue;
+                story += data.chunk;
                 setMessages((msgs) => {
                   const lastUserIdx = msgs.map(m => m.role).lastIndexOf('user');
                   const newMsgs = [...msgs];
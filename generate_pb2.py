@@ -24,21 +24,37 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0egenerate.proto\x12\nurdu_story\"5\n\x0fGenerateRequest\x12\x0e\n\x06prefix\x18\x01 \x01(\t\x12\x12\n\nmax_length\x18\x02 \x01(\x05\"z\n\x10GenerateResponse\x12\r\n\x05\x63hunk\x18\x01 \x01(\t\x12\x10\n\x08is_final\x18\x02 \x01(\x08\x12\x12\n\nnum_tokens\x18\x03 \x01(\x05\x12\x0f\n\x07lambda3\x18\x04 \x01(\x02\x12\x0f\n\x07lambda2\x18\x05 \x01(\x02\x12\x0f\n\x07lambda1\x18\x06 \x01(\x02\"\x07\n\x05\x45mpty\"i\n\tModelInfo\x12\x12\n\nvocab_size\x18\x01 \x01(\x05\x12\x0f\n\x07lambda3\x18\x02 \x01(\x02\x12\x0f\n\x07lambda2\x18\x03 \x01(\x02\x12\x0f\n\x07lambda1\x18\x04 \x01(\x02\x12\x15\n\rmodel_version\x18\x05 \x01(\t2\x97\x01\n\x0eStoryGenerator\x12I\n\x08Generate\x12\x1b.urdu_story.GenerateRequest\x1a\x1c.urdu_story.GenerateResponse\"\x00\x30\x01\x12:\n\x0cGetModelInfo\x12\x11.urdu_story.Empty\x1a\x15.urdu_story.ModelInfo\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0egenerate.proto\x12\nurdu_story\"\x95\x01\n\x0fGenerateRequest\x12\x0e\n\x06prefix\x18\x01 \x01(\t\x12\x12\n\nmax_length\x18\x02 \x01(\x05\x12\x12\n\nsession_id\x18\x03 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x04 \x01(\x08\x12\r\n\x05model\x18\x05 \x01(\t\x12,\n\x0b\x63onstraints\x18\x06 \x01(\x0b\x32\x17.urdu_story.Constraints\"s\n\x0b\x43onstraints\x12\x15\n\rbanned_tokens\x18\x01 \x03(\t\x12\x14\n\x0c\x62\x61nned_words\x18\x02 \x03(\t\x12\x0f\n\x07\x65ndings\x18\x03 \x03(\t\x12\x12\n\nmin_tokens\x18\x04 \x01(\x05\x12\x12\n\nmax_tokens\x18\x05 \x01(\x05\"\x9d\x01\n\x10GenerateResponse\x12\r\n\x05\x63hunk\x18\x01 \x01(\t\x12\x10\n\x08is_final\x18\x02 \x01(\x08\x12\x12\n\nnum_tokens\x18\x03 \x01(\x05\x12\x0f\n\x07lambda3\x18\x04 \x01(\x02\x12\x0f\n\x07lambda2\x18\x05 \x01(\x02\x12\x0f\n\x07lambda1\x18\x06 \x01(\x02\x12\x12\n\nsession_id\x18\x07 \x01(\t\x12\r\n\x05model\x18\x08 \x01(\t\"\x07\n\x05\x45mpty\",\n\x0ePredictRequest\x12\x0f\n\x07\x63ontext\x18\x01 \x01(\t\x12\t\n\x01k\x18\x02 \x01(\x05\"0\n\nPrediction\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0bprobability\x18\x02 \x01(\x02\"U\n\x0fPredictResponse\x12+\n\x0bpredictions\x18\x01 \x03(\x0b\x32\x16.urdu_story.Prediction\x12\x15\n\rcontext_order\x18\x02 \x01(\x05\"@\n\x0cScoreRequest\x12\r\n\x05texts\x18\x01 \x03(\t\x12\x0e\n\x06\x66ormat\x18\x02 \x01(\t\x12\x11\n\tper_token\x18\x03 \x01(\x08\"\x82\x01\n\tTextScore\x12\x12\n\nnum_tokens\x18\x01 \x01(\x05\x12\x10\n\x08log_prob\x18\x02 \x01(\x01\x12\x12\n\nperplexity\x18\x03 \x01(\x01\x12\x12\n\noov_tokens\x18\x04 \x01(\x05\x12\x0e\n\x06tokens\x18\x05 \x03(\t\x12\x17\n\x0ftoken_log_probs\x18\x06 \x03(\x02\"6\n\rScoreResponse\x12%\n\x06scores\x18\x01 \x03(\x0b\x32\x15.urdu_story.TextScore\"\xff\x01\n\tModelInfo\x12\x12\n\nvocab_size\x18\x01 \x01(\x05\x12\x0f\n\x07lambda3\x18\x02 \x01(\x02\x12\x0f\n\x07lambda2\x18\x03 \x01(\x02\x12\x0f\n\x07lambda1\x18\x04 \x01(\x02\x12\x15\n\rmodel_version\x18\x05 \x01(\t\x12\x1a\n\x12\x61\x63tive_generations\x18\x06 \x01(\x05\x12\x1a\n\x12queued_generations\x18\x07 \x01(\x05\x12\x1c\n\x14rejected_generations\x18\x08 \x01(\x03\x12\x15\n\rdefault_model\x18\t \x01(\t\x12\'\n\x06models\x18\n \x03(\x0b\x32\x17.urdu_story.LoadedModel\"q\n\x0bLoadedModel\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x14\n\x0cmemory_bytes\x18\x02 \x01(\x03\x12\x14\n\x0cload_seconds\x18\x03 \x01(\x02\x12\x12\n\nvocab_size\x18\x04 \x01(\x05\x12\x14\n\x0cidle_seconds\x18\x05 \x01(\x02\x32\xa1\x02\n\x0eStoryGenerator\x12I\n\x08Generate\x12\x1b.urdu_story.GenerateRequest\x1a\x1c.urdu_story.GenerateResponse\"\x00\x30\x01\x12:\n\x0cGetModelInfo\x12\x11.urdu_story.Empty\x1a\x15.urdu_story.ModelInfo\"\x00\x12H\n\x0bPredictNext\x12\x1a.urdu_story.PredictRequest\x1a\x1b.urdu_story.PredictResponse\"\x00\x12>\n\x05Score\x12\x18.urdu_story.ScoreRequest\x1a\x19.urdu_story.ScoreResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'generate_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_GENERATEREQUEST']._serialized_start=30
-  _globals['_GENERATEREQUEST']._serialized_end=83
-  _globals['_GENERATERESPONSE']._serialized_start=85
-  _globals['_GENERATERESPONSE']._serialized_end=207
-  _globals['_EMPTY']._serialized_start=209
-  _globals['_EMPTY']._serialized_end=216
-  _globals['_MODELINFO']._serialized_start=218
-  _globals['_MODELINFO']._serialized_end=323
-  _globals['_STORYGENERATOR']._serialized_start=326
-  _globals['_STORYGENERATOR']._serialized_end=477
+  _globals['_GENERATEREQUEST']._serialized_start=31
+  _globals['_GENERATEREQUEST']._serialized_end=180
+  _globals['_CONSTRAINTS']._serialized_start=182
+  _globals['_CONSTRAINTS']._serialized_end=297
+  _globals['_GENERATERESPONSE']._serialized_start=300
+  _globals['_GENERATERESPONSE']._serialized_end=457
+  _globals['_EMPTY']._serialized_start=459
+  _globals['_EMPTY']._serialized_end=466
+  _globals['_PREDICTREQUEST']._serialized_start=468
+  _globals['_PREDICTREQUEST']._serialized_end=512
+  _globals['_PREDICTION']._serialized_start=514
+  _globals['_PREDICTION']._serialized_end=562
+  _globals['_PREDICTRESPONSE']._serialized_start=564
+  _globals['_PREDICTRESPONSE']._serialized_end=649
+  _globals['_SCOREREQUEST']._serialized_start=651
+  _globals['_SCOREREQUEST']._serialized_end=715
+  _globals['_TEXTSCORE']._serialized_start=718
+  _globals['_TEXTSCORE']._serialized_end=848
+  _globals['_SCORERESPONSE']._serialized_start=850
+  _globals['_SCORERESPONSE']._serialized_end=904
+  _globals['_MODELINFO']._serialized_start=907
+  _globals['_MODELINFO']._serialized_end=1162
+  _globals['_LOADEDMODEL']._serialized_start=1164
+  _globals['_LOADEDMODEL']._serialized_end=1277
+  _globals['_STORYGENERATOR']._serialized_start=1280
+  _globals['_STORYGENERATOR']._serialized_end=1569
 # @@protoc_insertion_point(module_scope)
@@ -45,6 +45,16 @@ class StoryGeneratorStub(object):
                 request_serializer=generate__pb2.Empty.SerializeToString,
                 response_deserializer=generate__pb2.ModelInfo.FromString,
                 _registered_method=True)
+        self.PredictNext = channel.unary_unary(
+                '/urdu_story.StoryGenerator/PredictNext',
+                request_serializer=generate__pb2.PredictRequest.SerializeToString,
+                response_deserializer=generate__pb2.PredictResponse.FromString,
+                _registered_method=True)
+        self.Score = channel.unary_unary(
+                '/urdu_story.StoryGenerator/Score',
+                request_serializer=generate__pb2.ScoreRequest.SerializeToString,
+                response_deserializer=generate__pb2.ScoreResponse.FromString,
+                _registered_method=True)
 
 
 class StoryGeneratorServicer(object):
@@ -63,6 +73,18 @@ class StoryGeneratorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def PredictNext(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Score(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_StoryGeneratorServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -76,6 +98,16 @@ def add_StoryGeneratorServicer_to_server(servicer, server):
                     request_deserializer=generate__pb2.Empty.FromString,
                     response_serializer=generate__pb2.ModelInfo.SerializeToString,
             ),
+            'PredictNext': grpc.unary_unary_rpc_method_handler(
+                    servicer.PredictNext,
+                    request_deserializer=generate__pb2.PredictRequest.FromString,
+                    response_serializer=generate__pb2.PredictResponse.SerializeToString,
+            ),
+            'Score': grpc.unary_unary_rpc_method_handler(
+                    servicer.Score,
+                    request_deserializer=generate__pb2.ScoreRequest.FromString,
+                    response_serializer=generate__pb2.ScoreResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'urdu_story.StoryGenerator', rpc_method_handlers)
@@ -141,3 +173,57 @@ class StoryGenerator(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def PredictNext(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/urdu_story.StoryGenerator/PredictNext',
+            generate__pb2.PredictRequest.SerializeToString,
+            generate__pb2.PredictResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Score(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/urdu_story.StoryGenerator/Score',
+            generate__pb2.ScoreRequest.SerializeToString,
+            generate__pb2.ScoreResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
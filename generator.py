@@ -0,0 +1,490 @@
+"""Story generation shared by the gRPC and HTTP front ends: models, sessions, scheduling, pool
+
+Has no gRPC dependency, so the HTTP entry point can import it alone.
+The default model can be loaded on a background thread (load_in_background);
+READY is set once it is usable and load_status() reports progress until then.
+With SHARD_ADDRESSES set, the default model is served from shard servers
+(shard_router.py) instead of being loaded here: generation only.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import metrics
+from constraints import Decoder
+from detokenizer import Detokenizer
+from model import MODEL_PATH, load_model
+from ngram_index import NgramIndex
+from quantize import load_tables
+from registry import ModelNotFound, ModelRegistry
+from scheduler import GENERATION_TIMEOUT, Deadline, GenerationScheduler
+from scoring import MAX_SCORE_TEXTS, load_scorer
+from sessions import SessionNotFound, SessionStore
+from story_pool import POOL_LENGTH, StoryPool
+import tokenizer
+
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT_SECONDS", "30"))
+# Streamed tokens are sent in batches: flush at COALESCE_TOKENS tokens, COALESCE_MS since the
+# last flush, or a sentence/paragraph end, whichever comes first (COALESCE_TOKENS=1 sends each token)
+COALESCE_TOKENS = int(os.environ.get("COALESCE_TOKENS", "8"))
+COALESCE_MS = float(os.environ.get("COALESCE_MS", "50"))
+FLUSH_TOKENS = {"<EOS>", "<EOP>"}
+# Sharded serving: host:port of each shard_server.py process, in shard order, and the export
+# directory holding their model.json (empty: load the model file here)
+SHARD_ADDRESSES = [a for a in os.environ.get("SHARD_ADDRESSES", "").replace(" ", "").split(",") if a]
+SHARD_MODEL_DIR = Path(os.environ.get("SHARD_MODEL_DIR", "shards"))
+
+# Serving state of the default model (the registry keeps it loaded)
+MODEL_STATE = {}
+
+# Admission control shared by the gRPC and HTTP front ends
+SCHEDULER = GenerationScheduler()
+
+# Story sessions for continuations, shared by both front ends
+SESSIONS = SessionStore()
+
+metrics.Gauge("story_sessions", "Story sessions held for continuation", fn=lambda: len(SESSIONS))
+metrics.Gauge("story_queue_depth", "Requests waiting for a generation slot", fn=lambda: SCHEDULER.queued)
+metrics.Gauge("story_generation_slots_in_use", "Generation slots in use", fn=lambda: SCHEDULER.active)
+metrics.Counter("story_rejections_total", "Requests rejected by admission control", ("reason",),
+                fn=lambda: {("queue_full",): SCHEDULER.counts["rejected_queue_full"],
+                            ("timeout",): SCHEDULER.counts["rejected_timeout"]})
+
+def _dict_bytes(d):
+    """Size of a dict with its keys and values (token strings are shared and not counted)"""
+    return sys.getsizeof(d) + sum(map(sys.getsizeof, d)) + sum(map(sys.getsizeof, d.values()))
+
+def load_state(model_path=MODEL_PATH, merges_path=tokenizer.MERGES, keep_counts=False):
+    """Load a model file and build its serving state (counts, top-k index, scorer)
+
+    With quantized tables next to the model file, generation samples from them
+    and the count dicts are dropped once the index and scorer are built (the
+    state holds None for them) unless `keep_counts` is set.
+
+    Returns:
+        (state dict, estimated bytes)
+    """
+    key = str(model_path)
+    try:
+        LOADING[key] = "reading model"
+        uni_count, bi_count, tri_count, lambdas, vocab, total_uni = load_model(model_path)
+        LOADING[key] = "building top-k index"
+        index = NgramIndex.build(uni_count, bi_count, tri_count, lambdas)
+        LOADING[key] = "building scorer"
+        scorer = load_scorer((uni_count, bi_count, tri_count, lambdas), merges_path)
+        LOADING[key] = "loading quantized tables"
+        quantized = load_tables(model_path)
+        if quantized is not None and not keep_counts:
+            uni_count = bi_count = tri_count = None
+        LOADING[key] = "measuring size"
+        nbytes = sum(_dict_bytes(d) for d in (uni_count, bi_count, tri_count, index.rows) if d is not None) + \
+            index.nbytes() + scorer.nbytes() + (quantized.nbytes() if quantized is not None else 0)
+    finally:
+        LOADING.pop(key, None)
+    state = {
+        'uni_count': uni_count,
+        'bi_count': bi_count,
+        'tri_count': tri_count,
+        'lambdas': lambdas,
+        'vocab': vocab,
+        'total_uni': total_uni,
+        'index': index,
+        'scorer': scorer,
+        'quantized': quantized,
+        'word_start': scorer.word_start
+    }
+    return state, nbytes
+
+def load_sharded_state(model_path=MODEL_PATH, merges_path=tokenizer.MERGES):
+    """Serving state that generates from the shard servers at SHARD_ADDRESSES
+
+    Holds only the router's replicated part of the model (shard_router.ShardedModel):
+    there is no local scorer or top-k index, so constraints, predictions and
+    scoring are unavailable. Only the default model is sharded.
+
+    Returns:
+        (state dict, estimated bytes)
+
+    Raises:
+        ModelNotFound: a named model
+    """
+    if Path(model_path) != Path(MODEL_PATH):
+        raise ModelNotFound("only the default model is served from shards")
+    from shard_router import ShardedModel   # gRPC client: imported only when sharded
+    key = str(model_path)
+    try:
+        LOADING[key] = "connecting to shards"
+        sharded = ShardedModel(SHARD_ADDRESSES, SHARD_MODEL_DIR, merges_path=merges_path)
+        sharded.wait_ready(READY_TIMEOUT)
+    finally:
+        LOADING.pop(key, None)
+    state = {
+        'sharded': sharded,
+        'lambdas': sharded.lambdas,
+        'vocab': sharded.vocab,
+        'index': None,
+        'scorer': None,
+        'quantized': None,
+        'word_start': sharded.word_start
+    }
+    return state, sharded.nbytes() + _dict_bytes(sharded.ids)
+
+def _scorer(state, feature):
+    """The state's scorer
+
+    Raises:
+        ValueError: sharded serving, which has none
+    """
+    if state['scorer'] is None:
+        raise ValueError(f"{feature} not available when serving from shards")
+    return state['scorer']
+
+# Models by name, loaded on first use; the default one stays loaded
+REGISTRY = ModelRegistry(load_sharded_state if SHARD_ADDRESSES else load_state)
+
+# Startup load of the default model: READY once usable, LOADED once finished either way
+READY = threading.Event()
+LOADED = threading.Event()
+LOAD_STATUS = {"status": "starting", "started": time.monotonic(), "seconds": None, "error": None}
+LOADING = {}  # model path → current load phase
+
+def initialize_model():
+    """Load the default model on startup"""
+    LOAD_STATUS.update(status="loading", started=time.monotonic())
+    try:
+        print("[*] Loading model...")
+        MODEL_STATE.update(REGISTRY.get().state)
+        LOAD_STATUS.update(status="ready", seconds=round(time.monotonic() - LOAD_STATUS["started"], 3))
+        READY.set()
+        return True
+    except Exception as e:
+        LOAD_STATUS.update(status="failed", error=str(e))
+        print(f"[✗] {e}")
+        if not isinstance(e, (FileNotFoundError, ModelNotFound)):
+            raise
+        return False
+    finally:
+        LOADED.set()
+
+def load_in_background(on_ready=None):
+    """Load the default model on a daemon thread; on_ready() runs after a successful load"""
+    def run():
+        try:
+            ok = initialize_model()
+        except Exception:
+            return
+        if ok and on_ready is not None:
+            on_ready()
+    threading.Thread(target=run, daemon=True, name="model-load").start()
+
+def wait_ready(timeout=READY_TIMEOUT):
+    """Wait up to `timeout` seconds for the startup load; True if the default model is usable"""
+    LOADED.wait(timeout)
+    return READY.is_set()
+
+def load_status():
+    """Startup load progress for the readiness endpoint"""
+    status = dict(LOAD_STATUS)
+    elapsed = time.monotonic() - status.pop("started")
+    if status["status"] in ("starting", "loading"):
+        status["seconds"] = round(elapsed, 3)
+        status["phase"] = LOADING.get(str(REGISTRY.paths()[0]), status["status"])
+    return status
+
+def _token_done(t0, started, generated):
+    """Record one generated token; returns the new token count"""
+    now = time.perf_counter()
+    metrics.TOKEN_LATENCY.observe(now - t0)
+    metrics.TOKENS.inc()
+    if not generated:
+        metrics.TTFT.observe(now - started)
+    return generated + 1
+
+def _token_counted(t0, started, generated):
+    return generated + 1
+
+def generate_tokens(tokens, max_length=500, rng=random, should_stop=None, started=None, profile=None, metered=True,
+                    state=None, decoder=None):
+    """Extend `tokens` (the story so far, appended to in place) with the interpolated trigram model
+
+    Yields each new token. Only the last two tokens are used as context, so a
+    session can pass just its trailing tokens.
+    rng: random.Random (or the random module) used for sampling.
+    should_stop: optional callable checked before each token; generation
+    ends early when it returns True (client gone, deadline passed).
+    started: perf_counter() time the request arrived, for time-to-first-token.
+    profile: optional profiling.Profile; time is charged to the phases
+    interpolate / normalize / sample (time spent by the caller between
+    tokens is excluded).
+    metered: record serving metrics (off for background pool refills).
+    state: serving state of the model to use (default: MODEL_STATE).
+    decoder: optional constraints.Decoder; tokens are then sampled from the
+    vectorized distribution with the request's constraints applied.
+    Without a decoder, tokens come from the shard servers when serving
+    sharded (shard_router.py), else from the state's quantized tables when it
+    has them (quantize.py), else from the count dicts.
+    """
+    state = MODEL_STATE if state is None else state
+    sampler = state.get('sharded') or state.get('quantized')   # both have sample(tokens, rng)
+    if sampler is None:
+        uni = state['uni_count']
+        bi = state['bi_count']
+        tri = state['tri_count']
+        l3, l2, l1 = state['lambdas'].values()
+        total = state['total_uni']
+    
+    start = time.perf_counter()
+    started = start if started is None else started
+    generated = 0
+    lap = profile.lap if profile is not None else None
+    token_done = _token_done if metered else _token_counted
+    budget = decoder.budget(max_length) if decoder is not None else 0
+    if metered:
+        metrics.ACTIVE_STREAMS.inc()
+    try:
+        if not tokens:
+            t0 = time.perf_counter()
+            if lap: lap()
+            if decoder is not None:
+                tokens.append(decoder.sample(tokens, generated, rng, budget))
+            elif sampler is not None:
+                tokens.append(sampler.sample(tokens, rng))
+            else:
+                tokens.append(rng.choices(list(uni.keys()), weights=[uni[t] for t in uni])[0])
+            if lap: lap("sample")
+            generated = token_done(t0, started, generated)
+            yield tokens[-1]
+            if tokens[-1] == "<EOT>":
+                return
+
+        for _ in range(max_length):
+            if should_stop is not None and should_stop():
+                return
+            t0 = time.perf_counter()
+            if lap: lap()
+            if decoder is not None:
+                next_tok = decoder.sample(tokens, generated, rng, budget)
+                if lap: lap("sample")
+            elif sampler is not None:
+                next_tok = sampler.sample(tokens, rng)
+                if lap: lap("sample")
+            elif len(tokens) < 2:
+                next_tok = rng.choices(list(uni.keys()), weights=[uni[t] for t in uni])[0]
+                if lap: lap("sample")
+            else:
+                w_prev2, w_prev1 = tokens[-2], tokens[-1]
+                probs = {}
+                
+                for w_curr in uni.keys():
+                    p_tri = (tri[(w_prev2, w_prev1, w_curr)] / bi[(w_prev2, w_prev1)]) if bi[(w_prev2, w_prev1)] > 0 else 0
+                    p_bi = (bi[(w_prev1, w_curr)] / uni[w_prev1]) if uni[w_prev1] > 0 else 0
+                    p_uni = uni[w_curr] / total
+                    
+                    probs[w_curr] = l3 * p_tri + l2 * p_bi + l1 * p_uni
+                if lap: lap("interpolate")
+                
+                total_prob = sum(probs.values())
+                if total_prob > 0:
+                    probs = {w: p / total_prob for w, p in probs.items()}
+                    if lap: lap("normalize")
+                    next_tok = rng.choices(list(probs.keys()), weights=list(probs.values()))[0]
+                else:
+                    next_tok = rng.choices(list(uni.keys()), weights=[uni[t] for t in uni])[0]
+                if lap: lap("sample")
+            
+            tokens.append(next_tok)
+            generated = token_done(t0, started, generated)
+            yield next_tok
+            
+            if next_tok == "<EOT>":
+                break
+    finally:
+        if metered:
+            metrics.ACTIVE_STREAMS.dec()
+            elapsed = time.perf_counter() - start
+            metrics.STREAM_DURATION.observe(elapsed)
+            if generated and elapsed > 0:
+                metrics.TOKENS_PER_SECOND.observe(generated / elapsed)
+
+def text_tokens(text, state=None):
+    """Model tokens of user text (a prefix or context): BPE-encoded with the model's merges,
+    or split on spaces for a model without saved merges"""
+    state = MODEL_STATE if state is None else state
+    if state.get('sharded') is not None:
+        return state['sharded'].tokens(text)
+    scorer = state['scorer']
+    return scorer.tokens(text, "corpus") if scorer.merges is not None else text.split()
+
+def generate_story(prefix="", max_length=500, should_stop=None, started=None, profile=None, state=None):
+    """Generate story using interpolated trigram model; yields the story text so far after each token"""
+    state = MODEL_STATE if state is None else state
+    tokens = text_tokens(prefix, state) if prefix else []
+    text = " ".join(prefix.split())
+    detok = Detokenizer(state['word_start'], started=bool(text))
+    for tok in generate_tokens(tokens, max_length, random, should_stop, started, profile, state=state):
+        text += detok.feed(tok)
+        if profile is not None:
+            profile.lap("join")
+        yield text
+
+def replay_tokens(story, tokens, should_stop=None, started=None):
+    """Serve a pre-generated story: append its tokens to `tokens` and yield them like generate_tokens"""
+    started = time.perf_counter() if started is None else started
+    for i, tok in enumerate(story):
+        if should_stop is not None and should_stop():
+            return
+        tokens.append(tok)
+        metrics.TOKENS.inc()
+        if not i:
+            metrics.TTFT.observe(time.perf_counter() - started)
+        yield tok
+
+def _pool_generate(prefix, rng, should_stop):
+    """One story for the pool, or None if a request arrived meanwhile"""
+    stopped = False
+    def stop():
+        nonlocal stopped
+        stopped = should_stop()
+        return stopped
+    tokens = text_tokens(prefix)
+    new = list(generate_tokens(tokens, POOL_LENGTH, rng, stop, metered=False))
+    return None if stopped else new
+
+# Pre-generated stories for popular prefixes, refilled while no request is running or queued
+STORY_POOL = StoryPool(_pool_generate, idle=lambda: SCHEDULER.active == 0 and SCHEDULER.queued == 0)
+
+def predict_next(context="", k=10):
+    """Top-k next tokens after `context` from the precomputed index
+
+    Returns:
+        ([(token, probability), ...], context order used: 3, 2 or 1)
+
+    Raises:
+        ValueError: serving from shards (no local index)
+    """
+    if MODEL_STATE['index'] is None:
+        raise ValueError("predictions not available when serving from shards")
+    t0 = time.perf_counter()
+    result = MODEL_STATE['index'].lookup(text_tokens(context), k if k > 0 else 10)
+    metrics.PREDICT_LATENCY.observe(time.perf_counter() - t0)
+    return result
+
+def score_texts(texts, fmt="", per_token=False):
+    """Log-probability and perplexity of each text, in one vectorized batch
+
+    Holds a generation slot while scoring, since a large batch is as much
+    work as a story.
+
+    Raises:
+        ValueError: too many texts, unknown format, no saved BPE merges for raw text, or serving from shards
+        Rejected: no slot within GENERATION_TIMEOUT_SECONDS
+    """
+    scorer = _scorer(MODEL_STATE, "scoring")
+    if len(texts) > MAX_SCORE_TEXTS:
+        raise ValueError(f"at most {MAX_SCORE_TEXTS} texts per request (got {len(texts)})")
+    with SCHEDULER.slot(Deadline(GENERATION_TIMEOUT)):
+        t0 = time.perf_counter()
+        scores = scorer.score(texts, fmt or "raw", per_token)
+        metrics.SCORE_LATENCY.observe(time.perf_counter() - t0)
+    metrics.SCORED_TOKENS.inc(amount=sum(s['num_tokens'] for s in scores))
+    return scores
+
+def open_session(session_id="", model="", constraints=None):
+    """Check out the session to continue, or create a new one for `model` when session_id is empty
+
+    The model is loaded first if needed; a continuation uses the session's model.
+    `constraints` (constraints.Constraints) are compiled for that model.
+
+    Returns:
+        (session, registry.LoadedModel, constraints.Decoder or None)
+
+    Raises:
+        SessionNotFound, SessionBusy, ModelNotFound,
+        ValueError: `model` differs from the session's, or constraints that don't fit the model
+            (or any, when serving from shards)
+    """
+    if not session_id:
+        loaded = REGISTRY.get(model)
+        decoder = Decoder(constraints, _scorer(loaded.state, "constraints")) if constraints else None
+        return SESSIONS.create(model=loaded.name), loaded, decoder
+    try:
+        session = SESSIONS.checkout(session_id)
+    except SessionNotFound:
+        metrics.CACHE_REQUESTS.inc("sessions", "miss")
+        raise
+    metrics.CACHE_REQUESTS.inc("sessions", "hit")
+    try:
+        if model and REGISTRY.key(model) != session.model:
+            raise ValueError(f"session {session_id} uses model {session.model!r}, not {model!r}")
+        loaded = REGISTRY.get(session.model)
+        decoder = Decoder(constraints, _scorer(loaded.state, "constraints")) if constraints else None
+        return session, loaded, decoder
+    except BaseException:
+        SESSIONS.checkin(session)
+        raise
+
+def session_chunks(session, prefix="", max_length=500, delta=False, should_stop=None, started=None, profile=None,
+                   state=None, flush_tokens=COALESCE_TOKENS, flush_ms=COALESCE_MS, decoder=None):
+    """Generate within a session; yields (chunk, num_tokens, is_final)
+
+    A new session starts from `prefix` and ends at max_length tokens in total;
+    on the default model it is served from STORY_POOL when a pre-generated
+    story is ready.
+    A continuation appends `prefix` (may be empty) to the session's trailing
+    tokens and generates up to max_length new tokens, without re-deriving the
+    story. Chunks are display text (see detokenizer.py): this request's text so
+    far, or just the new text when `delta` is set; a continuation's text starts
+    with the space that joins it to the story. num_tokens is the story length.
+    The first token is sent at once, later ones in batches (see COALESCE_TOKENS).
+    The session is advanced per token, so it is current even if the stream stops.
+    With a constraints `decoder`, the story is always generated (not pooled).
+    """
+    state = MODEL_STATE if state is None else state
+    continuing = session.length > 0
+    new = text_tokens(prefix, state) if prefix else []
+    tokens = session.context + new
+    length = session.length + len(new)
+    target = length + max_length if continuing else max_length
+    text = " ".join(prefix.split())
+    if continuing and text:
+        text = " " + text
+    detok = Detokenizer(state['word_start'], started=continuing or bool(text))
+    story = None
+    if not continuing and STORY_POOL.size > 0 and session.model == REGISTRY.default and decoder is None:
+        STORY_POOL.record(prefix)
+        story = STORY_POOL.take(prefix, target - length)
+    if story is not None:
+        source = replay_tokens(story, tokens, should_stop, started)
+    else:
+        source = generate_tokens(tokens, target - length, session.rng, should_stop, started, profile, state=state,
+                                 decoder=decoder)
+    pending = []          # display text of tokens generated since the last chunk
+    flushed = None        # perf_counter of the last chunk; None until the first
+    for tok in source:
+        length += 1
+        pending.append(detok.feed(tok))
+        is_final = tok == "<EOT>" or length >= target
+        session.advance(tokens, length)
+        now = time.perf_counter()
+        if not (is_final or flushed is None or tok in FLUSH_TOKENS or len(pending) >= flush_tokens
+                or (now - flushed) * 1000 >= flush_ms):
+            continue
+        flushed = now
+        chunk = "".join(pending)
+        pending = []
+        if not delta:
+            text += chunk
+            chunk = text
+            if profile is not None:
+                profile.lap("join")
+        yield chunk, length, is_final
+        if is_final:
+            break
+    else:
+        if pending:  # stopped early: send what was generated
+            text += "".join(pending)
+            yield "".join(pending) if delta else text, length, False
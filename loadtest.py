@@ -0,0 +1,424 @@
+"""Load generator for the gRPC Generate RPC and the HTTP /generate SSE endpoint
+
+Closed loop (--concurrency N): N workers issue requests back to back.
+Open loop (--rate R): requests arrive as a Poisson process at R/s regardless of
+how fast the server answers; latency is measured from the scheduled arrival
+time, so queueing shows up in the numbers instead of slowing the load down.
+
+Reports time-to-first-token, inter-message latency (streams batch tokens, see
+COALESCE_TOKENS), total latency percentiles, throughput, messages sent and error
+rates as JSON, plus the server's CPU time with --spawn; --max-* / --min-*
+thresholds turn it into a release gate (exit status 1 on violation).
+
+--cold-start grpc|http instead times a freshly spawned server: until it
+answers at all (live), until it reports ready, and until a request sent the
+moment the process started gets its first token.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import grpc
+
+import generate_pb2
+import generate_pb2_grpc
+
+PERCENTILES = (50, 90, 95, 99)
+
+def load_prefixes(path):
+    """One prefix per line (blank line = no prefix); repeat a line to weight it"""
+    if not path:
+        return [""]
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f] or [""]
+
+class Result:
+    """Timings of one request (perf_counter seconds, relative to its scheduled start)"""
+    __slots__ = ("ttft", "gaps", "total", "tokens", "messages", "error")
+
+    def __init__(self):
+        self.ttft = None
+        self.gaps = []
+        self.total = None
+        self.tokens = 0
+        self.messages = 0
+        self.error = None
+
+class GrpcTarget:
+    def __init__(self, address, timeout):
+        self.channel = grpc.insecure_channel(address)
+        self.stub = generate_pb2_grpc.StoryGeneratorStub(self.channel)
+        self.timeout = timeout
+
+    def run(self, prefix, max_length, start):
+        result, last = Result(), None
+        try:
+            request = generate_pb2.GenerateRequest(prefix=prefix, max_length=max_length)
+            for resp in self.stub.Generate(request, timeout=self.timeout):
+                now = time.perf_counter()
+                if last is None:
+                    result.ttft = now - start
+                else:
+                    result.gaps.append(now - last)
+                last = now
+                result.tokens = resp.num_tokens
+                result.messages += 1
+        except grpc.RpcError as e:
+            result.error = e.code().name
+        result.total = time.perf_counter() - start
+        return result
+
+    def close(self):
+        self.channel.close()
+
+class HttpTarget:
+    def __init__(self, url, timeout):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.path = (parsed.path.rstrip("/") or "") + "/generate"
+        self.timeout = timeout
+
+    def run(self, prefix, max_length, start):
+        result, last = Result(), None
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps({"prefix": prefix, "maxLength": max_length})
+            conn.request("POST", self.path, body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            if resp.status != 200:
+                resp.read()
+                result.error = f"HTTP_{resp.status}"
+            else:
+                for line in resp:
+                    if not line.startswith(b"data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if "error" in event:
+                        result.error = event["error"]
+                        break
+                    if "chunk" not in event:
+                        continue
+                    now = time.perf_counter()
+                    if last is None:
+                        result.ttft = now - start
+                    else:
+                        result.gaps.append(now - last)
+                    last = now
+                    result.tokens = event["numTokens"]
+                    result.messages += 1
+                    if event["isFinal"]:
+                        break
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            result.error = type(e).__name__
+        finally:
+            conn.close()
+        result.total = time.perf_counter() - start
+        return result
+
+    def close(self):
+        pass
+
+def make_target(target, timeout):
+    """grpc://host:port or http://host:port"""
+    if target.startswith("grpc://"):
+        return GrpcTarget(target[len("grpc://"):], timeout)
+    if target.startswith("http://"):
+        return HttpTarget(target, timeout)
+    raise ValueError(f"Unsupported target {target!r} (expected grpc://host:port or http://host:port)")
+
+def closed_loop(target, prefixes, max_length, concurrency, requests, duration, rng):
+    """`concurrency` workers, each sending its next request as soon as the previous one ends"""
+    results, lock = [], threading.Lock()
+    issued = iter(range(requests)) if requests else None
+    stop_at = time.perf_counter() + duration if duration else None
+
+    def worker(seed):
+        local = random.Random(seed)
+        while True:
+            with lock:
+                if issued is not None and next(issued, None) is None:
+                    return
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return
+            result = target.run(local.choice(prefixes), max_length, time.perf_counter())
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=worker, args=(rng.random(),)) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def open_loop(target, prefixes, max_length, rate, requests, duration, rng, max_outstanding):
+    """Poisson arrivals at `rate`/s; each request is timed from its scheduled arrival"""
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_outstanding) as pool:
+        begin = time.perf_counter()
+        at = begin
+        while True:
+            at += rng.expovariate(rate)
+            if requests and len(futures) >= requests:
+                break
+            if duration and at - begin >= duration:
+                break
+            delay = at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(target.run, rng.choice(prefixes), max_length, at))
+    return [f.result() for f in futures]
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    summary = {f"p{p}": values[min(len(values) - 1, int(len(values) * p / 100))] for p in PERCENTILES}
+    summary["mean"] = sum(values) / len(values)
+    summary["max"] = values[-1]
+    return {k: round(v, 6) for k, v in summary.items()}
+
+def report(results, elapsed, config, server_cpu=None):
+    ok = [r for r in results if r.error is None]
+    errors = Counter(r.error for r in results if r.error is not None)
+    tokens = sum(r.tokens for r in results)
+    messages = sum(r.messages for r in results)
+    summary = {
+        "config": config,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": dict(errors),
+        "error_rate": round(sum(errors.values()) / len(results), 6) if results else 0.0,
+        "requests_per_second": round(len(results) / elapsed, 3) if elapsed else 0.0,
+        "tokens": tokens,
+        "tokens_per_second": round(tokens / elapsed, 3) if elapsed else 0.0,
+        "ttft_seconds": percentiles([r.ttft for r in ok if r.ttft is not None]),
+        "inter_token_seconds": percentiles([g for r in ok for g in r.gaps]),
+        "total_seconds": percentiles([r.total for r in ok]),
+        "messages": messages,
+        "tokens_per_message": round(tokens / messages, 3) if messages else 0.0,
+    }
+    if server_cpu is not None:
+        summary["server_cpu_seconds"] = round(server_cpu, 3)
+        summary["server_cpu_ms_per_1k_tokens"] = round(server_cpu * 1e6 / tokens, 3) if tokens else None
+    return summary
+
+def check(summary, args):
+    """Release-gate violations as messages (empty when all thresholds pass)"""
+    failures = []
+    total, ttft = summary["total_seconds"] or {}, summary["ttft_seconds"] or {}
+    if args.max_p99 is not None and total.get("p99", float("inf")) > args.max_p99:
+        failures.append(f"p99 total latency {total.get('p99')}s > {args.max_p99}s")
+    if args.max_p99_ttft is not None and ttft.get("p99", float("inf")) > args.max_p99_ttft:
+        failures.append(f"p99 time-to-first-token {ttft.get('p99')}s > {args.max_p99_ttft}s")
+    if args.min_tokens_per_sec is not None and summary["tokens_per_second"] < args.min_tokens_per_sec:
+        failures.append(f"throughput {summary['tokens_per_second']} tokens/s < {args.min_tokens_per_sec}")
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {summary['error_rate']} > {args.max_error_rate}")
+    return failures
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(target, proc, timeout=60):
+    """Poll until the spawned server accepts requests"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with status {proc.returncode}")
+        if target.startswith("grpc://"):
+            try:
+                with grpc.insecure_channel(target[len("grpc://"):]) as channel:
+                    generate_pb2_grpc.StoryGeneratorStub(channel).GetModelInfo(generate_pb2.Empty(), timeout=1)
+                return
+            except grpc.RpcError:
+                pass
+        elif _http_status(target, "/readyz") == 200:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+def _http_status(target, path):
+    """Status of GET path, or None if the server can't be reached"""
+    parsed = urlparse(target)
+    try:
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=1)
+        try:
+            conn.request("GET", path)
+            return conn.getresponse().status
+        finally:
+            conn.close()
+    except (OSError, http.client.HTTPException):
+        return None
+
+def _cpu_seconds(pid):
+    """User + system CPU time of a process (Linux /proc), or None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def spawn(kind):
+    """Start server.py (grpc) or app.py (http) on a free local port; returns (process, target)"""
+    port = _free_port()
+    script, target = {"grpc": ("server.py", f"grpc://127.0.0.1:{port}"),
+                      "http": ("app.py", f"http://127.0.0.1:{port}")}[kind]
+    env = dict(os.environ, PORT=str(port), METRICS_PORT="0")
+    proc = subprocess.Popen([sys.executable, script], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(target, proc)
+    except Exception:
+        proc.kill()
+        raise
+    return proc, target
+
+def cold_start(kind, max_length=20, timeout=120):
+    """Seconds from process start until the server is live, ready, and has answered a first request
+
+    The first request is sent at once and retried while the port is closed or
+    the server turns it away, as a client hitting a fresh instance would.
+    """
+    port = _free_port()
+    script, target = {"grpc": ("server.py", f"grpc://127.0.0.1:{port}"),
+                      "http": ("app.py", f"http://127.0.0.1:{port}")}[kind]
+    env = dict(os.environ, PORT=str(port), METRICS_PORT="0")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    timings = {}
+
+    def first_request():
+        target_obj = make_target(target, timeout)
+        try:
+            while time.perf_counter() - start < timeout and proc.poll() is None:
+                result = target_obj.run("", max_length, start)
+                if result.error is None:
+                    timings["first_token"], timings["first_request_done"] = result.ttft, result.total
+                    return
+                time.sleep(0.02)
+        finally:
+            target_obj.close()
+
+    requester = threading.Thread(target=first_request)
+    requester.start()
+    try:
+        while "ready" not in timings and time.perf_counter() - start < timeout and proc.poll() is None:
+            now = time.perf_counter() - start
+            if kind == "grpc":
+                try:
+                    with grpc.insecure_channel(target[len("grpc://"):]) as channel:
+                        generate_pb2_grpc.StoryGeneratorStub(channel).GetModelInfo(generate_pb2.Empty(), timeout=1)
+                    timings.setdefault("live", now)
+                    timings["ready"] = now
+                except grpc.RpcError:
+                    pass
+            else:
+                status = _http_status(target, "/readyz")
+                if status is not None:
+                    timings.setdefault("live", now)
+                if status == 200 or (status == 404 and _http_status(target, "/") == 200):  # servers without /readyz
+                    timings["ready"] = now
+            time.sleep(0.01)
+        requester.join(timeout)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {k: round(v, 3) for k, v in timings.items()}
+
+def run(args):
+    """Run one load test as configured by the CLI args; returns the JSON summary"""
+    proc = None
+    target_url = args.target
+    if args.spawn:
+        proc, target_url = spawn(args.spawn)
+    target = make_target(target_url, args.timeout)
+    prefixes = load_prefixes(args.prefixes)
+    rng = random.Random(args.seed)
+    config = {
+        "target": target_url, "mode": "open" if args.rate else "closed",
+        "concurrency": args.concurrency, "rate": args.rate, "requests": args.requests,
+        "duration": args.duration, "max_length": args.max_length, "prefixes": len(prefixes),
+    }
+    try:
+        if args.warmup:
+            closed_loop(target, prefixes, args.max_length, 1, args.warmup, None, rng)
+        cpu_start = _cpu_seconds(proc.pid) if proc is not None else None
+        start = time.perf_counter()
+        if args.rate:
+            results = open_loop(target, prefixes, args.max_length, args.rate, args.requests, args.duration,
+                                rng, args.max_outstanding)
+        else:
+            results = closed_loop(target, prefixes, args.max_length, args.concurrency, args.requests,
+                                  args.duration, rng)
+        elapsed = time.perf_counter() - start
+        cpu_end = _cpu_seconds(proc.pid) if cpu_start is not None else None
+        return report(results, elapsed, config, cpu_end - cpu_start if cpu_end is not None else None)
+    finally:
+        target.close()
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load-test story generation over gRPC or HTTP/SSE")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--target", default="grpc://localhost:50051", help="grpc://host:port or http://host:port")
+    where.add_argument("--spawn", choices=["grpc", "http"], help="Start server.py/app.py locally for the run")
+    where.add_argument("--cold-start", choices=["grpc", "http"],
+                       help="Time a freshly started server to live / ready / first request instead")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed-loop workers")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate (requests/s); overrides --concurrency")
+    parser.add_argument("--max-outstanding", type=int, default=256, help="Open-loop in-flight request limit")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--duration", type=float, help="Stop issuing requests after this many seconds")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests before the run")
+    parser.add_argument("--prefixes", help="File of prefixes, one per line")
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report here")
+    parser.add_argument("--max-p99", type=float, help="Fail if p99 total latency (s) exceeds this")
+    parser.add_argument("--max-p99-ttft", type=float, help="Fail if p99 time-to-first-token (s) exceeds this")
+    parser.add_argument("--min-tokens-per-sec", type=float, help="Fail if throughput is below this")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the error rate exceeds this")
+    return parser
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    args = build_parser().parse_args()
+    if args.cold_start:
+        runs = [cold_start(args.cold_start, args.max_length, args.timeout) for _ in range(args.requests or 3)]
+        keys = sorted({k for r in runs for k in r})
+        summary = {"cold_start": args.cold_start, "runs": runs,
+                   "median": {k: sorted(r[k] for r in runs if k in r)[len([r for r in runs if k in r]) // 2]
+                              for k in keys}}
+        print(json.dumps(summary, indent=2))
+        sys.exit(0)
+    if not args.requests and not args.duration:
+        args.requests = 50
+    summary = run(args)
+    failures = check(summary, args)
+    summary["gate"] = {"passed": not failures, "failures": failures}
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.exit(1 if failures else 0)
@@ -6,7 +6,7 @@ from collections import Counter, defaultdict
 
 MODEL_PATH = Path("trigram_model.pkl")
 
-def save_model(uni_count, bi_count, tri_count, lambdas, vocab):
+def save_model(uni_count, bi_count, tri_count, lambdas, vocab, path=MODEL_PATH):
     """Save trained model to disk
     
     Args:
@@ -15,6 +15,7 @@ def save_model(uni_count, bi_count, tri_count, lambdas, vocab):
         tri_count: defaultdict of trigrams
         lambdas: dict with lambda3, lambda2, lambda1
         vocab: set of vocabulary tokens
+        path: output file
     """
     model_data = {
         'uni_count': uni_count,
@@ -25,21 +26,22 @@ def save_model(uni_count, bi_count, tri_count, lambdas, vocab):
         'total_uni': sum(uni_count.values())
     }
     
-    with open(MODEL_PATH, 'wb') as f:
+    with open(path, 'wb') as f:
         pickle.dump(model_data, f)
     
-    print(f"[✓] Model saved to {MODEL_PATH}")
+    print(f"[✓] Model saved to {path}")
 
-def load_model():
+def load_model(path=MODEL_PATH):
     """Load trained model from disk
     
     Returns:
         (uni_count, bi_count, tri_count, lambdas, vocab, total_uni)
     """
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(f"Model not found: {MODEL_PATH}\nRun 'python train_model.py' first.")
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Model not found: {path}\nRun 'python train_model.py' first.")
     
-    with open(MODEL_PATH, 'rb') as f:
+    with open(path, 'rb') as f:
         data = pickle.load(f)
     
     uni_count = Counter(data['uni_count'])
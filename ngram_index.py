@@ -0,0 +1,201 @@
+"""Precomputed top-k next-token index for the interpolated trigram model
+
+For every (w1, w2) context seen in a trigram, the full interpolated
+distribution is computed once (with numpy, in batches of contexts) and only its top TOPK_MAX
+entries are kept; contexts without trigrams fall back to a per-last-token
+table, then to unigrams. Probabilities are normalized exactly as in
+generation, so a lookup matches what the sampler would draw from.
+Queries are a dict lookup and a slice.
+
+Run directly to check the index against brute-force scoring and benchmark
+lookup latency (in-process, and over gRPC with --rpc host:port).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from itertools import chain, repeat
+
+import numpy as np
+
+TOPK_MAX = int(os.environ.get("TOPK_MAX", "20"))
+BUILD_CHUNK = 4096  # trigram contexts scored per numpy batch while building
+
+class NgramIndex:
+    """Top-k continuations by context: trigram pairs, last-token fallback, unigram
+
+    Results are rows of two (rows x k_max) arrays (token IDs, probabilities):
+    row 0 is the unigram distribution, rows 1..V the last-token fallbacks and
+    the rest one per trigram context, found through a dict.
+    """
+
+    def __init__(self, vocab, ids, probs, rows):
+        self.vocab = vocab
+        self.ids = ids
+        self.probs = probs
+        self.rows = rows          # (w1, w2) or w2 → row
+        self.k_max = ids.shape[1]
+
+    @classmethod
+    def build(cls, uni_count, bi_count, tri_count, lambdas, k_max=TOPK_MAX):
+        """Index the interpolated distributions of a trained model"""
+        l3, l2, l1 = lambdas["lambda3"], lambdas["lambda2"], lambdas["lambda1"]
+        vocab = list(uni_count)
+        ids = {w: i for i, w in enumerate(vocab)}
+        V = len(vocab)
+        k_max = min(k_max, V)
+
+        uni = np.array([uni_count[w] for w in vocab], dtype=np.float64)
+        p_uni = uni / uni.sum()
+        bigrams = np.zeros((V, V))
+        for (a, b), n in bi_count.items():
+            if a in ids and b in ids:
+                bigrams[ids[a], ids[b]] = n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_bi = np.where(uni[:, None] > 0, bigrams / uni[:, None], 0.0)
+        # Distribution given only the last token (no trigram evidence for the pair)
+        base = l2 * p_bi + l1 * p_uni[None, :]
+
+        # Trigrams as ID arrays; each (w1, w2) context with bigram evidence gets a row
+        tri = np.fromiter(map(ids.get, chain.from_iterable(tri_count), repeat(V)), dtype=np.int64,
+                          count=3 * len(tri_count)).reshape(-1, 3)
+        counts = np.fromiter(tri_count.values(), dtype=np.float64, count=len(tri_count))
+        keep = (tri < V).all(axis=1) & (counts > 0)
+        tri, counts = tri[keep], counts[keep]
+        bi_ab = bigrams[tri[:, 0], tri[:, 1]]
+        keep = bi_ab > 0
+        tri, p_tri = tri[keep], counts[keep] / bi_ab[keep]
+        contexts, context_of = np.unique(tri[:, 0] * V + tri[:, 1], return_inverse=True)
+        order = np.argsort(context_of, kind="stable")
+        context_of, cols, p_tri = context_of[order], tri[order, 2], p_tri[order]
+
+        n_rows = 1 + V + len(contexts)
+        top_ids = np.zeros((n_rows, k_max), dtype=np.uint16 if V <= 0xFFFF else np.uint32)
+        top_probs = np.zeros((n_rows, k_max))
+
+        def put(start, p):
+            """Top k_max of each row of p (normalized) into rows start, start+1, ..."""
+            total = p.sum(axis=1, keepdims=True)
+            empty = total[:, 0] <= 0
+            if empty.any():
+                p[empty], total[empty] = p_uni, 1.0
+            best = np.argpartition(-p, k_max - 1, axis=1)[:, :k_max] if k_max < V else \
+                np.broadcast_to(np.arange(V), p.shape)
+            best = np.take_along_axis(best, np.argsort(-np.take_along_axis(p, best, 1), axis=1, kind="stable"), 1)
+            top_ids[start:start + len(p)] = best
+            top_probs[start:start + len(p)] = np.take_along_axis(p, best, 1) / total
+
+        put(0, p_uni[None, :].copy())
+        put(1, base.copy())
+        rows = {w: 1 + i for i, w in enumerate(vocab)}
+        # Trigram contexts in chunks: last-token rows plus the l3-weighted trigram terms
+        bounds = np.searchsorted(context_of, np.arange(0, len(contexts) + BUILD_CHUNK, BUILD_CHUNK))
+        for n, start in enumerate(range(0, len(contexts), BUILD_CHUNK)):
+            lo, hi = bounds[n], bounds[n + 1]
+            p = base[contexts[start:start + BUILD_CHUNK] % V]
+            p[context_of[lo:hi] - start, cols[lo:hi]] += l3 * p_tri[lo:hi]
+            put(1 + V + start, p)
+        rows.update(((vocab[x // V], vocab[x % V]), 1 + V + i) for i, x in enumerate(contexts.tolist()))
+        return cls(vocab, top_ids, top_probs, rows)
+
+    def lookup(self, tokens, k=10):
+        """Top-k (token, probability) after `tokens`, and the context order used (3, 2 or 1)
+
+        Mirrors generation: fewer than two context tokens means unigram sampling.
+        """
+        k = max(1, min(k, self.k_max))
+        row, order = 0, 1
+        if len(tokens) >= 2:
+            row = self.rows.get((tokens[-2], tokens[-1]))
+            order = 3
+            if row is None:
+                row, order = self.rows.get(tokens[-1], 0), 2
+                if not row:
+                    order = 1
+        vocab = self.vocab
+        return [(vocab[i], p) for i, p in zip(self.ids[row, :k].tolist(), self.probs[row, :k].tolist())], order
+
+    def __len__(self):
+        return len(self.rows) - len(self.vocab)
+
+    def nbytes(self):
+        return self.ids.nbytes + self.probs.nbytes
+
+def brute_force(tokens, uni, bi, tri, lambdas, total):
+    """Full-vocabulary scoring as generation does it (reference for the index)"""
+    l3, l2, l1 = lambdas["lambda3"], lambdas["lambda2"], lambdas["lambda1"]
+    if len(tokens) < 2:
+        return {w: n / total for w, n in uni.items()}
+    w_prev2, w_prev1 = tokens[-2], tokens[-1]
+    probs = {}
+    for w in uni:
+        p_tri = tri.get((w_prev2, w_prev1, w), 0) / bi[(w_prev2, w_prev1)] if bi.get((w_prev2, w_prev1), 0) > 0 else 0
+        p_bi = bi.get((w_prev1, w), 0) / uni[w_prev1] if uni.get(w_prev1, 0) > 0 else 0
+        probs[w] = l3 * p_tri + l2 * p_bi + l1 * uni[w] / total
+    s = sum(probs.values())
+    return {w: p / s for w, p in probs.items()}
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {f"p{p}": samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in (50, 99)} | \
+        {"max": samples[-1]}
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Check and benchmark the top-k next-token index")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--rpc", help="Also time PredictNext against a running server (host:port)")
+    args = parser.parse_args()
+
+    from model import load_model
+    uni, bi, tri, lambdas, vocab, total = load_model()
+    start = time.perf_counter()
+    index = NgramIndex.build(uni, bi, tri, lambdas)
+    print(f"[✓] Built index: {len(index)} trigram contexts, k_max={index.k_max}, "
+          f"{index.nbytes() / 2**20:.1f} MB arrays ({time.perf_counter() - start:.2f}s)")
+
+    rng = random.Random(0)
+    pair_contexts = [c for c in index.rows if isinstance(c, tuple)]
+    words = list(uni)
+    contexts = [list(rng.choice(pair_contexts)) if rng.random() < 0.8 else rng.sample(words, 2)
+                for _ in range(args.queries)]
+
+    # Correctness against full-vocabulary scoring
+    worst = 0.0
+    for ctx in contexts[:300]:
+        got, _ = index.lookup(ctx, args.k)
+        ref = brute_force(ctx, uni, bi, tri, lambdas, total)
+        ranked = sorted(ref.values(), reverse=True)[:args.k]
+        worst = max(worst, max(abs(p - ref[t]) for t, p in got), max(abs(a - b) for a, (_, b) in zip(ranked, got)))
+    print(f"[✓] Max probability error vs brute force (300 contexts): {worst:.2e}")
+
+    brute = []
+    for ctx in contexts[:300]:
+        t0 = time.perf_counter()
+        ref = brute_force(ctx, uni, bi, tri, lambdas, total)
+        sorted(ref.items(), key=lambda kv: -kv[1])[:args.k]
+        brute.append(time.perf_counter() - t0)
+
+    lat = []
+    for ctx in contexts:
+        t0 = time.perf_counter()
+        index.lookup(ctx, args.k)
+        lat.append(time.perf_counter() - t0)
+    fmt = lambda d: ", ".join(f"{k} {v * 1e6:.1f}µs" for k, v in d.items())
+    print(f"[*] Brute-force scoring: {fmt(_percentiles(brute))}")
+    print(f"[*] Index lookup:        {fmt(_percentiles(lat))}")
+
+    if args.rpc:
+        import grpc
+        import generate_pb2
+        import generate_pb2_grpc
+        stub = generate_pb2_grpc.StoryGeneratorStub(grpc.insecure_channel(args.rpc))
+        rpc = []
+        for ctx in contexts[:2000]:
+            t0 = time.perf_counter()
+            stub.PredictNext(generate_pb2.PredictRequest(context=" ".join(ctx), k=args.k))
+            rpc.append(time.perf_counter() - t0)
+        print(f"[*] PredictNext RPC:     {fmt(_percentiles(rpc[100:]))}")
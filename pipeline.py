@@ -0,0 +1,222 @@
+"""Incremental build pipeline: preprocess → dedup → tokenize → train (→ quantize)
+
+Each stage is keyed by a content hash of its input files, its parameters and
+its own source code. Stage outputs live in a local artifact store
+(.artifacts/<stage>/<key>/); a stage whose key is already in the store is
+skipped and its cached outputs are reused. Final outputs are copied to the
+usual working filenames in the workdir (dedup_report.json, tokenized_corpus.*,
+bpe_merges.json, trigram_model.pkl, quantized_tables.npz when quantize_bits is
+set); all are ignored by git. The cleaned and deduplicated corpus.txt stays in
+the store, so a build never overwrites the tracked corpus.txt.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import corpus_format
+import dedup
+import model
+import ngram_counts
+import preprocess
+import quantize
+import scoring
+import tokenizer
+import train_model
+
+STORE = Path(".artifacts")
+HASH_CACHE = "hashes.json"
+
+def file_digest(path, cache):
+    """sha256 of a file, memoized on (size, mtime) so unchanged files aren't re-read"""
+    path = Path(path).resolve()
+    st = path.stat()
+    stamp = [st.st_size, st.st_mtime_ns]
+    hit = cache.get(str(path))
+    if hit and hit["stamp"] == stamp:
+        return hit["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    cache[str(path)] = {"stamp": stamp, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+class Stage:
+    """A pipeline stage: run(inputs, params, out_dir, options) writes `outputs` into out_dir
+
+    `params` are part of the content address; `options` (e.g. worker count) are not
+    because they don't change the outputs. `exported` outputs (default: all)
+    are copied into the workdir.
+    """
+
+    def __init__(self, name, run, outputs, modules, exported=None):
+        self.name = name
+        self.run = run
+        self.outputs = outputs
+        self.modules = modules
+        self.exported = outputs if exported is None else exported
+
+    def key(self, inputs, params, cache):
+        """Content address of this stage's result (inputs are ordered)"""
+        spec = {
+            "stage": self.name,
+            "inputs": [[name, file_digest(path, cache)] for name, path in inputs.items()],
+            "params": params,
+            "code": {m.__name__: file_digest(m.__file__, cache) for m in self.modules},
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _preprocess(inputs, params, out, options):
+    preprocess.main(in_files=[Path(p) for p in inputs.values()], out_file=out / "corpus.txt",
+                    workers=options.get("workers"))
+
+def _dedup(inputs, params, out, options):
+    dedup.dedup(inputs["corpus"], out / "corpus.txt", out / "dedup_report.json",
+                num_perm=params["num_perm"], bands=params["bands"], threshold=params["threshold"])
+
+def _tokenize(inputs, params, out, options):
+    tokenizer.tokenize(inputs["corpus"], vocab_size=params["vocab_size"], special=params["special"],
+                       text_out=out / "tokenized_corpus.txt", bin_out=out / "tokenized_corpus.bin",
+                       merges_out=out / "bpe_merges.json", word_start=params["word_start"])
+
+def _train(inputs, params, out, options):
+    train_model.train(inputs["tokens"], dev_fraction=params["dev_fraction"], model_path=out / "trigram_model.pkl")
+
+def _quantize(inputs, params, out, options):
+    uni, bi, tri, lambdas = model.load_model(inputs["model"])[:4]
+    quantize.export(scoring.Scorer(uni, bi, tri, lambdas), params["bits"], out / quantize.QUANTIZED_TABLES, inputs["model"])
+
+STAGES = {
+    "preprocess": Stage("preprocess", _preprocess, ["corpus.txt"], [preprocess], exported=[]),
+    "dedup": Stage("dedup", _dedup, ["corpus.txt", "dedup_report.json"], [dedup], exported=["dedup_report.json"]),
+    "tokenize": Stage("tokenize", _tokenize, ["tokenized_corpus.txt", "tokenized_corpus.bin", "bpe_merges.json"],
+                      [tokenizer, corpus_format]),
+    "train": Stage("train", _train, ["trigram_model.pkl"], [train_model, ngram_counts, model]),
+    "quantize": Stage("quantize", _quantize, [quantize.QUANTIZED_TABLES], [quantize, scoring]),
+}
+
+def run_stage(stage, inputs, params, store, cache, options=None, force=False):
+    """Run a stage unless its content address is already in the store
+
+    Returns:
+        (artifact directory, whether it was a cache hit)
+    """
+    key = stage.key(inputs, params, cache)
+    target = Path(store) / stage.name / key
+    if target.exists() and not force:
+        return target, True
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=target.parent))
+    try:
+        stage.run(inputs, params, tmp, options or {})
+        missing = [o for o in stage.outputs if not (tmp / o).exists()]
+        if missing:
+            raise RuntimeError(f"Stage {stage.name} did not produce {missing}")
+        (tmp / "manifest.json").write_text(json.dumps(
+            {"stage": stage.name, "key": key, "inputs": {k: str(v) for k, v in inputs.items()},
+             "params": params, "created": time.time()}, ensure_ascii=False, indent=2), encoding="utf-8")
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            shutil.rmtree(tmp)
+    return target, False
+
+def plan(config):
+    """Stages to run as (name, inputs, params, chained output); None inputs take the previous stage's output"""
+    csvs = {str(p): p for p in map(Path, config["csv_files"]) if p.exists()}
+    stages = [("preprocess", csvs, {}, "corpus.txt")]
+    if config["dedup"]:
+        stages.append(("dedup", {"corpus": None}, config["dedup"], "corpus.txt"))
+    stages.append(("tokenize", {"corpus": None},
+                   {"vocab_size": config["vocab_size"], "special": config["special"],
+                    "word_start": config["word_start"]}, "tokenized_corpus.bin"))
+    stages.append(("train", {"tokens": None}, {"dev_fraction": config["dev_fraction"]}, "trigram_model.pkl"))
+    if config.get("quantize_bits"):
+        stages.append(("quantize", {"model": None}, {"bits": config["quantize_bits"]}, quantize.QUANTIZED_TABLES))
+    return stages
+
+def build(config, store=STORE, workdir=Path("."), force=()):
+    """Run all stages, reusing cached artifacts, and copy final outputs into workdir
+
+    Returns:
+        {stage name: artifact directory}
+    """
+    store = Path(store)
+    store.mkdir(parents=True, exist_ok=True)
+    Path(workdir).mkdir(parents=True, exist_ok=True)
+    cache_path = store / HASH_CACHE
+    cache = json.loads(cache_path.read_text(encoding="utf-8")) if cache_path.exists() else {}
+    options = {"workers": config.get("workers")}
+
+    artifacts, previous = {}, None
+    try:
+        for name, inputs, params, chained in plan(config):
+            stage = STAGES[name]
+            inputs = {k: (v if v is not None else previous) for k, v in inputs.items()}
+            start = time.perf_counter()
+            artifact, hit = run_stage(stage, inputs, params, store, cache, options, force=name in force)
+            print(f"[{'=' if hit else '✓'}] {name:<10} {'cached' if hit else 'built '} "
+                  f"{artifact} ({time.perf_counter() - start:.2f}s)")
+            artifacts[name] = artifact
+            previous = artifact / chained
+            for output in stage.exported:
+                shutil.copy2(artifact / output, Path(workdir) / output)
+    finally:
+        cache_path.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    return artifacts
+
+def default_config():
+    """Build settings; a --config JSON file may override any key"""
+    return {
+        "csv_files": [str(p) for p in preprocess.IN_FILES],
+        "dedup": {"num_perm": dedup.NUM_PERM, "bands": dedup.BANDS, "threshold": dedup.THRESHOLD},
+        "vocab_size": tokenizer.VOCAB_SIZE,
+        "special": dict(tokenizer.SPECIAL),
+        "word_start": tokenizer.WORD_START,
+        "dev_fraction": train_model.DEV_FRACTION,
+        "workers": None,
+        "quantize_bits": None,  # 8 or 16: also export quantized sampling tables (quantize.py)
+    }
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Build corpus, tokenizer output and model incrementally")
+    parser.add_argument("--config", help="JSON file overriding default_config() keys")
+    parser.add_argument("--csv", nargs="+", help="Build from these CSV files only (e.g. one genre)")
+    parser.add_argument("--workdir", default=".", help="Where final outputs go, e.g. models/funny for the registry")
+    parser.add_argument("--vocab-size", type=int)
+    parser.add_argument("--dev-fraction", type=float)
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--workers", type=int, help="preprocess worker processes")
+    parser.add_argument("--quantize-bits", type=int, choices=[8, 16], help="Also export quantized sampling tables")
+    parser.add_argument("--store", default=str(STORE))
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES), help="Rebuild these stages")
+    args = parser.parse_args()
+
+    config = default_config()
+    if args.config:
+        config.update(json.loads(Path(args.config).read_text(encoding="utf-8")))
+    if args.csv:
+        config["csv_files"] = args.csv
+    if args.vocab_size is not None:
+        config["vocab_size"] = args.vocab_size
+    if args.dev_fraction is not None:
+        config["dev_fraction"] = args.dev_fraction
+    if args.workers is not None:
+        config["workers"] = args.workers
+    if args.quantize_bits:
+        config["quantize_bits"] = args.quantize_bits
+    if args.no_dedup:
+        config["dedup"] = None
+
+    build(config, store=args.store, workdir=Path(args.workdir), force=set(args.force))
@@ -0,0 +1,180 @@
+"""Opt-in request profiling: per-phase timers and a sampling profiler (folded stacks)
+
+Profiling is off by default and costs one `is None` check per token when off.
+It is enabled per request (HTTP header / gRPC metadata `x-profile: timers|sample`)
+or for every request through the global mode (PROFILE_MODE env, admin switch).
+Any client may ask for timers, which are only returned with its response;
+stack sampling and files in PROFILE_DIR need the admin token (`x-admin-token`,
+matching ADMIN_TOKEN) or the global mode.
+
+Profiles are written to PROFILE_DIR as folded stacks ("frame;frame;frame count"),
+ready for flamegraph.pl, speedscope or inferno; only the newest PROFILE_MAX_FILES
+are kept. Sampled profiles count samples; timer-only profiles weight each phase
+by microseconds.
+"""
+
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from itertools import count
+from pathlib import Path
+
+MODES = ("off", "timers", "sample")
+HEADER = "x-profile"
+ADMIN_HEADER = "x-admin-token"
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))  # profiles kept; the oldest are deleted
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.002"))
+
+_mode = os.environ.get("PROFILE_MODE", "off")
+_ids = count(1)
+_prune_lock = threading.Lock()
+
+def authorized(token):
+    """Whether `token` is the admin token (never when ADMIN_TOKEN is unset)"""
+    expected = os.environ.get("ADMIN_TOKEN")
+    return bool(expected) and bool(token) and hmac.compare_digest(token.encode(), expected.encode())
+
+def set_mode(mode):
+    """Global admin switch: profile every request ("timers"/"sample") or none ("off")"""
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+    _mode = mode
+
+def get_mode():
+    return _mode
+
+def toggle(on="sample"):
+    """Flip the global mode between off and `on` (signal handler friendly); returns the new mode"""
+    set_mode("off" if _mode != "off" else on)
+    return _mode
+
+def start(name, requested=None, admin=False):
+    """Profile for one request, or None when profiling is off
+
+    Args:
+        name: root frame of the profile (e.g. "grpc.Generate")
+        requested: per-request header/metadata value; "1"/"true" mean "timers"
+        admin: the request carries the admin token (see authorized). Without it
+            a requested profile is timers only and is not written to PROFILE_DIR.
+    """
+    mode = requested.strip().lower() if requested else _mode
+    if mode in ("1", "true", "yes", "on"):
+        mode = "timers"
+    if mode not in ("timers", "sample"):
+        return None
+    if requested and not admin:
+        return Profile(name, dump=False)
+    return Profile(name, sample=mode == "sample")
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profile:
+    """Phase timers plus optional stack sampling of the thread that runs the request"""
+
+    def __init__(self, name, sample=False, interval=SAMPLE_INTERVAL, dump=True):
+        self.name = name
+        self.dump = dump
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_ids)}"
+        self.phases = {}
+        self.stacks = Counter()
+        self.sample = sample
+        self.interval = interval
+        self.started = self.last = time.perf_counter()
+        self.elapsed = None
+        self._stop = threading.Event()
+        self._sampler = None
+        self._summary = None
+
+    def add(self, phase, seconds):
+        entry = self.phases.get(phase)
+        if entry is None:
+            self.phases[phase] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def lap(self, phase=None):
+        """Charge the time since the previous lap to `phase` (None just resets the clock)"""
+        now = time.perf_counter()
+        if phase is not None:
+            self.add(phase, now - self.last)
+        self.last = now
+
+    def start_sampling(self):
+        """Sample the calling thread's stack every `interval` seconds until finish()"""
+        if not self.sample or self._sampler is not None:
+            return
+        target = threading.get_ident()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join([self.name, *reversed(stack)])] += 1
+
+        self._sampler = threading.Thread(target=run, daemon=True, name=f"profiler-{self.id}")
+        self._sampler.start()
+
+    def folded(self):
+        """Folded stacks: samples if any were taken, else phase timers in microseconds"""
+        if self.stacks:
+            return [f"{stack} {n}" for stack, n in self.stacks.most_common()]
+        return [f"{self.name};{phase} {round(seconds * 1e6)}" for phase, (seconds, _) in self.phases.items()]
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "elapsed": round(self.elapsed if self.elapsed is not None else time.perf_counter() - self.started, 6),
+            "phases": {p: {"seconds": round(s, 6), "count": n} for p, (s, n) in self.phases.items()},
+            "samples": sum(self.stacks.values()),
+        }
+
+    def finish(self, directory=None):
+        """Stop sampling and (if dumping) write <id>.folded and <id>.json once; returns the summary"""
+        if self._summary is not None:
+            return self._summary
+        self.elapsed = time.perf_counter() - self.started
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if not self.dump:
+            self._summary = self.summary()
+            return self._summary
+        directory = Path(directory or PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        summary = self.summary()
+        summary["file"] = str(directory / f"{self.id}.folded")
+        (directory / f"{self.id}.folded").write_text("\n".join(self.folded()) + "\n", encoding="utf-8")
+        (directory / f"{self.id}.json").write_text(json.dumps({"name": self.name, **summary}, indent=2),
+                                                  encoding="utf-8")
+        prune(directory)
+        self._summary = summary
+        return summary
+
+def prune(directory=None, keep=None):
+    """Delete all but the newest `keep` (PROFILE_MAX_FILES) profiles in `directory`"""
+    directory = Path(directory or PROFILE_DIR)
+    keep = PROFILE_MAX_FILES if keep is None else keep
+    with _prune_lock:
+        profiles = []
+        for path in directory.glob("*.json"):
+            try:
+                profiles.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        profiles.sort()
+        for _, path in profiles[:max(0, len(profiles) - keep)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".folded").unlink(missing_ok=True)
@@ -0,0 +1,281 @@
+"""Quantized log-probability tables: the interpolated trigram model in backoff form, 8 or 16 bits per entry
+
+The interpolated model is rewritten exactly as a backoff model. A trigram
+context (a, b) stores P(w | a, b) for its trigram successors and one backoff
+weight for every other token, P(w | a, b) = bow(a, b) * P(w | b); a bigram
+context b does the same on top of the unigram distribution. Each table of
+log-probabilities (unigram, bigram, trigram) and of log backoff weights gets
+its own codebook of 2**bits levels (1-D Lloyd quantization started from
+quantiles), and an entry is stored as a uint16 successor ID plus a uint8 or
+uint16 code.
+
+Next-token weights are then a few gathers: the unigram distribution scaled by
+the context's backoff weights, with its explicit successors overwritten. When
+QUANTIZED_TABLES exists next to the model file (and was built from it), the
+servers sample from it and drop the count dicts; QUANTIZED_SAMPLING=0 keeps
+the float model. The tables record the model file's size and mtime, so a load
+only hashes the model file when those differ (e.g. after a copy).
+
+  python quantize.py --bits 8       # write quantized_tables.npz next to trigram_model.pkl
+  python quantize.py --report       # memory, dev perplexity and per-token latency, float vs 8/16-bit
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+QUANTIZED_TABLES = "quantized_tables.npz"  # file name, next to the model file
+QUANTIZED_SAMPLING = os.environ.get("QUANTIZED_SAMPLING", "1") != "0"
+LLOYD_ITERATIONS = 20
+TABLES = ("uni", "bi", "tri", "bow2", "bow3")
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def file_stamp(path):
+    """(size, mtime in ns) of a file: a cheap check that it is unchanged since the tables were built"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def quantize(values, bits):
+    """Codebook (sorted) and codes of `values`
+
+    Exact when there are at most 2**bits distinct values; bits=None keeps every
+    distinct value in float64 (the unquantized backoff model, for checking).
+    """
+    distinct = np.unique(values)
+    if bits is None:
+        return distinct, np.searchsorted(distinct, values).astype(np.uint32)
+    levels = 1 << bits
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    if len(distinct) <= levels:
+        return distinct.astype(np.float32), np.searchsorted(distinct, values).astype(dtype)
+    centers = np.unique(np.quantile(values, (np.arange(levels) + 0.5) / levels))
+    for _ in range(LLOYD_ITERATIONS):
+        codes = np.searchsorted((centers[1:] + centers[:-1]) / 2, values)
+        n = np.bincount(codes, minlength=len(centers))
+        sums = np.bincount(codes, weights=values, minlength=len(centers))
+        centers = np.where(n > 0, sums / np.maximum(n, 1), centers)
+    codes = np.searchsorted((centers[1:] + centers[:-1]) / 2, values)
+    return centers.astype(np.float32), codes.astype(dtype)
+
+def backoff_tables(scorer):
+    """A scorer's interpolated model as exact backoff tables (float64 natural logs)
+
+    Returns:
+        dict: uni (V), bi_offsets (V + 1; the successors of b are [off[b], off[b + 1])),
+        bi_succ, bi (log P(w | b)), bow2 (V), tri_ctx (sorted a * S + b),
+        tri_offsets, tri_succ, tri (log P(w | a, b)), bow3 (one per tri_ctx)
+    """
+    V, S = scorer.unk, scorer.size
+    l3, l2, l1 = scorer.l3, scorer.l2, scorer.l1
+    p1 = scorer.p_uni[:V]
+    uni = scorer.uni[:V]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Bigram context b: P2(w | b) = (l2 * c(b, w) / c(b) + l1 * P1(w)) / z2(b), z2 = l2 * out(b) / c(b) + l1,
+        # and l1 * P1(w) / z2(b) for every w without a bigram
+        z2 = np.where(uni > 0, l2 * scorer.bi_out[:V] / uni + l1, l1)
+        bi_ctx, bi_succ = np.nonzero(scorer.bigrams[:V, :V])
+        bi = (l2 * scorer.bigrams[bi_ctx, bi_succ] / uni[bi_ctx] + l1 * p1[bi_succ]) / z2[bi_ctx]
+
+        # Trigram context (a, b): P3(w | a, b) = (l3 * c(a, b, w) / c(a, b) + z2(b) * P2(w | b)) / z3(a, b),
+        # z3 = l3 * out(a, b) / c(a, b) + z2(b), and P2(w | b) * z2(b) / z3(a, b) for every other w
+        ctx = scorer.tri_keys // S
+        a, b, w = ctx // S, ctx % S, scorer.tri_keys % S
+        bi_ab = scorer.bigrams[a, b]
+        keep = bi_ab > 0                   # generation ignores trigrams of an unseen pair
+        ctx, a, b, w, bi_ab = ctx[keep], a[keep], b[keep], w[keep], bi_ab[keep]
+        z3 = l3 * scorer.tri_out[a, b] / bi_ab + z2[b]
+        tri = (l3 * scorer.tri_counts[keep] / bi_ab + l2 * scorer.bigrams[b, w] / uni[b] + l1 * p1[w]) / z3
+    tri_ctx, first = np.unique(ctx, return_index=True)
+    return {
+        "uni": np.log(p1),
+        "bi_offsets": np.searchsorted(bi_ctx, np.arange(V + 1)), "bi_succ": bi_succ, "bi": np.log(bi),
+        "bow2": np.log(l1 / z2),
+        "tri_ctx": tri_ctx, "tri_offsets": np.append(first, len(ctx)), "tri_succ": w, "tri": np.log(tri),
+        "bow3": np.log(z2[b[first]] / z3[first]),
+    }
+
+def export(scorer, bits=8, path=None, model_path=None):
+    """Quantize a scorer's model, writing the tables to `path` if given
+
+    Args:
+        bits: 8 or 16 bits per code (None: unquantized float64 codebooks)
+        model_path: model file the scorer came from; its hash is stored so a stale table is not used
+    Returns:
+        QuantizedModel
+    """
+    V = scorer.unk
+    tables = backoff_tables(scorer)
+    id_type = np.uint16 if V <= 0xFFFF else np.uint32
+    arrays = {"bits": np.int64(bits or 64),
+              "vocab": np.array(json.dumps(scorer.vocab, ensure_ascii=False)),
+              "model_sha256": np.array(file_sha256(model_path) if model_path else ""),
+              "model_stamp": np.array(file_stamp(model_path) if model_path else (-1, -1), dtype=np.int64),
+              "bi_offsets": tables["bi_offsets"].astype(np.uint32), "bi_succ": tables["bi_succ"].astype(id_type),
+              "tri_ctx": tables["tri_ctx"].astype(np.uint32 if scorer.size ** 2 < 1 << 32 else np.uint64),
+              "tri_offsets": tables["tri_offsets"].astype(np.uint32), "tri_succ": tables["tri_succ"].astype(id_type)}
+    for name in TABLES:
+        arrays[f"{name}_codebook"], arrays[f"{name}_codes"] = quantize(tables[name], bits)
+    if path is not None:
+        np.savez(path, **arrays)
+    return QuantizedModel(arrays)
+
+class QuantizedModel:
+    """Next-token sampling from quantized backoff tables (token IDs index vocab; V is any unseen token)"""
+
+    def __init__(self, arrays):
+        self.arrays = {k: v for k, v in arrays.items() if k not in ("bits", "vocab", "model_sha256", "model_stamp")}
+        self.bits = int(arrays["bits"])
+        self.model_sha256 = str(arrays["model_sha256"])
+        self.model_stamp = tuple(int(x) for x in arrays.get("model_stamp", (-1, -1)))  # absent in older files
+        self.vocab = json.loads(str(arrays["vocab"]))
+        self.ids = {w: i for i, w in enumerate(self.vocab)}
+        self.unk = len(self.vocab)
+        self.size = self.unk + 1
+        self.bi_offsets, self.bi_succ = arrays["bi_offsets"], arrays["bi_succ"]
+        self.tri_offsets, self.tri_succ = arrays["tri_offsets"], arrays["tri_succ"]
+        self.tri_ctx = arrays["tri_ctx"].astype(np.int64)  # searchsorted with Python ints stays exact
+        self.codes = {name: arrays[f"{name}_codes"] for name in TABLES}
+        # Codebooks as probabilities, so dequantizing a row is one gather
+        self.levels = {name: np.exp(arrays[f"{name}_codebook"].astype(np.float64)) for name in TABLES}
+        self.p1 = self.levels["uni"][self.codes["uni"]]
+        self.bow2 = self.levels["bow2"][self.codes["bow2"]]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    def nbytes(self):
+        """Bytes of the stored tables (codes, codebooks, successor IDs and offsets)"""
+        return sum(a.nbytes for a in self.arrays.values())
+
+    def next_weights(self, a, b):
+        """Unnormalized next-token weights over the vocabulary after token IDs (a, b)"""
+        V = self.unk
+        p = self.p1.copy()
+        if b == V:
+            return p
+        lo, hi = self.bi_offsets[b], self.bi_offsets[b + 1]
+        p *= self.bow2[b]
+        p[self.bi_succ[lo:hi]] = self.levels["bi"][self.codes["bi"][lo:hi]]
+        if a < V:
+            key = a * self.size + b
+            j = int(np.searchsorted(self.tri_ctx, key))
+            if j < len(self.tri_ctx) and self.tri_ctx[j] == key:
+                lo, hi = self.tri_offsets[j], self.tri_offsets[j + 1]
+                p *= self.levels["bow3"][self.codes["bow3"][j]]
+                p[self.tri_succ[lo:hi]] = self.levels["tri"][self.codes["tri"][lo:hi]]
+        return p
+
+    def sample(self, tokens, rng):
+        """Next token after the token strings `tokens` (unigrams until there are two, as generation does)"""
+        ids, V = self.ids, self.unk
+        w = self.p1 if len(tokens) < 2 else self.next_weights(ids.get(tokens[-2], V), ids.get(tokens[-1], V))
+        c = np.cumsum(w)
+        return self.vocab[min(int(np.searchsorted(c, rng.random() * c[-1], side="right")), V - 1)]
+
+    def log_probs(self, w, lengths):
+        """Natural-log probability of every token of concatenated ID sequences (as Scorer.log_probs)"""
+        from scoring import PROB_FLOOR
+        V = self.unk
+        starts = np.cumsum(lengths) - lengths
+        pos = np.arange(len(w)) - np.repeat(starts, lengths)
+        p = np.append(self.p1 / self.p1.sum(), 0.0)[w]
+        i = np.nonzero(pos >= 2)[0]
+        ctx = w[i - 2] * self.size + w[i - 1]
+        order = np.argsort(ctx, kind="stable")
+        i, ctx = i[order], ctx[order]
+        bounds = np.flatnonzero(np.r_[True, ctx[1:] != ctx[:-1], True]) if len(ctx) else []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):  # one distribution per distinct context
+            weights = np.append(self.next_weights(int(ctx[lo] // self.size), int(ctx[lo] % self.size)), 0.0)
+            p[i[lo:hi]] = weights[w[i[lo:hi]]] / weights[:V].sum()
+        return np.log(np.maximum(p, PROB_FLOOR))
+
+def load_tables(model_path):
+    """QuantizedModel stored next to `model_path`, or None (absent, disabled, or built from another model)"""
+    path = Path(model_path).with_name(QUANTIZED_TABLES)
+    if not QUANTIZED_SAMPLING or not path.exists():
+        return None
+    tables = QuantizedModel.load(path)
+    if tables.model_stamp != file_stamp(model_path) and tables.model_sha256 != file_sha256(model_path):
+        print(f"[✗] {path} was built from a different model; sampling from the float model (rerun quantize.py)")
+        return None
+    return tables
+
+def _report(bits_list, tokens, seed):
+    """Memory, dev perplexity and per-token sampling latency of the float model and the quantized tables"""
+    import random
+    import generator
+    from corpus_format import TokenCorpus
+    from train_model import split_corpus
+
+    state, _ = generator.load_state(keep_counts=True)
+    scorer = state['scorer']
+    corpus = TokenCorpus()
+    dev_lines, _ = split_corpus(corpus)
+    w = np.array([scorer.ids.get(t, scorer.unk) for line in dev_lines for t in corpus.decode(line)], dtype=np.int64)
+    lengths = np.array([len(line) for line in dev_lines], dtype=np.int64)
+    float_ppl = np.exp(-scorer.log_probs(w, lengths).sum() / len(w))
+
+    exact = export(scorer, None)
+    entries = sum(len(exact.codes[name]) for name in TABLES)
+    index_bytes = exact.nbytes() - sum(exact.arrays[f"{name}_{part}"].nbytes
+                                       for name in TABLES for part in ("codes", "codebook"))
+    dict_bytes = sum(generator._dict_bytes(state[k]) for k in ('uni_count', 'bi_count', 'tri_count'))
+    exact_ppl = np.exp(-exact.log_probs(w, lengths).sum() / len(w))
+    print(f"[*] Dev set: {len(dev_lines)} held-out lines, {len(w)} tokens; {entries} table entries")
+    print(f"[*] Float model: count dicts {dict_bytes / 2**20:.1f} MB | scorer arrays {scorer.nbytes() / 2**20:.2f} MB "
+          f"| float32 backoff tables {(index_bytes + 4 * entries) / 2**20:.2f} MB")
+    print(f"[{'✓' if abs(exact_ppl / float_ppl - 1) < 1e-9 else '✗'}] Dev perplexity: float {float_ppl:.4f}, "
+          f"unquantized backoff form {exact_ppl:.4f}")
+
+    def latency(state):
+        rng = random.Random(seed)
+        produced, t0 = 0, time.perf_counter()
+        while produced < tokens:
+            produced += sum(1 for _ in generator.generate_tokens([], tokens - produced, rng, metered=False,
+                                                                 state=state))
+        return (time.perf_counter() - t0) / produced * 1e6
+
+    float_us = latency({**state, 'quantized': None})
+    print(f"[*] Float dict loop: {float_us:.1f} µs/token")
+    for bits in bits_list:
+        q = export(scorer, bits)
+        ppl = np.exp(-q.log_probs(w, lengths).sum() / len(w))
+        us = latency({**state, 'quantized': q})
+        print(f"[✓] {bits:>2}-bit: {q.nbytes() / 2**20:.2f} MB ({scorer.nbytes() / q.nbytes():.0f}x smaller than the "
+              f"scorer arrays, {dict_bytes / q.nbytes():.0f}x than the count dicts) | dev perplexity {ppl:.4f} "
+              f"({ppl / float_ppl - 1:+.4%}) | {us:.1f} µs/token ({float_us / us:.1f}x)")
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Export quantized log-probability tables for sampling")
+    parser.add_argument("--bits", type=int, default=8, choices=[8, 16])
+    parser.add_argument("--model", default="trigram_model.pkl")
+    parser.add_argument("--report", action="store_true", help="Compare 8 and 16-bit tables with the float model")
+    parser.add_argument("--tokens", type=int, default=5000, help="Tokens sampled per latency measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.report:
+        _report([8, 16], args.tokens, args.seed)
+    else:
+        from model import load_model
+        from scoring import load_scorer
+        path = Path(args.model).with_name(QUANTIZED_TABLES)
+        start = time.perf_counter()
+        q = export(load_scorer(load_model(args.model)), args.bits, path, args.model)
+        print(f"[✓] {args.bits}-bit tables ({q.nbytes() / 2**20:.2f} MB) → {path} "
+              f"({time.perf_counter() - start:.2f}s)")
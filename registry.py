@@ -0,0 +1,168 @@
+"""Named models loaded on first use and evicted least-recently-used under a memory budget
+
+A model key is "default" (trigram_model.pkl and bpe_merges.json in the working
+directory), "name" (MODEL_DIR/name/) or "name@version" (MODEL_DIR/name/version/).
+Each model directory holds a trigram_model.pkl and the bpe_merges.json it was
+tokenized with, e.g. as written by `python pipeline.py --workdir models/funny`.
+
+Concurrent first requests for a model share one load. When the loaded models
+exceed MODEL_MEMORY_BUDGET_MB, the least recently used ones are dropped (never
+the default model, nor the one just loaded); requests still running on an
+evicted model keep it alive until they finish.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+import metrics
+import tokenizer
+from model import MODEL_PATH
+
+MODEL_DIR = Path(os.environ.get("MODEL_DIR", "models"))
+DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", "default")
+MEMORY_BUDGET = int(float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0")) * 2**20)  # 0 = no limit
+NAME_RE = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*(@[A-Za-z0-9_-][A-Za-z0-9_.-]*)?")
+
+LOADS = metrics.Counter("story_model_loads_total", "Model loads by model and outcome", ("model", "outcome"))
+EVICTIONS = metrics.Counter("story_model_evictions_total", "Models dropped to stay within the memory budget",
+                            ("model",))
+
+class ModelNotFound(Exception):
+    """Unknown model key, or no model file for it"""
+
+class LoadedModel:
+    """One model in memory: its serving state and bookkeeping"""
+
+    def __init__(self, name, state, nbytes, load_seconds):
+        self.name = name
+        self.state = state
+        self.nbytes = nbytes
+        self.load_seconds = load_seconds
+        self.last_used = time.monotonic()
+
+    def info(self):
+        return {"name": self.name, "memory_bytes": self.nbytes, "load_seconds": round(self.load_seconds, 3),
+                "vocab_size": len(self.state["vocab"]), "idle_seconds": round(time.monotonic() - self.last_used, 1)}
+
+class ModelRegistry:
+    """Lazily loaded models by key, with LRU eviction beyond a memory budget
+
+    Args:
+        load: load(model_path, merges_path) -> (state dict, estimated bytes)
+    """
+
+    def __init__(self, load, budget=MEMORY_BUDGET, default=DEFAULT_MODEL, model_dir=MODEL_DIR):
+        self.load = load
+        self.budget = budget
+        self.default = default
+        self.model_dir = Path(model_dir)
+        self.lock = threading.Lock()
+        self.models = OrderedDict()   # key → LoadedModel, least recently used first
+        self.loading = {}             # key → Future shared by requests waiting on the same load
+        metrics.Gauge("story_models_loaded", "Models currently in memory", fn=lambda: len(self.models))
+        metrics.Gauge("story_model_memory_bytes", "Estimated memory of each loaded model", ("model",),
+                      fn=lambda: {(k,): m.nbytes for k, m in list(self.models.items())})
+        metrics.Gauge("story_model_load_seconds", "Time taken to load each loaded model", ("model",),
+                      fn=lambda: {(k,): m.load_seconds for k, m in list(self.models.items())})
+
+    def key(self, name=""):
+        return name or self.default
+
+    def paths(self, name=""):
+        """(model file, merges file) for a key
+
+        Raises:
+            ModelNotFound: malformed key or no model file (the default model's
+            missing file is left to load_model's FileNotFoundError)
+        """
+        key = self.key(name)
+        if key == "default":
+            return Path(MODEL_PATH), Path(tokenizer.MERGES)
+        if not NAME_RE.fullmatch(key):
+            raise ModelNotFound(f"invalid model name {key!r}")
+        directory = self.model_dir.joinpath(*key.split("@"))
+        if not (directory / MODEL_PATH.name).exists():
+            raise ModelNotFound(f"model {key!r} not found ({directory / MODEL_PATH.name})")
+        return directory / MODEL_PATH.name, directory / tokenizer.MERGES.name
+
+    def get(self, name=""):
+        """The loaded model for a key, loading it (once, however many callers wait) if needed
+
+        Raises:
+            ModelNotFound: as for paths(); other load errors propagate to all waiters
+        """
+        key = self.key(name)
+        with self.lock:
+            loaded = self.models.get(key)
+            if loaded is not None:
+                self.models.move_to_end(key)
+                loaded.last_used = time.monotonic()
+                return loaded
+            pending = self.loading.get(key)
+            owner = pending is None
+            if owner:
+                pending = self.loading[key] = Future()
+        if not owner:
+            return pending.result()
+
+        try:
+            t0 = time.perf_counter()
+            state, nbytes = self.load(*self.paths(key))
+            loaded = LoadedModel(key, state, nbytes, time.perf_counter() - t0)
+        except BaseException as e:
+            with self.lock:
+                del self.loading[key]
+            if isinstance(e, ModelNotFound):
+                LOADS.inc("", "not_found")  # not by key: names come from requests
+            else:
+                LOADS.inc(key, "error")
+            pending.set_exception(e)
+            raise
+        with self.lock:
+            self.models[key] = loaded
+            del self.loading[key]
+            self._evict(keep=key)
+        LOADS.inc(key, "ok")
+        print(f"[✓] Model {key!r} loaded ({nbytes / 2**20:.1f} MB, {loaded.load_seconds:.2f}s)")
+        pending.set_result(loaded)
+        return loaded
+
+    def _evict(self, keep):
+        """Drop least recently used models until within budget (lock held)"""
+        if self.budget <= 0:
+            return
+        total = sum(m.nbytes for m in self.models.values())
+        for key in list(self.models):
+            if total <= self.budget:
+                break
+            if key in (keep, self.default):
+                continue
+            total -= self.models.pop(key).nbytes
+            EVICTIONS.inc(key)
+            print(f"[*] Model {key!r} evicted (memory budget {self.budget / 2**20:.0f} MB)")
+
+    def loaded(self):
+        """Loaded models, most recently used first"""
+        with self.lock:
+            return list(reversed(self.models.values()))
+
+    def available(self):
+        """Model keys with a model file on disk"""
+        keys = ["default"] if Path(MODEL_PATH).exists() else []
+        if self.model_dir.is_dir():
+            for path in sorted(self.model_dir.glob(f"*/{MODEL_PATH.name}")):
+                keys.append(path.parent.name)
+            for path in sorted(self.model_dir.glob(f"*/*/{MODEL_PATH.name}")):
+                keys.append(f"{path.parent.parent.name}@{path.parent.name}")
+        return keys
+
+    def stats(self):
+        models = [m.info() for m in self.loaded()]
+        return {"default": self.default, "budget_bytes": self.budget,
+                "memory_bytes": sum(m["memory_bytes"] for m in models), "loaded": models,
+                "available": self.available()}
@@ -0,0 +1,105 @@
+"""Admission control for story generation: concurrency limit, bounded wait queue, length caps"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_CONCURRENT = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", "4"))
+MAX_QUEUE = int(os.environ.get("MAX_QUEUED_GENERATIONS", "16"))
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT_SECONDS", "5"))
+MAX_LENGTH_CAP = int(os.environ.get("MAX_LENGTH_CAP", "1000"))
+DEFAULT_MAX_LENGTH = 500
+GENERATION_TIMEOUT = float(os.environ.get("GENERATION_TIMEOUT_SECONDS", "60"))
+
+class Rejected(Exception):
+    """Request not admitted: wait queue full, or no slot freed before the timeout"""
+
+def clamp_length(requested):
+    """Server-enforced max_length: unset/non-positive → default, never above the cap"""
+    return min(requested if requested and requested > 0 else DEFAULT_MAX_LENGTH, MAX_LENGTH_CAP)
+
+class Deadline:
+    """Absolute deadline on the monotonic clock (None = no deadline)"""
+
+    def __init__(self, seconds=None):
+        self.at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self):
+        return None if self.at is None else self.at - time.monotonic()
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+class GenerationScheduler:
+    """Limits concurrent generations; excess requests wait in a bounded queue
+
+    A request that finds the queue full is rejected immediately; one that
+    waits longer than its timeout (or its own deadline) is rejected too.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.cond = threading.Condition()
+        self.active = 0
+        self.queued = 0
+        self.counts = {"admitted": 0, "completed": 0, "cancelled": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def acquire(self, deadline=None):
+        """Take a generation slot, waiting in the queue if needed
+
+        Raises:
+            Rejected: queue full, or no slot within queue_timeout / the deadline
+        """
+        timeout = self.queue_timeout
+        remaining = deadline.remaining() if deadline else None
+        if remaining is not None:
+            timeout = min(timeout, max(remaining, 0))
+
+        with self.cond:
+            if self.active >= self.max_concurrent:
+                if self.queued >= self.max_queue:
+                    self.counts["rejected_queue_full"] += 1
+                    raise Rejected(f"server busy: {self.queued} requests queued")
+                self.queued += 1
+                try:
+                    admitted = self.cond.wait_for(lambda: self.active < self.max_concurrent, timeout)
+                finally:
+                    self.queued -= 1
+                if not admitted:
+                    self.counts["rejected_timeout"] += 1
+                    raise Rejected(f"no generation slot within {timeout:.1f}s")
+            self.active += 1
+            self.counts["admitted"] += 1
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.counts["completed"] += 1
+            self.cond.notify()
+
+    @contextmanager
+    def slot(self, deadline=None):
+        """Hold one generation slot for the duration of the block"""
+        self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def cancelled(self):
+        """Count a generation stopped early by client disconnect or deadline"""
+        with self.cond:
+            self.counts["cancelled"] += 1
+
+    def stats(self):
+        with self.cond:
+            return {
+                "active": self.active,
+                "queued": self.queued,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                **self.counts,
+            }
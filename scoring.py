@@ -0,0 +1,265 @@
+"""Batch scoring of texts under the interpolated trigram model: log-probability and perplexity
+
+Texts are tokenized exactly as in training (preprocess.story_to_line, then the
+saved BPE merges) and mapped to token IDs. All texts of a batch are scored at
+once: the IDs are concatenated, every position's (w1, w2, w) is looked up in
+dense unigram/bigram arrays and a sorted trigram key array, and per-text sums
+are a single bincount. Probabilities are normalized over the vocabulary as in
+generation, and the first two tokens of a text are scored by unigrams, as
+generation samples them.
+
+Input formats:
+  raw:    story text as scraped (cleaned, sentence-marked and BPE-encoded)
+  corpus: a cleaned corpus.txt line (BPE-encoded only)
+  tokens: space-separated model tokens, as Generate and tokenized_corpus.txt produce
+
+Run directly to score a file (one text per line) and optionally keep only the
+lines under a perplexity threshold; --benchmark compares against a per-token loop.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from itertools import chain, repeat
+
+import numpy as np
+
+import preprocess
+import tokenizer
+
+FORMATS = ("raw", "corpus", "tokens")
+MAX_SCORE_TEXTS = int(os.environ.get("MAX_SCORE_TEXTS", "10000"))
+PROB_FLOOR = 1e-12  # probability charged to tokens the model has never seen
+
+class Scorer:
+    """Vectorized interpolated-trigram scoring over token-ID arrays
+
+    Token IDs index the model vocabulary; ID V stands for any unseen token and
+    has zero counts everywhere, so the same formulas cover it.
+    """
+
+    def __init__(self, uni_count, bi_count, tri_count, lambdas, merges=None, special=tokenizer.SPECIAL,
+                 word_start=""):
+        self.l3, self.l2, self.l1 = lambdas["lambda3"], lambdas["lambda2"], lambdas["lambda1"]
+        self.merges = merges
+        self.special = special
+        self.word_start = word_start
+        self.vocab = list(uni_count)
+        self.ids = {w: i for i, w in enumerate(self.vocab)}
+        self.pieces = {}          # word → BPE tokens, filled lazily
+        V = self.unk = len(self.vocab)
+        self.size = V + 1
+
+        self.uni = np.zeros(V + 1)
+        self.uni[:V] = [uni_count[w] for w in self.vocab]
+        self.p_uni = self.uni / self.uni.sum()
+        self.bigrams = np.zeros((V + 1, V + 1))
+        for (a, b), n in bi_count.items():
+            self.bigrams[self.ids.get(a, V), self.ids.get(b, V)] += n
+        self.bigrams[V, :] = self.bigrams[:, V] = 0.0
+        self.bi_out = self.bigrams.sum(axis=1)
+
+        tri = np.fromiter(map(self.ids.get, chain.from_iterable(tri_count), repeat(V)), dtype=np.int64,
+                          count=3 * len(tri_count)).reshape(-1, 3)
+        counts = np.fromiter(tri_count.values(), dtype=np.float64, count=len(tri_count))
+        keep = (tri < V).all(axis=1) & (counts > 0)
+        tri, counts = tri[keep], counts[keep]
+        keys = (tri[:, 0] * self.size + tri[:, 1]) * self.size + tri[:, 2]
+        order = np.argsort(keys)
+        self.tri_keys, self.tri_counts = keys[order], counts[order]
+        # Sum of trigram counts per (w1, w2), for the normalizer
+        self.tri_out = np.bincount(self.tri_keys // self.size, weights=self.tri_counts,
+                                   minlength=self.size * self.size).reshape(self.size, self.size)
+
+    def nbytes(self):
+        arrays = (self.uni, self.p_uni, self.bigrams, self.bi_out, self.tri_keys, self.tri_counts, self.tri_out)
+        return sum(a.nbytes for a in arrays)
+
+    def next_weights(self, a, b):
+        """Generation's unnormalized next-token weights over the vocabulary after token IDs (a, b)
+
+        Same mixture as generate_tokens: l3 * p_tri + l2 * p_bi + l1 * p_uni, for
+        all V tokens at once (ID V, unseen, has no counts).
+        """
+        V, S = self.unk, self.size
+        p = self.l1 * self.p_uni[:V]
+        if self.uni[b] > 0:
+            p = p + (self.l2 / self.uni[b]) * self.bigrams[b, :V]
+        bi_ab = self.bigrams[a, b]
+        if bi_ab > 0:
+            lo = (a * S + b) * S
+            j0, j1 = np.searchsorted(self.tri_keys, (lo, lo + S))
+            if j1 > j0:
+                p[self.tri_keys[j0:j1] - lo] += (self.l3 / bi_ab) * self.tri_counts[j0:j1]
+        return p
+
+    def tokens(self, text, fmt="raw"):
+        """Model tokens of one text"""
+        if fmt == "tokens":
+            return text.split()
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+        if self.merges is None:
+            raise ValueError(f"no BPE merges loaded ({tokenizer.MERGES} missing; run tokenizer.py or pipeline.py)")
+        line = preprocess.story_to_line(text) if fmt == "raw" else text
+        out = []
+        for word in line.split():
+            pieces = self.pieces.get(word)
+            if pieces is None:
+                pieces = self.pieces[word] = [self.special.get(t, t) for t in
+                                              tokenizer.encode(word, self.merges, self.word_start, self.special)]
+            out.extend(pieces)
+        return out
+
+    def log_probs(self, w, lengths):
+        """Natural-log probability of every token of concatenated ID sequences
+
+        Args:
+            w: int64 array of token IDs, all sequences back to back
+            lengths: int64 array of sequence lengths
+        """
+        if not len(w):
+            return np.zeros(0)
+        starts = np.cumsum(lengths) - lengths
+        pos = np.arange(len(w)) - np.repeat(starts, lengths)
+
+        p = self.p_uni[w].copy()
+        ctx = pos >= 2
+        if ctx.any():
+            i = np.nonzero(ctx)[0]
+            a, b, c = w[i - 2], w[i - 1], w[i]
+            bi_ab = self.bigrams[a, b]
+            uni_b = self.uni[b]
+            key = (a * self.size + b) * self.size + c
+            j = np.searchsorted(self.tri_keys, key)
+            j[j == len(self.tri_keys)] = 0
+            tri = np.where(self.tri_keys[j] == key, self.tri_counts[j], 0.0) if len(self.tri_keys) else 0.0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                p_tri = np.where(bi_ab > 0, tri / bi_ab, 0.0)
+                z_tri = np.where(bi_ab > 0, self.tri_out[a, b] / bi_ab, 0.0)
+                p_bi = np.where(uni_b > 0, self.bigrams[b, c] / uni_b, 0.0)
+                z_bi = np.where(uni_b > 0, self.bi_out[b] / uni_b, 0.0)
+            num = self.l3 * p_tri + self.l2 * p_bi + self.l1 * self.p_uni[c]
+            z = self.l3 * z_tri + self.l2 * z_bi + self.l1
+            # Generation falls back to unigram sampling when the mixture is all zero
+            p[i] = np.where(z > 0, num / np.where(z > 0, z, 1.0), self.p_uni[c])
+        return np.log(np.maximum(p, PROB_FLOOR))
+
+    def score(self, texts, fmt="raw", per_token=False):
+        """Score a batch of texts
+
+        Returns:
+            list of dicts: num_tokens, log_prob (natural log), perplexity (None
+            for an empty text), oov_tokens, and with per_token the tokens and
+            their log_probs
+        """
+        token_lists = [self.tokens(t, fmt) for t in texts]
+        ids, unk = self.ids, self.unk
+        lengths = np.array([len(toks) for toks in token_lists], dtype=np.int64)
+        w = np.fromiter(map(ids.get, chain.from_iterable(token_lists), repeat(unk)), dtype=np.int64,
+                        count=int(lengths.sum()))
+        logp = self.log_probs(w, lengths)
+        owner = np.repeat(np.arange(len(texts)), lengths)
+        totals = np.bincount(owner, weights=logp, minlength=len(texts))
+        oov = np.bincount(owner, weights=w == unk, minlength=len(texts))
+        offsets = np.cumsum(lengths) - lengths
+
+        results = []
+        for k, toks in enumerate(token_lists):
+            n = int(lengths[k])
+            total = float(totals[k])
+            result = {"num_tokens": n, "log_prob": total, "perplexity": math.exp(-total / n) if n else None,
+                      "oov_tokens": int(oov[k])}
+            if per_token:
+                result["tokens"] = toks
+                result["token_log_probs"] = logp[offsets[k]:offsets[k] + n].tolist()
+            results.append(result)
+        return results
+
+def load_scorer(model=None, merges_path=tokenizer.MERGES):
+    """Scorer for the saved model (or a load_model() tuple), with merges if they were saved"""
+    if model is None:
+        from model import load_model
+        model = load_model()
+    uni, bi, tri, lambdas = model[:4]
+    merges, special, word_start = tokenizer.load_merges(merges_path) if os.path.exists(merges_path) else \
+        (None, tokenizer.SPECIAL, "")
+    return Scorer(uni, bi, tri, lambdas, merges, special, word_start)
+
+def loop_log_prob(tokens, uni, bi, tri, lambdas, total):
+    """Per-token Python loop with the same normalization (reference for Scorer)"""
+    l3, l2, l1 = lambdas["lambda3"], lambdas["lambda2"], lambdas["lambda1"]
+    log_prob = 0.0
+    for i, w in enumerate(tokens):
+        if i < 2:
+            p = uni.get(w, 0) / total
+        else:
+            a, b = tokens[i - 2], tokens[i - 1]
+            probs = {}
+            for v in uni:
+                p_tri = tri.get((a, b, v), 0) / bi[(a, b)] if bi.get((a, b), 0) > 0 else 0
+                p_bi = bi.get((b, v), 0) / uni[b] if uni.get(b, 0) > 0 else 0
+                probs[v] = l3 * p_tri + l2 * p_bi + l1 * uni[v] / total
+            z = sum(probs.values())
+            p = probs.get(w, 0) / z if z > 0 else uni.get(w, 0) / total
+        log_prob += math.log(max(p, PROB_FLOOR))
+    return log_prob
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Score texts by log-probability and perplexity under the model")
+    parser.add_argument("input", nargs="?", default=str(tokenizer.CORPUS), help="One text per line")
+    parser.add_argument("--format", choices=FORMATS, default="corpus")
+    parser.add_argument("--max-perplexity", type=float, help="Keep only lines at or below this perplexity")
+    parser.add_argument("--output", help="Write the kept lines here")
+    parser.add_argument("--batch", type=int, default=MAX_SCORE_TEXTS)
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Time N texts against the per-token loop")
+    args = parser.parse_args()
+
+    from model import load_model
+    model = load_model()
+    start = time.perf_counter()
+    scorer = load_scorer(model)
+    print(f"[✓] Scorer ready: {scorer.unk} tokens, {len(scorer.tri_keys)} trigrams "
+          f"({time.perf_counter() - start:.2f}s)")
+
+    lines = tokenizer.load_lines(args.input)
+    start = time.perf_counter()
+    scores = []
+    for i in range(0, len(lines), args.batch):
+        scores.extend(scorer.score(lines[i:i + args.batch], args.format))
+    elapsed = time.perf_counter() - start
+    n_tokens = sum(s["num_tokens"] for s in scores)
+    print(f"[✓] Scored {len(lines)} texts, {n_tokens} tokens in {elapsed:.2f}s ({n_tokens / elapsed:,.0f} tokens/s)")
+    ppl = sorted(s["perplexity"] for s in scores if s["perplexity"] is not None)
+    if ppl:
+        print(f"[*] Perplexity: p10 {ppl[len(ppl) // 10]:.1f}, p50 {ppl[len(ppl) // 2]:.1f}, "
+              f"p90 {ppl[len(ppl) * 9 // 10]:.1f}, max {ppl[-1]:.1f}")
+        total_lp = sum(s["log_prob"] for s in scores)
+        print(f"[*] Corpus perplexity: {math.exp(-total_lp / n_tokens):.2f}")
+
+    if args.max_perplexity is not None:
+        kept = [line for line, s in zip(lines, scores)
+                if s["perplexity"] is not None and s["perplexity"] <= args.max_perplexity]
+        print(f"[*] {len(kept)}/{len(lines)} lines at perplexity ≤ {args.max_perplexity}")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in kept)
+            print(f"[✓] Kept lines → {args.output}")
+
+    if args.benchmark:
+        uni, bi, tri, lambdas, vocab, total = model
+        sample = [scorer.tokens(line, args.format) for line in lines[:args.benchmark]]
+        start = time.perf_counter()
+        ref = [loop_log_prob(toks, uni, bi, tri, lambdas, total) for toks in sample]
+        loop_s = time.perf_counter() - start
+        start = time.perf_counter()
+        got = scorer.score([" ".join(toks) for toks in sample], "tokens")
+        vec_s = time.perf_counter() - start
+        worst = max(abs(r - g["log_prob"]) / max(1.0, abs(r)) for r, g in zip(ref, got))
+        n = sum(len(t) for t in sample)
+        print(f"[*] {len(sample)} texts, {n} tokens: loop {loop_s:.2f}s ({n / loop_s:,.0f} tokens/s), "
+              f"vectorized {vec_s:.3f}s ({n / vec_s:,.0f} tokens/s), {loop_s / vec_s:.0f}x")
+        print(f"[✓] Max relative log-prob difference: {worst:.2e}")
@@ -1,116 +1,188 @@
 """gRPC server for trigram story generation"""
 
+import json
 import os
 import sys
-import random
+import signal
+import threading
+import time
 from concurrent import futures
 
 import grpc
-from collections import defaultdict, Counter
 
-from model import load_model
+import metrics
+import profiling
+from constraints import Constraints
+from generator import (MODEL_STATE, REGISTRY, SCHEDULER, SESSIONS, STORY_POOL, initialize_model, open_session,
+                       predict_next, score_texts, session_chunks)
+from registry import ModelNotFound
+from scheduler import GENERATION_TIMEOUT, Deadline, Rejected, clamp_length
+from sessions import SessionBusy, SessionNotFound
 import generate_pb2
 import generate_pb2_grpc
 
 sys.stdout.reconfigure(encoding="utf-8")
 
-# Global model state
-MODEL_STATE = {}
-
-def initialize_model():
-    """Load model from disk on startup"""
-    try:
-        print("[*] Loading model...")
-        uni_count, bi_count, tri_count, lambdas, vocab, total_uni = load_model()
-        
-        MODEL_STATE.update({
-            'uni_count': uni_count,
-            'bi_count': bi_count,
-            'tri_count': tri_count,
-            'lambdas': lambdas,
-            'vocab': vocab,
-            'total_uni': total_uni
-        })
-        return True
-    except FileNotFoundError as e:
-        print(f"[✗] {e}")
-        return False
-
-def generate_story(prefix="", max_length=500):
-    """Generate story using interpolated trigram model"""
-    uni = MODEL_STATE['uni_count']
-    bi = MODEL_STATE['bi_count']
-    tri = MODEL_STATE['tri_count']
-    l3, l2, l1 = MODEL_STATE['lambdas'].values()
-    total = MODEL_STATE['total_uni']
-    
-    tokens = prefix.split() if prefix else []
-    
-    if not tokens:
-        tokens.append(random.choices(list(uni.keys()), weights=[uni[t] for t in uni])[0])
-        yield " ".join(tokens)
-    
-    for _ in range(max_length):
-        if len(tokens) < 2:
-            next_tok = random.choices(list(uni.keys()), weights=[uni[t] for t in uni])[0]
-        else:
-            w_prev2, w_prev1 = tokens[-2], tokens[-1]
-            probs = {}
-            
-            for w_curr in uni.keys():
-                p_tri = (tri[(w_prev2, w_prev1, w_curr)] / bi[(w_prev2, w_prev1)]) if bi[(w_prev2, w_prev1)] > 0 else 0
-                p_bi = (bi[(w_prev1, w_curr)] / uni[w_prev1]) if uni[w_prev1] > 0 else 0
-                p_uni = uni[w_curr] / total
-                
-                probs[w_curr] = l3 * p_tri + l2 * p_bi + l1 * p_uni
-            
-            total_prob = sum(probs.values())
-            if total_prob > 0:
-                probs = {w: p / total_prob for w, p in probs.items()}
-                next_tok = random.choices(list(probs.keys()), weights=list(probs.values()))[0]
-            else:
-                next_tok = random.choices(list(uni.keys()), weights=[uni[t] for t in uni])[0]
-        
-        tokens.append(next_tok)
-        yield " ".join(tokens)
-        
-        if next_tok == "<EOT>":
-            break
-
 class StoryGeneratorServicer(generate_pb2_grpc.StoryGeneratorServicer):
     """gRPC story generator service"""
     
     def Generate(self, request, context):
-        """Generate story from prefix"""
+        """Generate story from prefix, or continue the story in request.session_id
+
+        Runs under the shared scheduler; honours the client's gRPC deadline
+        (capped by GENERATION_TIMEOUT_SECONDS) and stops as soon as the RPC
+        is cancelled or the client disconnects. With `x-profile` metadata
+        (or a global profiling mode) the phase timings are returned in the
+        `x-profile` trailing metadata; sampling and dumps to PROFILE_DIR need
+        `x-admin-token` metadata or the global mode.
+        """
+        started = time.perf_counter()
+        metadata = dict(context.invocation_metadata())
+        profile = profiling.start("grpc.Generate", metadata.get(profiling.HEADER),
+                                  admin=profiling.authorized(metadata.get(profiling.ADMIN_HEADER)))
+        if profile is not None:
+            profile.start_sampling()
+        max_length = clamp_length(request.max_length)
+        remaining = context.time_remaining()
+        deadline = Deadline(GENERATION_TIMEOUT if remaining is None else min(remaining, GENERATION_TIMEOUT))
+        gone = threading.Event()
+        context.add_callback(gone.set)
+
+        try:
+            constraints = None
+            if request.HasField("constraints"):
+                c = request.constraints
+                constraints = Constraints(c.banned_tokens, c.banned_words, c.endings, c.min_tokens, c.max_tokens)
+            session, loaded, decoder = open_session(request.session_id, request.model, constraints)
+        except Exception as e:
+            if isinstance(e, (SessionNotFound, ModelNotFound)):
+                outcome, code = "not_found", grpc.StatusCode.NOT_FOUND
+            elif isinstance(e, SessionBusy):
+                outcome, code = "busy", grpc.StatusCode.FAILED_PRECONDITION
+            elif isinstance(e, ValueError):
+                outcome, code = "invalid", grpc.StatusCode.INVALID_ARGUMENT
+            else:
+                outcome, code = "error", grpc.StatusCode.INTERNAL
+            metrics.REQUESTS.inc("grpc", outcome)
+            if profile is not None:
+                profile.finish()
+            context.abort(code, str(e))
+        lambdas = loaded.state['lambdas']
+
         try:
-            num_tokens = 0
-            for chunk in generate_story(prefix=request.prefix, max_length=request.max_length):
-                num_tokens = len(chunk.split())
-                is_final = chunk.endswith("<EOT>") or num_tokens >= request.max_length
+            SCHEDULER.acquire(deadline)
+        except Rejected as e:
+            SESSIONS.checkin(session)
+            metrics.REQUESTS.inc("grpc", "rejected")
+            if profile is not None:
+                profile.finish()
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        if profile is not None:
+            profile.lap("admission")
+
+        stopped = failed = False
+        def should_stop():
+            nonlocal stopped
+            stopped = gone.is_set() or deadline.expired()
+            return stopped
+
+        try:
+            for chunk, num_tokens, is_final in session_chunks(session, request.prefix, max_length, request.delta,
+                                                              should_stop, started, profile, loaded.state,
+                                                              decoder=decoder):
+                if profile is not None:
+                    profile.lap()
                 
-                yield generate_pb2.GenerateResponse(
+                response = generate_pb2.GenerateResponse(
                     chunk=chunk,
                     is_final=is_final,
                     num_tokens=num_tokens,
-                    lambda3=MODEL_STATE['lambdas']['lambda3'],
-                    lambda2=MODEL_STATE['lambdas']['lambda2'],
-                    lambda1=MODEL_STATE['lambdas']['lambda1']
+                    lambda3=lambdas['lambda3'],
+                    lambda2=lambdas['lambda2'],
+                    lambda1=lambdas['lambda1'],
+                    session_id=session.id,
+                    model=loaded.name
                 )
+                if profile is not None:
+                    profile.lap("build_response")
+                metrics.STREAM_MESSAGES.inc("grpc")
+                yield response
+                if profile is not None:
+                    profile.lap("send")  # serialization + write, done by grpc in this thread
                 
                 if is_final:
                     break
+        except GeneratorExit:
+            stopped = True  # client stopped reading (cancelled/disconnected)
+            raise
         except Exception as e:
+            failed = True
             context.set_details(str(e))
             context.set_code(grpc.StatusCode.INTERNAL)
+        finally:
+            SCHEDULER.release()
+            SESSIONS.checkin(session)
+            if stopped:
+                SCHEDULER.cancelled()
+            if failed:
+                metrics.REQUESTS.inc("grpc", "error")
+            elif not stopped:
+                metrics.REQUESTS.inc("grpc", "ok")
+            elif deadline.expired() and not gone.is_set():
+                metrics.REQUESTS.inc("grpc", "deadline_exceeded")
+            else:
+                metrics.REQUESTS.inc("grpc", "cancelled")
+            if profile is not None:
+                summary = profile.finish()
+                context.set_trailing_metadata(((profiling.HEADER, json.dumps(summary)),))
+
+        if stopped and not gone.is_set():
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "generation deadline exceeded")
+    
+    def PredictNext(self, request, context):
+        """Top-k continuations of request.context for autocomplete"""
+        try:
+            predictions, order = predict_next(request.context, request.k)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+        return generate_pb2.PredictResponse(
+            predictions=[generate_pb2.Prediction(token=t, probability=p) for t, p in predictions],
+            context_order=order
+        )
+    
+    def Score(self, request, context):
+        """Log-probability, perplexity and optionally per-token log-probs of request.texts"""
+        try:
+            scores = score_texts(list(request.texts), request.format, request.per_token)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except Rejected as e:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        return generate_pb2.ScoreResponse(scores=[
+            generate_pb2.TextScore(
+                num_tokens=s['num_tokens'],
+                log_prob=s['log_prob'],
+                perplexity=s['perplexity'] or 0.0,
+                oov_tokens=s['oov_tokens'],
+                tokens=s.get('tokens', []),
+                token_log_probs=s.get('token_log_probs', [])
+            ) for s in scores
+        ])
     
     def GetModelInfo(self, request, context):
-        """Get model information"""
+        """Get default-model information, loaded models and admission-control counters"""
+        stats = SCHEDULER.stats()
         return generate_pb2.ModelInfo(
             vocab_size=len(MODEL_STATE['vocab']),
             lambda3=MODEL_STATE['lambdas']['lambda3'],
             lambda2=MODEL_STATE['lambdas']['lambda2'],
             lambda1=MODEL_STATE['lambdas']['lambda1'],
-            model_version="1.0"
+            model_version="1.0",
+            active_generations=stats['active'],
+            queued_generations=stats['queued'],
+            rejected_generations=stats['rejected_queue_full'] + stats['rejected_timeout'],
+            default_model=REGISTRY.default,
+            models=[generate_pb2.LoadedModel(**m.info()) for m in REGISTRY.loaded()]
         )
 
 def serve():
@@ -118,16 +190,32 @@ def serve():
     if not initialize_model():
         sys.exit(1)
     
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    # Enough threads for running + queued generations plus quick unary calls
+    workers = SCHEDULER.max_concurrent + SCHEDULER.max_queue + 4
+    # Accept keepalive pings from pooled clients (story_client.py) holding idle channels open
+    options = [("grpc.keepalive_permit_without_calls", 1),
+               ("grpc.http2.min_ping_interval_without_data_ms", 10000)]
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers), options=options)
     generate_pb2_grpc.add_StoryGeneratorServicer_to_server(StoryGeneratorServicer(), server)
     
     port = int(os.environ.get("PORT", "50051"))
     server.add_insecure_port(f"0.0.0.0:{port}")
     
+    STORY_POOL.start()
+    
+    metrics_port = int(os.environ.get("METRICS_PORT", "9091"))
+    if metrics_port:
+        metrics.start_http_server(metrics_port)
+    
+    # Admin switch: `kill -USR2 <pid>` profiles every request until toggled off again
+    signal.signal(signal.SIGUSR2, lambda *_: print(f"[*] Profiling mode: {profiling.toggle()}"))
+    
     print(f"\n{'='*50}")
     print("gRPC Story Server")
     print(f"{'='*50}")
     print(f"[✓] Listening on port {port}")
+    if metrics_port:
+        print(f"[✓] Metrics on http://0.0.0.0:{metrics_port}/metrics")
     print(f"{'='*50}\n")
     
     server.start()
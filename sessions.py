@@ -0,0 +1,106 @@
+"""Story sessions: trailing context and RNG state kept between continuation requests"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "1024"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL_SECONDS", "600"))
+CONTEXT_TOKENS = 2  # a trigram model only conditions on the last two tokens
+
+class SessionNotFound(Exception):
+    """Unknown or expired session; the client has to start over with the full prefix"""
+
+class SessionBusy(Exception):
+    """Another request is already generating in this session"""
+
+class Session:
+    """One story being extended: model, last tokens, RNG and story length"""
+
+    def __init__(self, seed=None, model=""):
+        self.id = uuid.uuid4().hex
+        self.model = model
+        self.context = []
+        self.rng = random.Random(seed)
+        self.length = 0
+        self.busy = False
+        self.last_used = time.monotonic()
+
+    def advance(self, tokens, length):
+        """Record the story state after a request; `tokens` ends with the latest tokens"""
+        self.context = list(tokens[-CONTEXT_TOKENS:])
+        self.length = length
+
+class SessionStore:
+    """Bounded LRU of sessions with idle-time expiry
+
+    A session is checked out for the duration of one generation and checked
+    back in afterwards; expired and least recently used idle sessions are
+    evicted lazily when the store is touched.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.counts = {"created": 0, "continued": 0, "expired": 0, "evicted": 0}
+
+    def _evict(self, now):
+        for sid in [sid for sid, s in self.sessions.items() if not s.busy and now - s.last_used > self.ttl]:
+            del self.sessions[sid]
+            self.counts["expired"] += 1
+        while len(self.sessions) >= self.max_sessions:
+            idle = next((sid for sid, s in self.sessions.items() if not s.busy), None)
+            if idle is None:
+                break
+            del self.sessions[idle]
+            self.counts["evicted"] += 1
+
+    def create(self, seed=None, model=""):
+        """New session for a model key, already checked out"""
+        session = Session(seed, model)
+        session.busy = True
+        with self.lock:
+            self._evict(time.monotonic())
+            self.sessions[session.id] = session
+            self.counts["created"] += 1
+        return session
+
+    def checkout(self, session_id):
+        """Take an existing session for one continuation
+
+        Raises:
+            SessionNotFound: unknown or expired
+            SessionBusy: already generating
+        """
+        with self.lock:
+            now = time.monotonic()
+            session = self.sessions.get(session_id)
+            if session is not None and not session.busy and now - session.last_used > self.ttl:
+                del self.sessions[session_id]
+                self.counts["expired"] += 1
+                session = None
+            if session is None:
+                raise SessionNotFound(f"session {session_id} not found or expired")
+            if session.busy:
+                raise SessionBusy(f"session {session_id} is already generating")
+            session.busy = True
+            self.sessions.move_to_end(session_id)
+            self.counts["continued"] += 1
+            return session
+
+    def checkin(self, session):
+        with self.lock:
+            session.busy = False
+            session.last_used = time.monotonic()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def stats(self):
+        with self.lock:
+            return {"sessions": len(self.sessions), "max_sessions": self.max_sessions, **self.counts}
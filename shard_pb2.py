@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: shard.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'shard.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0bshard.proto\x12\nurdu_story\"!\n\rLookupRequest\x12\x10\n\x08\x63ontexts\x18\x01 \x03(\x04\"U\n\x0eLookupResponse\x12\x0e\n\x06totals\x18\x01 \x03(\x04\x12\x0f\n\x07lengths\x18\x02 \x03(\r\x12\x12\n\nsuccessors\x18\x03 \x03(\r\x12\x0e\n\x06\x63ounts\x18\x04 \x03(\x04\"\x12\n\x10ShardInfoRequest\"d\n\tShardInfo\x12\r\n\x05shard\x18\x01 \x01(\x05\x12\x12\n\nnum_shards\x18\x02 \x01(\x05\x12\x12\n\nvocab_size\x18\x03 \x01(\x05\x12\x10\n\x08\x63ontexts\x18\x04 \x01(\x03\x12\x0e\n\x06nbytes\x18\x05 \x01(\x03\x32\x92\x01\n\nModelShard\x12?\n\x06Lookup\x12\x19.urdu_story.LookupRequest\x1a\x1a.urdu_story.LookupResponse\x12\x43\n\x0cGetShardInfo\x12\x1c.urdu_story.ShardInfoRequest\x1a\x15.urdu_story.ShardInfob\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'shard_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_LOOKUPREQUEST']._serialized_start=27
+  _globals['_LOOKUPREQUEST']._serialized_end=60
+  _globals['_LOOKUPRESPONSE']._serialized_start=62
+  _globals['_LOOKUPRESPONSE']._serialized_end=147
+  _globals['_SHARDINFOREQUEST']._serialized_start=149
+  _globals['_SHARDINFOREQUEST']._serialized_end=167
+  _globals['_SHARDINFO']._serialized_start=169
+  _globals['_SHARDINFO']._serialized_end=269
+  _globals['_MODELSHARD']._serialized_start=272
+  _globals['_MODELSHARD']._serialized_end=418
+# @@protoc_insertion_point(module_scope)
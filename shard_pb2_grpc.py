@@ -0,0 +1,145 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+import shard_pb2 as shard__pb2
+
+GRPC_GENERATED_VERSION = '1.78.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in shard_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class ModelShardStub(object):
+    """One partition of the n-gram tables (see shard_server.py); queried by shard_router.py
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Lookup = channel.unary_unary(
+                '/urdu_story.ModelShard/Lookup',
+                request_serializer=shard__pb2.LookupRequest.SerializeToString,
+                response_deserializer=shard__pb2.LookupResponse.FromString,
+                _registered_method=True)
+        self.GetShardInfo = channel.unary_unary(
+                '/urdu_story.ModelShard/GetShardInfo',
+                request_serializer=shard__pb2.ShardInfoRequest.SerializeToString,
+                response_deserializer=shard__pb2.ShardInfo.FromString,
+                _registered_method=True)
+
+
+class ModelShardServicer(object):
+    """One partition of the n-gram tables (see shard_server.py); queried by shard_router.py
+    """
+
+    def Lookup(self, request, context):
+        """Successors and counts of a batch of contexts
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetShardInfo(self, request, context):
+        """Which partition this server holds
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_ModelShardServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Lookup': grpc.unary_unary_rpc_method_handler(
+                    servicer.Lookup,
+                    request_deserializer=shard__pb2.LookupRequest.FromString,
+                    response_serializer=shard__pb2.LookupResponse.SerializeToString,
+            ),
+            'GetShardInfo': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetShardInfo,
+                    request_deserializer=shard__pb2.ShardInfoRequest.FromString,
+                    response_serializer=shard__pb2.ShardInfo.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'urdu_story.ModelShard', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('urdu_story.ModelShard', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class ModelShard(object):
+    """One partition of the n-gram tables (see shard_server.py); queried by shard_router.py
+    """
+
+    @staticmethod
+    def Lookup(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/urdu_story.ModelShard/Lookup',
+            shard__pb2.LookupRequest.SerializeToString,
+            shard__pb2.LookupResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetShardInfo(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/urdu_story.ModelShard/GetShardInfo',
+            shard__pb2.ShardInfoRequest.SerializeToString,
+            shard__pb2.ShardInfo.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,364 @@
+"""Router for context-sharded serving: generation over shard_server.py partitions
+
+The router keeps only the replicated part of the model (vocabulary, unigram
+counts, interpolation weights from model.json) and fetches each step's rows
+from the shards: the trigram context (a, b) and the bigram context (b), each
+on the shard its hash picks. Keys are grouped by shard and sent as one Lookup
+per shard, in parallel (from a standing thread pool); rows are kept in an LRU
+cache of SHARD_CACHE_SIZE contexts, so hot contexts (most steps, after
+warm-up) need no RPC at all. generate_batch steps a batch of stories in
+lockstep and looks up all their contexts at once. Serving generates each
+request on its own thread through sample(); there, the cache misses of
+concurrent requests are coalesced: they gather while the previous shared
+Lookup is in flight and go out together (fetch_shared). The distribution is built
+with the same formula as Scorer.next_weights, so sampling matches
+single-node generation exactly.
+
+Run directly to export the current model, start shard servers as local
+processes, check the router's distributions against the single-node scorer
+and measure per-token latency against single-node generation.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import grpc
+import numpy as np
+
+import shard_pb2
+import shard_pb2_grpc
+import tokenizer
+from shard_server import SHARD_DIR, shard_of
+
+CACHE_SIZE = int(os.environ.get("SHARD_CACHE_SIZE", "100000"))
+LOOKUP_TIMEOUT = float(os.environ.get("SHARD_LOOKUP_TIMEOUT_SECONDS", "2"))
+
+class _Batch:
+    """Context keys missed by concurrent sample() calls, fetched together"""
+
+    def __init__(self):
+        self.keys = {}     # ordered set
+        self.rows = None
+        self.error = None
+        self.done = threading.Event()
+
+class ShardedModel:
+    """Generation's next-token weights from rows looked up on shard servers
+
+    Args:
+        addresses: host:port of each shard server, in shard order
+        model_dir: export directory holding model.json
+        cache_size: contexts kept in the LRU cache (0 disables it)
+        merges_path: BPE merges for encoding prefixes (see tokens); None or missing: split on spaces
+    """
+
+    def __init__(self, addresses, model_dir=SHARD_DIR, cache_size=CACHE_SIZE, timeout=LOOKUP_TIMEOUT,
+                 merges_path=None):
+        meta = json.loads((Path(model_dir) / "model.json").read_text(encoding="utf-8"))
+        if len(addresses) != meta["num_shards"]:
+            raise ValueError(f"model has {meta['num_shards']} shards, got {len(addresses)} addresses")
+        self.vocab = meta["vocab"]
+        self.ids = {w: i for i, w in enumerate(self.vocab)}
+        V = self.unk = len(self.vocab)
+        self.size = V + 1
+        self.uni = np.zeros(V + 1)
+        self.uni[:V] = meta["unigrams"]
+        self.p_uni = self.uni / self.uni.sum()
+        self.lambdas = lambdas = meta["lambdas"]
+        self.l3, self.l2, self.l1 = lambdas["lambda3"], lambdas["lambda2"], lambdas["lambda1"]
+        self.word_start = meta["word_start"]
+        self.merges, self.special = None, tokenizer.SPECIAL
+        if merges_path is not None and Path(merges_path).exists():
+            self.merges, self.special, _ = tokenizer.load_merges(merges_path)
+        self.pieces = {}          # word → BPE tokens, filled lazily
+        self.stubs = [shard_pb2_grpc.ModelShardStub(grpc.insecure_channel(a)) for a in addresses]
+        self.pool = ThreadPoolExecutor(len(addresses))
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache = OrderedDict()   # context key → (total, successor IDs, counts)
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.rpcs = self.shared = 0
+        self.batch = None                   # open _Batch of sample() misses, see fetch_shared
+        self.send_lock = threading.Lock()   # one shared fetch in flight
+
+    def wait_ready(self, timeout=30):
+        for stub in self.stubs:
+            stub.GetShardInfo(shard_pb2.ShardInfoRequest(), timeout=timeout, wait_for_ready=True)
+
+    def shard_info(self):
+        return [stub.GetShardInfo(shard_pb2.ShardInfoRequest(), timeout=self.timeout) for stub in self.stubs]
+
+    def lookup(self, keys):
+        """Rows of context keys: {key: (total, successor IDs, counts)}, one parallel Lookup per shard for misses"""
+        rows, missing = self.cached(keys)
+        if missing:
+            rows.update(self.fetch(missing))
+        return rows
+
+    def cached(self, keys):
+        """(rows of the keys in the cache, keys that are not)"""
+        rows, missing = {}, []
+        with self.lock:
+            for k in keys:
+                row = self.cache.get(k)
+                if row is None:
+                    missing.append(k)
+                else:
+                    self.cache.move_to_end(k)
+                    rows[k] = row
+            self.hits += len(rows)
+            self.misses += len(missing)
+        return rows, missing
+
+    def fetch(self, keys):
+        """Rows of context keys from the shards (one parallel Lookup per shard), added to the cache"""
+        by_shard = {}
+        for k in dict.fromkeys(keys):
+            by_shard.setdefault(shard_of(k, len(self.stubs)), []).append(k)
+        def call(i):
+            return self.stubs[i].Lookup(shard_pb2.LookupRequest(contexts=by_shard[i]), timeout=self.timeout)
+        # Stub futures start a thread per call; a standing pool (or the caller, for one shard) is much cheaper
+        if len(by_shard) == 1:
+            responses = {i: call(i) for i in by_shard}
+        else:
+            responses = dict(zip(by_shard, self.pool.map(call, by_shard)))
+        fetched = {}
+        for i, resp in responses.items():
+            ends = np.cumsum(resp.lengths)
+            successors = np.split(np.array(resp.successors, dtype=np.int64), ends[:-1])
+            counts = np.split(np.array(resp.counts, dtype=np.float64), ends[:-1])
+            for k, total, s, c in zip(by_shard[i], resp.totals, successors, counts):
+                fetched[k] = (total, s, c)
+        with self.lock:
+            self.rpcs += len(responses)
+            if self.cache_size:
+                self.cache.update(fetched)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return fetched
+
+    def fetch_shared(self, keys):
+        """Rows of context keys, fetched together with the misses of other threads (concurrent requests)
+
+        A caller joins the open batch or opens one. The batch's opener sends it
+        once the previous shared fetch has returned, so the misses of every
+        request that reached this step in the meantime go out in one Lookup per
+        shard. A lone request does not wait.
+        """
+        with self.lock:
+            batch = self.batch
+            opener = batch is None
+            if opener:
+                batch = self.batch = _Batch()
+            else:
+                self.shared += 1
+            batch.keys.update(dict.fromkeys(keys))
+        if opener:
+            with self.send_lock:
+                with self.lock:
+                    self.batch = None   # later misses open the next batch
+                try:
+                    batch.rows = self.fetch(list(batch.keys))
+                except Exception as e:
+                    batch.error = e
+                finally:
+                    batch.done.set()
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return {k: batch.rows[k] for k in keys}
+
+    def keys(self, a, b):
+        """Context keys of (a, b): trigram then bigram; None for a context with an unseen token"""
+        S = self.size
+        return (S + a * S + b if a != self.unk and b != self.unk else None), (b if b != self.unk else None)
+
+    def next_weights(self, a, b, rows):
+        """Unnormalized next-token weights after IDs (a, b), as Scorer.next_weights computes them"""
+        tri_key, bi_key = self.keys(a, b)
+        p = self.l1 * self.p_uni[:self.unk]
+        if bi_key is not None and self.uni[b] > 0:
+            _, succ, counts = rows[bi_key]
+            p[succ] += (self.l2 / self.uni[b]) * counts
+        if tri_key is not None:
+            total, succ, counts = rows[tri_key]
+            if total > 0:
+                p[succ] += (self.l3 / total) * counts
+        return p
+
+    def tokens(self, text):
+        """Model tokens of a cleaned text (a prefix), BPE-encoded as Scorer.tokens(text, "corpus") does"""
+        if self.merges is None:
+            return text.split()
+        out = []
+        for word in text.split():
+            pieces = self.pieces.get(word)
+            if pieces is None:
+                pieces = self.pieces[word] = [self.special.get(t, t) for t in
+                                              tokenizer.encode(word, self.merges, self.word_start, self.special)]
+            out.extend(pieces)
+        return out
+
+    def draw(self, weights, rng=random):
+        """A token sampled from unnormalized weights (by unigram counts if they are all zero)"""
+        cum = np.cumsum(weights)
+        if cum[-1] <= 0:
+            cum = np.cumsum(self.uni[:self.unk])
+        i = int(np.searchsorted(cum, rng.random() * cum[-1], side="right"))
+        return self.vocab[min(i, self.unk - 1)]
+
+    def sample(self, tokens, rng=random):
+        """Next token after `tokens`, as generate_batch samples it for one story
+
+        Serving calls this per request and token; cache misses are batched
+        across concurrent requests (fetch_shared).
+        """
+        if len(tokens) < 2:
+            return self.draw(self.uni[:self.unk], rng)
+        c = (self.ids.get(tokens[-2], self.unk), self.ids.get(tokens[-1], self.unk))
+        rows, missing = self.cached([k for k in self.keys(*c) if k is not None])
+        if missing:
+            rows.update(self.fetch_shared(missing))
+        return self.draw(self.next_weights(*c, rows), rng)
+
+    def generate_batch(self, stories, max_length=500, rng=random):
+        """Extend each token list in `stories` (in place) by up to max_length tokens, in lockstep
+
+        Each step's lookups for all unfinished stories go out together.
+        """
+        ids = self.ids
+        active = [s for s in stories if not (s and s[-1] == "<EOT>")]
+        for _ in range(max_length):
+            if not active:
+                break
+            contexts = [(ids.get(s[-2], self.unk), ids.get(s[-1], self.unk)) if len(s) >= 2 else None for s in active]
+            rows = self.lookup([k for c in contexts if c is not None for k in self.keys(*c) if k is not None])
+            for story, c in zip(active, contexts):
+                # Fewer than two tokens: generation samples by unigram counts
+                story.append(self.draw(self.uni[:self.unk] if c is None else self.next_weights(*c, rows), rng))
+            active = [s for s in active if s[-1] != "<EOT>"]
+        return stories
+
+    def generate(self, tokens=None, max_length=500, rng=random):
+        """One story: `tokens` (the prefix, extended in place) plus up to max_length tokens"""
+        tokens = [] if tokens is None else tokens
+        return self.generate_batch([tokens], max_length, rng)[0]
+
+    def nbytes(self):
+        """Replicated arrays held by the router (the row cache grows on top, up to cache_size contexts)"""
+        return self.uni.nbytes + self.p_uni.nbytes
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"contexts_cached": len(self.cache), "hit_rate": self.hits / lookups if lookups else None,
+                "rpcs": self.rpcs, "shared_fetches": self.shared}
+
+def start_shards(model_dir, num_shards, base_port):
+    """Start one shard_server.py process per partition; returns (processes, addresses)"""
+    here = Path(__file__).resolve().parent
+    procs, addresses = [], []
+    for i in range(num_shards):
+        port = base_port + i
+        procs.append(subprocess.Popen([sys.executable, str(here / "shard_server.py"),
+                                       "--shard", str(Path(model_dir) / f"shard-{i}.npz"), "--port", str(port)],
+                                      stdout=subprocess.DEVNULL))
+        addresses.append(f"localhost:{port}")
+    return procs, addresses
+
+def _local_generate(scorer, tokens, max_length, rng):
+    """Single-node vectorized generation (Scorer.next_weights), sampled the same way as the router"""
+    ids, unk = scorer.ids, scorer.unk
+    for _ in range(max_length):
+        w = scorer.uni[:unk] if len(tokens) < 2 else \
+            scorer.next_weights(ids.get(tokens[-2], unk), ids.get(tokens[-1], unk))
+        cum = np.cumsum(w)
+        i = int(np.searchsorted(cum, rng.random() * cum[-1], side="right"))
+        tokens.append(scorer.vocab[min(i, unk - 1)])
+        if tokens[-1] == "<EOT>":
+            break
+    return tokens
+
+def _per_token(run, tokens, seed=0):
+    """µs per generated token of run(max_length, rng), and tokens generated, over about `tokens` tokens"""
+    rng, produced = random.Random(seed), 0
+    t0 = time.perf_counter()
+    while produced < tokens:
+        produced += run(min(500, tokens - produced), rng)
+    return (time.perf_counter() - t0) / produced * 1e6, produced
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Benchmark sharded serving against single-node generation")
+    parser.add_argument("--num-shards", type=int, default=4)
+    parser.add_argument("--base-port", type=int, default=50061)
+    parser.add_argument("--tokens", type=int, default=3000)
+    parser.add_argument("--batch", type=int, default=16, help="Stories generated in lockstep")
+    args = parser.parse_args()
+
+    import generator
+    from shard_server import export
+    state, single_bytes = generator.load_state()
+    scorer = state['scorer']
+    export_dir = tempfile.mkdtemp(prefix="shards-")
+    sizes = export(scorer, args.num_shards, export_dir)
+    procs, addresses = start_shards(export_dir, args.num_shards, args.base_port)
+    try:
+        model = ShardedModel(addresses, export_dir)
+        model.wait_ready()
+        info = model.shard_info()
+        print(f"[✓] {len(info)} shard processes: " + ", ".join(
+            f"{i.contexts} contexts / {i.nbytes / 2**20:.2f} MB" for i in info) +
+            f" (single node: {single_bytes / 2**20:.1f} MB serving state, scorer {scorer.nbytes() / 2**20:.1f} MB)")
+
+        rng = random.Random(1)
+        worst = 0.0
+        for _ in range(500):
+            story = _local_generate(scorer, [], rng.randint(2, 60), rng)
+            if len(story) < 2:
+                continue
+            a, b = scorer.ids[story[-2]], scorer.ids[story[-1]]
+            got = model.next_weights(a, b, model.lookup([k for k in model.keys(a, b) if k is not None]))
+            worst = max(worst, float(np.abs(got - scorer.next_weights(a, b)).max()))
+        print(f"[{'✓' if worst < 1e-12 else '✗'}] Router vs single-node weights, 500 contexts: max |diff| {worst:.1e}")
+
+        def dict_loop(n, rng):
+            return sum(1 for _ in generator.generate_tokens([], n, rng, metered=False, state=state))
+
+        def local(n, rng):
+            return len(_local_generate(scorer, [], n, rng))
+
+        base, _ = _per_token(local, args.tokens)
+        loop, _ = _per_token(dict_loop, args.tokens)
+        print(f"[*] {'single node, dict loop (today)':<36} {loop:8.1f} µs/token")
+        print(f"[*] {'single node, vectorized weights':<36} {base:8.1f} µs/token")
+        cached = ShardedModel(addresses, export_dir)
+        modes = [("sharded, no cache", ShardedModel(addresses, export_dir, cache_size=0), 1),
+                 (f"sharded, no cache, {args.batch} per step", ShardedModel(addresses, export_dir, cache_size=0),
+                  args.batch),
+                 ("sharded, cache, cold", cached, 1),
+                 ("sharded, cache, warmed by the above", cached, 1),
+                 (f"sharded, cache, {args.batch} per step", cached, args.batch)]
+        for seed, (name, m, batch) in enumerate(modes):  # new stories each time: no replayed cache hits
+            rpcs, hits, misses = m.rpcs, m.hits, m.misses
+            us, produced = _per_token(lambda n, rng: sum(map(len, m.generate_batch([[] for _ in range(batch)], n,
+                                                                                   rng))), args.tokens, seed)
+            lookups = m.hits - hits + m.misses - misses
+            print(f"[*] {name:<36} {us:8.1f} µs/token ({us - base:+8.1f} vs vectorized single node), "
+                  f"{(m.rpcs - rpcs) / produced:.3f} RPCs/token, "
+                  f"{(m.hits - hits) / lookups if lookups else 0:.0%} cache hits")
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
@@ -0,0 +1,156 @@
+"""Context-sharded n-gram tables: export partitions and serve one over gRPC
+
+A model is split by a hash of the context into NUM_SHARDS partitions. A
+partition holds, for each of its contexts (the bigram context b and the
+trigram context (a, b)), the context's own count and its successors with
+their counts, as sorted numpy arrays (a lookup is a searchsorted). The small
+replicated part (vocabulary, unigram counts, interpolation weights) goes to
+model.json for the router (shard_router.py), which computes generation's
+distribution from the looked-up rows.
+
+  python shard_server.py --export shards --num-shards 4     # write shards/shard-<i>.npz + model.json
+  python shard_server.py --shard shards/shard-0.npz --port 50061
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent import futures
+from pathlib import Path
+
+import grpc
+import numpy as np
+
+import shard_pb2
+import shard_pb2_grpc
+
+NUM_SHARDS = int(os.environ.get("NUM_SHARDS", "2"))
+SHARD_DIR = Path("shards")
+
+def shard_of(keys, num_shards):
+    """Partition of each context key: high bits of a multiplicative hash (numpy array or int)"""
+    if isinstance(keys, np.ndarray):
+        h = (keys.astype(np.uint64) * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+        return ((h >> np.uint64(16)) % np.uint64(num_shards)).astype(np.int64)
+    return (((keys * 2654435761) & 0xFFFFFFFF) >> 16) % num_shards
+
+def context_rows(scorer):
+    """Every (context, successor) of a scorer's model: (context keys, context totals, successor IDs, counts)
+
+    Keys are b for the bigram context (b) and S + a * S + b for the trigram
+    context (a, b), S = V + 1 (scorer IDs; V is the unseen-token ID).
+    """
+    V, S = scorer.unk, scorer.size
+    bi_ctx, bi_succ = np.nonzero(scorer.bigrams[:V, :V])
+    bi_counts = scorer.bigrams[bi_ctx, bi_succ]
+    tri_ctx = scorer.tri_keys // S                # a * S + b
+    tri_succ = scorer.tri_keys % S
+    tri_totals = scorer.bigrams[tri_ctx // S, tri_ctx % S]
+    keep = tri_totals > 0                         # generation ignores trigrams of an unseen pair
+    ctx = np.concatenate((bi_ctx, S + tri_ctx[keep]))
+    succ = np.concatenate((bi_succ, tri_succ[keep]))
+    counts = np.concatenate((bi_counts, scorer.tri_counts[keep]))
+    totals = np.concatenate((scorer.uni[bi_ctx], tri_totals[keep]))
+    return ctx, totals, succ, counts
+
+def export(scorer, num_shards=NUM_SHARDS, out_dir=SHARD_DIR):
+    """Write shard-<i>.npz partitions and model.json (the router's replicated part)
+
+    Returns:
+        list of partition sizes in bytes
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ctx, totals, succ, counts = context_rows(scorer)
+    order = np.lexsort((succ, ctx))
+    ctx, totals, succ, counts = ctx[order], totals[order], succ[order], counts[order]
+    owner = shard_of(ctx, num_shards)
+    sizes = []
+    for i in range(num_shards):
+        mine = owner == i
+        keys, first = np.unique(ctx[mine], return_index=True)
+        offsets = np.append(first, mine.sum()).astype(np.int64)
+        arrays = {"keys": keys.astype(np.uint64), "totals": totals[mine][first].astype(np.uint64),
+                  "offsets": offsets, "successors": succ[mine].astype(np.uint32),
+                  "counts": counts[mine].astype(np.uint64)}
+        np.savez(out_dir / f"shard-{i}.npz", shard=i, num_shards=num_shards, vocab_size=scorer.unk, **arrays)
+        sizes.append(sum(a.nbytes for a in arrays.values()))
+    (out_dir / "model.json").write_text(json.dumps({
+        "num_shards": num_shards, "vocab": scorer.vocab, "unigrams": scorer.uni[:scorer.unk].tolist(),
+        "lambdas": {"lambda3": scorer.l3, "lambda2": scorer.l2, "lambda1": scorer.l1},
+        "word_start": scorer.word_start}, ensure_ascii=False), encoding="utf-8")
+    return sizes
+
+class ShardTable:
+    """One partition, looked up by sorted context keys"""
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.shard, self.num_shards = int(data["shard"]), int(data["num_shards"])
+            self.vocab_size = int(data["vocab_size"])
+            self.keys, self.totals, self.offsets = data["keys"], data["totals"], data["offsets"]
+            self.successors, self.counts = data["successors"], data["counts"]
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.keys, self.totals, self.offsets, self.successors, self.counts))
+
+    def lookup(self, contexts):
+        """(totals, lengths, successors, counts) of the contexts, flattened in request order"""
+        contexts = np.asarray(contexts, dtype=np.uint64)
+        if not len(self.keys):
+            none = np.zeros(len(contexts), dtype=np.int64)
+            return none, none, self.successors[:0], self.counts[:0]
+        i = np.searchsorted(self.keys, contexts)
+        i[i == len(self.keys)] = 0
+        found = self.keys[i] == contexts
+        start = np.where(found, self.offsets[i], 0)
+        lengths = np.where(found, self.offsets[i + 1] - self.offsets[i], 0)
+        # Gather the successor ranges back to back: start of each range + position within it
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.repeat(start, lengths) + within
+        return np.where(found, self.totals[i], 0), lengths, self.successors[rows], self.counts[rows]
+
+class ModelShardServicer(shard_pb2_grpc.ModelShardServicer):
+    """Lookups against one partition"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def Lookup(self, request, context):
+        totals, lengths, successors, counts = self.table.lookup(request.contexts)
+        return shard_pb2.LookupResponse(totals=totals.tolist(), lengths=lengths.tolist(),
+                                        successors=successors.tolist(), counts=counts.tolist())
+
+    def GetShardInfo(self, request, context):
+        t = self.table
+        return shard_pb2.ShardInfo(shard=t.shard, num_shards=t.num_shards, vocab_size=t.vocab_size,
+                                   contexts=len(t.keys), nbytes=t.nbytes())
+
+def serve(path, port, workers=8):
+    table = ShardTable(path)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    shard_pb2_grpc.add_ModelShardServicer_to_server(ModelShardServicer(table), server)
+    server.add_insecure_port(f"0.0.0.0:{port}")
+    server.start()
+    print(f"[✓] Shard {table.shard}/{table.num_shards}: {len(table.keys)} contexts, "
+          f"{table.nbytes() / 2**20:.1f} MB, listening on port {port}", flush=True)
+    server.wait_for_termination()
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Export model partitions, or serve one")
+    parser.add_argument("--export", metavar="DIR", help="Write NUM_SHARDS partitions of the model to DIR")
+    parser.add_argument("--num-shards", type=int, default=NUM_SHARDS)
+    parser.add_argument("--shard", help="Partition file to serve (shard-<i>.npz)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "50061")))
+    args = parser.parse_args()
+
+    if args.export:
+        from scoring import load_scorer
+        sizes = export(load_scorer(), args.num_shards, args.export)
+        print(f"[✓] {len(sizes)} shards in {args.export}: " + ", ".join(f"{s / 2**20:.2f} MB" for s in sizes))
+    elif args.shard:
+        serve(args.shard, args.port)
+    else:
+        parser.error("--export DIR or --shard FILE")
@@ -0,0 +1,479 @@
+"""Client library for the story service: pooled gRPC (sync and asyncio) and HTTP/SSE
+
+All three clients share one interface. generate() returns an iterator of text
+deltas, already rendered by the server (see detokenizer.py): concatenated,
+they form the story text. The returned Generation also exposes text, num_tokens,
+session_id and model. predict() and score() return plain Python values.
+
+gRPC clients spread calls round-robin over a pool of channels. Each channel
+has its own connection (local subchannel pool) with keepalive, so hundreds of
+concurrent streams from one process need no per-call connection setup.
+Unary calls (GetModelInfo, PredictNext, Score) carry a default deadline and
+are retried on UNAVAILABLE with exponential backoff by gRPC's retry policy.
+Generate is not retried: a stream that has started cannot be replayed.
+
+    client = StoryClient("localhost:50051")
+    story = client.generate("ایک دن", max_length=100)
+    for delta in story:
+        print(delta, end="", flush=True)
+    more = client.generate(max_length=50, session_id=story.session_id)
+
+generate() also takes constraints, a dict of the Constraints fields
+(banned_tokens, banned_words, endings, min_tokens, max_tokens; see constraints.py).
+
+Run directly to fan out concurrent generations and compare a channel per call
+with the pooled client.
+"""
+
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import os
+import queue
+import socket
+import sys
+import time
+from urllib.parse import urlparse
+
+import grpc
+
+import generate_pb2
+import generate_pb2_grpc
+
+POOL_SIZE = int(os.environ.get("STORY_CLIENT_CHANNELS", "4"))
+KEEPALIVE_MS = int(os.environ.get("STORY_CLIENT_KEEPALIVE_MS", "30000"))
+UNARY_TIMEOUT = float(os.environ.get("STORY_CLIENT_TIMEOUT_SECONDS", "5"))
+RETRY_ATTEMPTS = int(os.environ.get("STORY_CLIENT_RETRIES", "4"))
+
+SERVICE = "urdu_story.StoryGenerator"
+_CAMEL = {"banned_tokens": "bannedTokens", "banned_words": "bannedWords", "endings": "endings",
+          "min_tokens": "minTokens", "max_tokens": "maxTokens"}
+HTTP_CODES = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 409: "FAILED_PRECONDITION", 429: "RESOURCE_EXHAUSTED",
+              503: "UNAVAILABLE"}
+
+class StoryClientError(Exception):
+    """A failed call; `code` is the gRPC status name (HTTP statuses are mapped to one)"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+def channel_options(keepalive_ms=KEEPALIVE_MS, timeout=UNARY_TIMEOUT, attempts=RETRY_ATTEMPTS):
+    """Channel arguments: own connection per channel, keepalive, and the unary retry/deadline policy"""
+    service_config = {"methodConfig": [{
+        "name": [{"service": SERVICE, "method": m} for m in ("GetModelInfo", "PredictNext", "Score")],
+        "timeout": f"{timeout}s",
+        "retryPolicy": {"maxAttempts": attempts, "initialBackoff": "0.1s", "maxBackoff": "2s",
+                        "backoffMultiplier": 2, "retryableStatusCodes": ["UNAVAILABLE"]},
+    }]}
+    return [
+        ("grpc.use_local_subchannel_pool", 1),
+        ("grpc.keepalive_time_ms", keepalive_ms),
+        ("grpc.keepalive_timeout_ms", 10000),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.enable_retries", 1),
+        ("grpc.service_config", json.dumps(service_config)),
+    ]
+
+class Generation:
+    """Iterator of text deltas for one story request
+
+    Attributes (current as the stream is read): text, num_tokens, session_id, model, done.
+    """
+
+    def __init__(self, chunks, cancel=None):
+        self._chunks = chunks          # iterator of (text delta, num_tokens, session_id, model, is_final)
+        self._cancel = cancel
+        self._parts = []
+        self.num_tokens = 0
+        self.session_id = ""
+        self.model = ""
+        self.done = False
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def _delta(self, delta, num_tokens, session_id, model, is_final):
+        self._parts.append(delta)
+        self.num_tokens, self.session_id, self.model, self.done = num_tokens, session_id, model, is_final
+        return delta
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._delta(*next(self._chunks))
+
+    def result(self):
+        """Read the rest of the stream; returns the full text"""
+        for _ in self:
+            pass
+        return self.text
+
+    def cancel(self):
+        if self._cancel is not None:
+            self._cancel()
+
+class AsyncGeneration(Generation):
+    """Async iterator of text deltas; same attributes as Generation"""
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return self._delta(*await self._chunks.__anext__())
+
+    async def result(self):
+        async for _ in self:
+            pass
+        return self.text
+
+def _request(prefix, max_length, session_id, model, constraints):
+    return generate_pb2.GenerateRequest(prefix=prefix, max_length=max_length, session_id=session_id, delta=True,
+                                        model=model, constraints=constraints and generate_pb2.Constraints(**constraints))
+
+def _chunk(resp):
+    return resp.chunk, resp.num_tokens, resp.session_id, resp.model, resp.is_final
+
+def _error(e):
+    return StoryClientError(e.code().name, e.details())
+
+def _predictions(resp):
+    return [(p.token, p.probability) for p in resp.predictions], resp.context_order
+
+def _scores(resp, per_token):
+    scores = []
+    for s in resp.scores:
+        score = {"num_tokens": s.num_tokens, "log_prob": s.log_prob,
+                 "perplexity": s.perplexity if s.num_tokens else None, "oov_tokens": s.oov_tokens}
+        if per_token:
+            score["tokens"], score["token_log_probs"] = list(s.tokens), list(s.token_log_probs)
+        scores.append(score)
+    return scores
+
+class StoryClient:
+    """Thread-safe gRPC client over a round-robin pool of channels"""
+
+    def __init__(self, address="localhost:50051", pool_size=POOL_SIZE, options=None):
+        options = channel_options() if options is None else options
+        self.channels = [grpc.insecure_channel(address, options=options) for _ in range(max(1, pool_size))]
+        self.stubs = [generate_pb2_grpc.StoryGeneratorStub(c) for c in self.channels]
+        self._next = itertools.count()
+
+    def _stub(self):
+        return self.stubs[next(self._next) % len(self.stubs)]
+
+    def generate(self, prefix="", max_length=500, session_id="", model="", timeout=None, constraints=None):
+        """Start a story (or continue `session_id`); returns a Generation of text deltas"""
+        call = self._stub().Generate(_request(prefix, max_length, session_id, model, constraints), timeout=timeout)
+
+        def chunks():
+            try:
+                for resp in call:
+                    yield _chunk(resp)
+            except grpc.RpcError as e:
+                raise _error(e) from None
+        return Generation(chunks(), call.cancel)
+
+    def model_info(self, timeout=None):
+        try:
+            return self._stub().GetModelInfo(generate_pb2.Empty(), timeout=timeout)
+        except grpc.RpcError as e:
+            raise _error(e) from None
+
+    def predict(self, context="", k=10, timeout=None):
+        """([(token, probability), ...], context order)"""
+        try:
+            return _predictions(self._stub().PredictNext(generate_pb2.PredictRequest(context=context, k=k),
+                                                         timeout=timeout))
+        except grpc.RpcError as e:
+            raise _error(e) from None
+
+    def score(self, texts, format="raw", per_token=False, timeout=None):
+        """One dict per text: num_tokens, log_prob, perplexity, oov_tokens (+ tokens, token_log_probs)"""
+        try:
+            resp = self._stub().Score(generate_pb2.ScoreRequest(texts=texts, format=format, per_token=per_token),
+                                      timeout=timeout)
+        except grpc.RpcError as e:
+            raise _error(e) from None
+        return _scores(resp, per_token)
+
+    def wait_ready(self, timeout=10):
+        """Block until every channel is connected"""
+        for channel in self.channels:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class AsyncStoryClient:
+    """asyncio gRPC client over a round-robin pool of grpc.aio channels (create inside a running loop)"""
+
+    def __init__(self, address="localhost:50051", pool_size=POOL_SIZE, options=None):
+        options = channel_options() if options is None else options
+        self.channels = [grpc.aio.insecure_channel(address, options=options) for _ in range(max(1, pool_size))]
+        self.stubs = [generate_pb2_grpc.StoryGeneratorStub(c) for c in self.channels]
+        self._next = itertools.count()
+
+    def _stub(self):
+        return self.stubs[next(self._next) % len(self.stubs)]
+
+    def generate(self, prefix="", max_length=500, session_id="", model="", timeout=None, constraints=None):
+        """Start a story (or continue `session_id`); returns an AsyncGeneration of text deltas"""
+        call = self._stub().Generate(_request(prefix, max_length, session_id, model, constraints), timeout=timeout)
+
+        async def chunks():
+            try:
+                async for resp in call:
+                    yield _chunk(resp)
+            except grpc.RpcError as e:
+                raise _error(e) from None
+        return AsyncGeneration(chunks(), call.cancel)
+
+    async def model_info(self, timeout=None):
+        try:
+            return await self._stub().GetModelInfo(generate_pb2.Empty(), timeout=timeout)
+        except grpc.RpcError as e:
+            raise _error(e) from None
+
+    async def predict(self, context="", k=10, timeout=None):
+        try:
+            return _predictions(await self._stub().PredictNext(generate_pb2.PredictRequest(context=context, k=k),
+                                                               timeout=timeout))
+        except grpc.RpcError as e:
+            raise _error(e) from None
+
+    async def score(self, texts, format="raw", per_token=False, timeout=None):
+        try:
+            resp = await self._stub().Score(generate_pb2.ScoreRequest(texts=texts, format=format,
+                                                                      per_token=per_token), timeout=timeout)
+        except grpc.RpcError as e:
+            raise _error(e) from None
+        return _scores(resp, per_token)
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+class HttpStoryClient:
+    """Same interface over app.py's HTTP API, with a pool of keep-alive connections
+
+    Deltas are the same display text as the gRPC clients'. A call's `timeout`
+    is a deadline for the whole call, as for gRPC; without one, only each
+    socket operation is bounded, by the constructor's `timeout`.
+    """
+
+    def __init__(self, base_url="http://localhost:5000", pool_size=POOL_SIZE, timeout=120):
+        parsed = urlparse(base_url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.base = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=max(1, pool_size))
+
+    def _conn(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    @staticmethod
+    def _deadline(timeout):
+        """Monotonic time a call must finish by, or None"""
+        return None if timeout is None else time.monotonic() + timeout
+
+    def _limit(self, conn, deadline):
+        """Bound the connection's next socket operation by the call's deadline"""
+        remaining = self.timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StoryClientError("DEADLINE_EXCEEDED", "deadline exceeded")
+        conn.timeout = remaining            # used when the connection (re)connects
+        if conn.sock is not None:
+            conn.sock.settimeout(remaining)
+
+    def _release(self, conn, resp):
+        # app.py's SSE responses carry both "Connection: keep-alive" and the dev server's "close"
+        reusable = not resp.will_close and "close" not in (v.lower() for v in resp.headers.get_all("Connection", ()))
+        if resp.isclosed() and reusable:
+            conn.timeout = self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(self.timeout)
+            try:
+                self.idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+    def _open(self, method, path, body, deadline):
+        """(connection, response) with a 200 status, or StoryClientError"""
+        conn = self._conn()
+        try:
+            self._limit(conn, deadline)
+            conn.request(method, self.base + path, json.dumps(body) if body is not None else None,
+                         {"Content-Type": "application/json"})
+            self._limit(conn, deadline)
+            resp = conn.getresponse()
+        except socket.timeout:
+            conn.close()
+            raise StoryClientError("DEADLINE_EXCEEDED", "deadline exceeded") from None
+        except StoryClientError:
+            conn.close()
+            raise
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise StoryClientError("UNAVAILABLE", str(e)) from None
+        if resp.status != 200:
+            payload = resp.read()
+            self._release(conn, resp)
+            try:
+                message = json.loads(payload).get("error", "")
+            except ValueError:
+                message = payload.decode("utf-8", "replace")
+            raise StoryClientError(HTTP_CODES.get(resp.status, f"HTTP_{resp.status}"), message)
+        return conn, resp
+
+    def _json(self, method, path, body=None, timeout=None):
+        deadline = self._deadline(timeout)
+        conn, resp = self._open(method, path, body, deadline)
+        try:
+            self._limit(conn, deadline)
+            data = json.loads(resp.read())
+        except (socket.timeout, StoryClientError):
+            conn.close()
+            raise StoryClientError("DEADLINE_EXCEEDED", "deadline exceeded") from None
+        self._release(conn, resp)
+        return data
+
+    def generate(self, prefix="", max_length=500, session_id="", model="", timeout=None, constraints=None):
+        """Start a story (or continue `session_id`); returns a Generation of text deltas"""
+        body = {"prefix": prefix, "maxLength": max_length, "sessionId": session_id, "delta": True, "model": model}
+        if constraints:
+            body["constraints"] = {_CAMEL[k]: v for k, v in constraints.items()}
+        deadline = self._deadline(timeout)
+        conn, resp = self._open("POST", "/generate", body, deadline)
+        finished = False
+
+        def chunks():
+            nonlocal finished
+            event = "message"
+            try:
+                while True:
+                    self._limit(conn, deadline)
+                    try:
+                        line = resp.readline()
+                    except socket.timeout:
+                        raise StoryClientError("DEADLINE_EXCEEDED", "deadline exceeded") from None
+                    if not line:
+                        break
+                    line = line.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif not line:
+                        event = "message"
+                    elif line.startswith("data: ") and event == "message":
+                        data = json.loads(line[6:])
+                        if "error" in data:
+                            raise StoryClientError(data.get("code") or "UNKNOWN", data["error"])
+                        yield data["chunk"], data["numTokens"], data["sessionId"], data.get("model", ""), \
+                            data["isFinal"]
+                finished = True
+            finally:
+                if finished:
+                    resp.read()
+                    self._release(conn, resp)
+                else:
+                    conn.close()
+        return Generation(chunks(), conn.close)
+
+    def predict(self, context="", k=10, timeout=None):
+        data = self._json("POST", "/predict", {"context": context, "k": k}, timeout)
+        return [(p["token"], p["probability"]) for p in data["predictions"]], data["contextOrder"]
+
+    def score(self, texts, format="raw", per_token=False, timeout=None):
+        data = self._json("POST", "/score", {"texts": texts, "format": format, "perToken": per_token}, timeout)
+        keys = {"numTokens": "num_tokens", "logProb": "log_prob", "perplexity": "perplexity",
+                "oovTokens": "oov_tokens", "tokens": "tokens", "tokenLogProbs": "token_log_probs"}
+        return [{keys[k]: v for k, v in s.items()} for s in data["scores"]]
+
+    def stats(self):
+        return self._json("GET", "/stats")
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+async def _fan_out(address, n, concurrency, max_length, pooled):
+    """Run n generations, at most `concurrency` at a time; returns (seconds, tokens, errors)"""
+    gate = asyncio.Semaphore(concurrency)
+    client = AsyncStoryClient(address) if pooled else None
+    tokens = errors = 0
+
+    async def one():
+        nonlocal tokens, errors
+        async with gate:
+            own = None if pooled else AsyncStoryClient(address, pool_size=1)
+            try:
+                story = (client or own).generate(max_length=max_length)
+                await story.result()
+                tokens += story.num_tokens
+            except StoryClientError:
+                errors += 1
+            finally:
+                if own is not None:
+                    await own.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    if client is not None:
+        await client.close()
+    return elapsed, tokens, errors
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Fan out concurrent generations with the pooled client")
+    parser.add_argument("--address", default="localhost:50051")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--max-length", type=int, default=5)
+    args = parser.parse_args()
+
+    with StoryClient(args.address) as client:
+        client.wait_ready()
+        info = client.model_info()
+        print(f"[✓] Connected: vocab {info.vocab_size}, default model {info.default_model!r}")
+    for pooled in (False, True):
+        elapsed, tokens, errors = asyncio.run(_fan_out(args.address, args.requests, args.concurrency,
+                                                       args.max_length, pooled))
+        label = "pooled channels" if pooled else "channel per call"
+        print(f"[*] {label:<16}: {args.requests} generations in {elapsed:.2f}s "
+              f"({args.requests / elapsed:.0f} req/s, {tokens} tokens, {errors} errors)")
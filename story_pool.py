@@ -0,0 +1,192 @@
+"""Pool of pre-generated stories for popular prefixes, refilled while the server is idle
+
+Prefixes are ranked over a sliding window of recent requests; those seen at
+least POOL_MIN_REQUESTS times (plus any pinned in POOL_PREFIXES) get up to
+POOL_SIZE stories each. A background thread generates them only while no
+request is running or queued, and abandons a story as soon as one arrives.
+
+A pooled story is served at most once (no repeats), is dropped after
+POOL_TTL_SECONDS, and is truncated to the request's max_length; a story
+generated for a longer length is a valid sample for a shorter one.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import metrics
+
+POOL_SIZE = int(os.environ.get("POOL_SIZE", "4"))
+POOL_PREFIXES = int(os.environ.get("POOL_MAX_PREFIXES", "8"))
+POOL_MIN_REQUESTS = int(os.environ.get("POOL_MIN_REQUESTS", "3"))
+POOL_WINDOW = int(os.environ.get("POOL_WINDOW", "1000"))
+POOL_TTL = float(os.environ.get("POOL_TTL_SECONDS", "3600"))
+POOL_LENGTH = int(os.environ.get("POOL_STORY_LENGTH", "500"))
+PINNED = [p for p in os.environ.get("POOL_PREFIXES", "").split(",") if p.strip()]
+
+REFILL_LAG = metrics.Histogram("story_pool_refill_lag_seconds", "Time from a pooled story being served to its refill",
+                               buckets=metrics.DURATION_BUCKETS + (120.0, 300.0, 600.0))
+REFILLS = metrics.Counter("story_pool_refills_total", "Pool refill attempts by outcome", ("outcome",))
+
+def prefix_key(prefix):
+    return " ".join(prefix.split()) if prefix else ""
+
+class PooledStory:
+    __slots__ = ("tokens", "ended", "created", "digest")
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.ended = bool(tokens) and tokens[-1] == "<EOT>"
+        self.created = time.monotonic()
+        self.digest = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=8).digest()
+
+    def covers(self, needed):
+        """Usable for a request that needs `needed` new tokens"""
+        return self.ended or len(self.tokens) >= needed
+
+class StoryPool:
+    """Bounded per-prefix story pools with popularity tracking and an idle-time refill thread
+
+    Args:
+        generate: generate(prefix, rng, should_stop) -> list of new tokens, or None if stopped
+        idle: callable, True when no request is running or queued
+    """
+
+    def __init__(self, generate, idle, size=POOL_SIZE, max_prefixes=POOL_PREFIXES, min_requests=POOL_MIN_REQUESTS,
+                 window=POOL_WINDOW, ttl=POOL_TTL, pinned=PINNED, seed=None):
+        self.generate = generate
+        self.idle = idle
+        self.size = size
+        self.max_prefixes = max_prefixes
+        self.min_requests = min_requests
+        self.ttl = ttl
+        self.pinned = [prefix_key(p) for p in pinned]
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=window)
+        self.popularity = Counter()
+        self.stories = {}      # prefix key → deque of PooledStory
+        self.served = {}       # prefix key → deque of monotonic times stories were taken (refill lag)
+        self.seen = set()      # digests currently pooled, so a prefix's pool holds no duplicates
+        self.thread = None
+        self.stop_event = threading.Event()
+        metrics.Gauge("story_pool_stories", "Pre-generated stories ready to serve",
+                      fn=lambda: sum(len(q) for q in self.stories.values()))
+
+    def record(self, prefix):
+        """Note one new-story request for popularity ranking"""
+        key = prefix_key(prefix)
+        with self.lock:
+            if len(self.recent) == self.recent.maxlen:
+                old = self.recent[0]
+                self.popularity[old] -= 1
+                if not self.popularity[old]:
+                    del self.popularity[old]
+            self.recent.append(key)
+            self.popularity[key] += 1
+
+    def popular(self):
+        """Prefix keys to keep warm, most requested first"""
+        with self.lock:
+            ranked = [k for k, n in self.popularity.most_common(self.max_prefixes) if n >= self.min_requests]
+        return list(dict.fromkeys(self.pinned + ranked))[:max(self.max_prefixes, len(self.pinned))]
+
+    def take(self, prefix, needed):
+        """Pop a fresh story for `prefix` with at least `needed` new tokens (or a complete one)
+
+        Returns:
+            list of new tokens, or None on a miss
+        """
+        key = prefix_key(prefix)
+        now = time.monotonic()
+        with self.lock:
+            queue = self.stories.get(key)
+            while queue and now - queue[0].created > self.ttl:
+                self.seen.discard(queue.popleft().digest)
+            story = next((s for s in queue if s.covers(needed)), None) if queue else None
+            if story is not None:
+                queue.remove(story)
+                self.seen.discard(story.digest)
+                self.served.setdefault(key, deque()).append(now)
+        metrics.CACHE_REQUESTS.inc("story_pool", "hit" if story is not None else "miss")
+        if story is None:
+            return None
+        return story.tokens[:needed]
+
+    def _next_prefix(self, keys):
+        """Popular prefix with the emptiest pool, or None if all are full"""
+        with self.lock:
+            for key in list(self.stories):
+                if key not in keys:
+                    for story in self.stories.pop(key):
+                        self.seen.discard(story.digest)
+                    self.served.pop(key, None)
+            now = time.monotonic()
+            for key, queue in self.stories.items():
+                while queue and now - queue[0].created > self.ttl:
+                    self.seen.discard(queue.popleft().digest)
+            counts = {k: len(self.stories.get(k, ())) for k in keys}
+        if not counts:
+            return None
+        key = min(counts, key=counts.get)
+        return key if counts[key] < self.size else None
+
+    def refill_once(self):
+        """Generate one story for the neediest popular prefix; returns False when nothing to do"""
+        key = self._next_prefix(self.popular())
+        if key is None:
+            return False
+        tokens = self.generate(key, self.rng, lambda: self.stop_event.is_set() or not self.idle())
+        if tokens is None:
+            REFILLS.inc("interrupted")
+            return True
+        story = PooledStory(tokens)
+        with self.lock:
+            if story.digest in self.seen:
+                REFILLS.inc("duplicate")
+                return True
+            self.stories.setdefault(key, deque()).append(story)
+            self.seen.add(story.digest)
+            served = self.served.get(key)
+            if served:
+                REFILL_LAG.observe(time.monotonic() - served.popleft())
+        REFILLS.inc("added")
+        return True
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if not self.idle():
+                self.stop_event.wait(0.05)
+            elif not self.refill_once():
+                self.stop_event.wait(0.5)
+
+    def start(self):
+        if self.size <= 0 or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, daemon=True, name="story-pool")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def clear(self):
+        """Drop all pooled stories (e.g. after the model changes)"""
+        with self.lock:
+            self.stories.clear()
+            self.served.clear()
+            self.seen.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "prefixes": {k: len(q) for k, q in self.stories.items()},
+                "popular": [k for k, _ in self.popularity.most_common(self.max_prefixes)],
+                "hits": metrics.CACHE_REQUESTS.get("story_pool", "hit"),
+                "misses": metrics.CACHE_REQUESTS.get("story_pool", "miss"),
+            }
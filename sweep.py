@@ -0,0 +1,244 @@
+"""Hyperparameter sweep: tokenizer vocab size, n-gram order, smoothing and pruning
+
+Trials run in a process pool on top of the pipeline's artifact store: the
+corpus stages (preprocess, dedup) are built once, the tokenizer once per vocab
+size, and each trial's model is itself a content-addressed artifact
+(.artifacts/sweep/<key>/), so trials sharing upstream settings share their
+intermediate files and a re-run only builds what changed.
+
+  vocab_size  BPE vocabulary (tokenizer.VOCAB_SIZE)
+  order       1, 2 or 3: n-gram counts kept and interpolated (3 = the served trigram model)
+  smoothing   "tuned": lambdas by train_model.tune_lambdas (as training does);
+              "grid": the lambdas minimizing dev perplexity on a GRID_STEP simplex grid
+              (or the tuned ones, if no grid point beats them)
+  prune       drop bigrams and trigrams seen fewer than this many times (0 = keep all)
+
+Every trial reports dev perplexity per token and per word (comparable across
+vocab sizes, since the number of words doesn't depend on the tokenizer), model
+file size, serving load time (generator.load_state) and generation tokens/sec.
+Timings run one trial at a time, each in a fresh process, so trials don't
+compete for CPU. Rows on the quality/speed frontier (no other row has both
+lower word perplexity and higher tokens/sec) are starred.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import model
+import ngram_counts
+import pipeline
+import tokenizer
+import train_model
+from corpus_format import TokenCorpus
+from scoring import Scorer
+
+GRID_STEP = 0.05
+TIMING_TOKENS = 3000  # tokens generated per trial to measure tokens/sec
+RESULTS = Path("sweep_results.json")
+
+def prune_counts(counts, threshold):
+    """n-gram counts seen at least `threshold` times"""
+    if threshold <= 1:
+        return counts
+    return defaultdict(int, {k: n for k, n in counts.items() if n >= threshold})
+
+def dev_arrays(dev_lines, corpus_vocab, scorer):
+    """Dev lines as (scorer token IDs back to back, line lengths, number of words)"""
+    table = np.array([scorer.ids.get(t, scorer.unk) for t in corpus_vocab], dtype=np.int64)
+    flat = np.fromiter(itertools.chain.from_iterable(dev_lines), dtype=np.int64)
+    lengths = np.array([len(line) for line in dev_lines], dtype=np.int64)
+    # A word is a piece with the word-start marker, or a special token; without markers every token
+    ws = scorer.word_start
+    starts = np.array([not ws or t.startswith(ws) or t.startswith("<") for t in corpus_vocab])
+    return table[flat], lengths, int(starts[flat].sum())
+
+def grid_lambdas(scorer, w, lengths, order):
+    """Interpolation weights (a GRID_STEP simplex grid) with the lowest dev log-loss
+
+    The scorer's current weights are the first candidate, so the result never does worse on
+    this dev data than the lambdas it starts from.
+    """
+    steps = round(1 / GRID_STEP)
+    best = {'lambda3': scorer.l3, 'lambda2': scorer.l2, 'lambda1': scorer.l1}
+    best_logp = scorer.log_probs(w, lengths).sum()
+    for i3 in range(steps + 1 if order >= 3 else 1):
+        for i2 in range(steps + 1 - i3 if order >= 2 else 1):
+            l3, l2 = i3 * GRID_STEP, i2 * GRID_STEP
+            l1 = 1.0 - l3 - l2
+            if l1 < GRID_STEP / 2:  # keep unigrams in the mix so nothing gets zero probability
+                continue
+            scorer.l3, scorer.l2, scorer.l1 = l3, l2, l1
+            logp = scorer.log_probs(w, lengths).sum()
+            if logp > best_logp:
+                best, best_logp = {'lambda3': l3, 'lambda2': l2, 'lambda1': l1}, logp
+    return best
+
+def _train_trial(inputs, params, out, options):
+    corpus = TokenCorpus(inputs["tokens"])
+    dev_lines, _ = train_model.split_corpus(corpus, params["dev_fraction"])
+    uni, bi, tri = ngram_counts.count_corpus(corpus, len(dev_lines)).to_dicts()
+    order, prune = params["order"], params["prune"]
+    bi = prune_counts(bi, prune) if order >= 2 else defaultdict(int)
+    tri = prune_counts(tri, prune) if order >= 3 else defaultdict(int)
+    lambdas = train_model.tune_lambdas(dev_lines, uni, bi, tri)  # also the grid search's starting point
+    uni, bi, tri = train_model.to_strings(corpus.vocab, uni, bi, tri)
+
+    _, special, word_start = tokenizer.load_merges(Path(inputs["tokens"]).with_name("bpe_merges.json"))
+    scorer = Scorer(uni, bi, tri, lambdas, special=special, word_start=word_start)
+    w, lengths, words = dev_arrays(dev_lines, corpus.vocab, scorer)
+    if params["smoothing"] == "grid":
+        lambdas = grid_lambdas(scorer, w, lengths, order)
+        scorer.l3, scorer.l2, scorer.l1 = lambdas['lambda3'], lambdas['lambda2'], lambdas['lambda1']
+    logp = float(scorer.log_probs(w, lengths).sum())
+
+    model.save_model(uni, bi, tri, lambdas, set(uni), path=out / "trigram_model.pkl")
+    (out / "eval.json").write_text(json.dumps({
+        "lambdas": lambdas, "dev_tokens": len(w), "dev_words": words,
+        "perplexity": float(np.exp(-logp / max(1, len(w)))), "word_perplexity": float(np.exp(-logp / max(1, words))),
+        "bigrams": len(bi), "trigrams": len(tri)}, indent=2), encoding="utf-8")
+
+TRIAL = pipeline.Stage("sweep", _train_trial, ["trigram_model.pkl", "eval.json"],
+                       [train_model, ngram_counts, model, sys.modules[__name__]])
+
+def upstream(config, store):
+    """Build (or reuse) the corpus stages before tokenizing; returns the corpus file to tokenize"""
+    cache, previous = {}, None
+    for name, inputs, params, chained in pipeline.plan(config):
+        if name in ("tokenize", "train"):
+            break
+        inputs = {k: (v if v is not None else previous) for k, v in inputs.items()}
+        artifact, hit = pipeline.run_stage(pipeline.STAGES[name], inputs, params, store, cache)
+        print(f"[{'=' if hit else '✓'}] {name:<10} {'cached' if hit else 'built '} {artifact}")
+        previous = artifact / chained
+    return previous
+
+def _quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+def _tokenize(corpus, params, store):
+    artifact, hit = _quiet(pipeline.run_stage, pipeline.STAGES["tokenize"], {"corpus": corpus}, params, store, {})
+    return params["vocab_size"], artifact, hit
+
+def _trial(tokens, params, store):
+    artifact, hit = _quiet(pipeline.run_stage, TRIAL, {"tokens": tokens}, params, store, {})
+    return params, artifact, hit
+
+def _timing(artifact, merges_path, tokens):
+    """Serving load time, estimated serving memory and dict-loop generation speed of one trial's model"""
+    import generator
+    t0 = time.perf_counter()
+    state, nbytes = _quiet(generator.load_state, artifact / "trigram_model.pkl", merges_path)
+    load_seconds = time.perf_counter() - t0
+    rng, produced = random.Random(0), 0
+    t0 = time.perf_counter()
+    while produced < tokens:
+        produced += sum(1 for _ in generator.generate_tokens([], tokens - produced, rng, metered=False, state=state))
+    return load_seconds, nbytes, produced / (time.perf_counter() - t0)
+
+def frontier(rows):
+    """Mark rows no other row beats on both word perplexity and tokens/sec"""
+    for r in rows:
+        r["frontier"] = not any(o is not r and o["word_perplexity"] <= r["word_perplexity"] and
+                                o["tokens_per_second"] >= r["tokens_per_second"] and
+                                (o["word_perplexity"], o["tokens_per_second"]) !=
+                                (r["word_perplexity"], r["tokens_per_second"]) for o in rows)
+    return rows
+
+def sweep(grid, config, store=pipeline.STORE, workers=None, timing_tokens=TIMING_TOKENS):
+    """Run every combination of `grid` (vocab_size, order, smoothing, prune lists)
+
+    Returns:
+        list of result dicts, one per trial, in grid order
+    """
+    store = Path(store)
+    store.mkdir(parents=True, exist_ok=True)
+    corpus = upstream(config, store)
+    workers = workers or os.cpu_count()
+
+    with ProcessPoolExecutor(workers) as pool:
+        tokenized = {}
+        jobs = [pool.submit(_tokenize, corpus, {"vocab_size": v, "special": config["special"],
+                                                "word_start": config["word_start"]}, store)
+                for v in grid["vocab_size"]]
+        for job in jobs:
+            vocab_size, artifact, hit = job.result()
+            tokenized[vocab_size] = artifact
+            print(f"[{'=' if hit else '✓'}] tokenize   vocab {vocab_size:<5} {'cached' if hit else 'built '} {artifact}")
+
+        trials = [{"vocab_size": v, "order": o, "smoothing": s, "prune": p, "dev_fraction": config["dev_fraction"]}
+                  for v, o, s, p in itertools.product(grid["vocab_size"], grid["order"], grid["smoothing"],
+                                                      grid["prune"])]
+        jobs = [pool.submit(_trial, tokenized[t["vocab_size"]] / "tokenized_corpus.bin", t, store) for t in trials]
+        built = []
+        for job in jobs:
+            params, artifact, hit = job.result()
+            built.append((params, artifact))
+            print(f"[{'=' if hit else '✓'}] trial      {_label(params)} {'cached' if hit else 'built '} {artifact}")
+
+    rows = []
+    ctx = multiprocessing.get_context()
+    for params, artifact in built:
+        merges_path = tokenized[params["vocab_size"]] / "bpe_merges.json"
+        with ProcessPoolExecutor(1, mp_context=ctx) as timer:  # a fresh process: cold load, no contention
+            load_seconds, nbytes, tps = timer.submit(_timing, artifact, merges_path, timing_tokens).result()
+        evaluation = json.loads((artifact / "eval.json").read_text(encoding="utf-8"))
+        rows.append({**{k: v for k, v in params.items() if k != "dev_fraction"}, **evaluation,
+                     "model_bytes": (artifact / "trigram_model.pkl").stat().st_size,
+                     "serving_bytes": nbytes, "load_seconds": load_seconds, "tokens_per_second": tps,
+                     "artifact": str(artifact)})
+    return frontier(rows)
+
+def _label(params):
+    return f"vocab {params['vocab_size']:<5} order {params['order']} {params['smoothing']:<5} prune {params['prune']:<3}"
+
+def print_table(rows):
+    print(f"\n  {'vocab':>5} {'order':>5} {'smooth':>6} {'prune':>5} {'ppl/tok':>8} {'ppl/word':>9} "
+          f"{'model MB':>8} {'serve MB':>8} {'load s':>7} {'tok/s':>7}")
+    for r in rows:
+        print(f"{'*' if r['frontier'] else ' '} {r['vocab_size']:>5} {r['order']:>5} {r['smoothing']:>6} "
+              f"{r['prune']:>5} {r['perplexity']:>8.2f} {r['word_perplexity']:>9.1f} "
+              f"{r['model_bytes'] / 2**20:>8.2f} {r['serving_bytes'] / 2**20:>8.1f} {r['load_seconds']:>7.2f} "
+              f"{r['tokens_per_second']:>7.0f}")
+    print("* quality/speed frontier (word perplexity vs tokens/sec)")
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Sweep vocab size, n-gram order, smoothing and pruning")
+    parser.add_argument("--vocab-sizes", type=int, nargs="+", default=[150, tokenizer.VOCAB_SIZE, 500])
+    parser.add_argument("--orders", type=int, nargs="+", default=[2, 3], choices=[1, 2, 3])
+    parser.add_argument("--smoothing", nargs="+", default=["tuned", "grid"], choices=["tuned", "grid"])
+    parser.add_argument("--prune", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--config", help="JSON file overriding pipeline.default_config() keys")
+    parser.add_argument("--dev-fraction", type=float)
+    parser.add_argument("--workers", type=int, help="Trial processes (default: CPU count)")
+    parser.add_argument("--timing-tokens", type=int, default=TIMING_TOKENS)
+    parser.add_argument("--store", default=str(pipeline.STORE))
+    parser.add_argument("--output", default=str(RESULTS))
+    args = parser.parse_args()
+
+    config = pipeline.default_config()
+    if args.config:
+        config.update(json.loads(Path(args.config).read_text(encoding="utf-8")))
+    if args.dev_fraction is not None:
+        config["dev_fraction"] = args.dev_fraction
+    grid = {"vocab_size": args.vocab_sizes, "order": args.orders, "smoothing": args.smoothing, "prune": args.prune}
+
+    start = time.perf_counter()
+    rows = sweep(grid, config, store=args.store, workers=args.workers, timing_tokens=args.timing_tokens)
+    print_table(rows)
+    Path(args.output).write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n[✓] {len(rows)} trials in {time.perf_counter() - start:.1f}s → {args.output}")
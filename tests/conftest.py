@@ -0,0 +1,6 @@
+"""The modules live at the repository root (flat layout); make them importable from tests/"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
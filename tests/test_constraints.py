@@ -0,0 +1,52 @@
+"""Constrained decoding through generator.generate_tokens on a small hand-built model"""
+
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+import generator
+from constraints import Constraints, Decoder
+from scoring import Scorer
+
+LINES = [
+    "▁ایک ▁دن ▁ایک ▁لڑکا ▁اسکول ▁گیا <EOS> ▁وہ ▁خوش ▁تھا <EOS> <EOP> <EOT>",
+    "▁بادشاہ ▁نے ▁کہا <EOS> ▁ایک ▁دن ▁وزیر ▁آیا <EOS> <EOT>",
+    "▁ایک ▁لڑکا ▁اور ▁ایک ▁لڑکی ▁اسکول ▁گئے <EOS> <EOP> <EOT>",
+]
+
+@pytest.fixture(scope="module")
+def state():
+    uni, bi, tri = Counter(), defaultdict(int), defaultdict(int)
+    for line in LINES:
+        t = line.split()
+        uni.update(t)
+        for i in range(1, len(t)):
+            bi[(t[i - 1], t[i])] += 1
+        for i in range(2, len(t)):
+            tri[(t[i - 2], t[i - 1], t[i])] += 1
+    lambdas = {"lambda3": 0.6, "lambda2": 0.3, "lambda1": 0.1}
+    return {'uni_count': uni, 'bi_count': bi, 'tri_count': tri, 'lambdas': lambdas,
+            'total_uni': sum(uni.values()), 'scorer': Scorer(uni, bi, tri, lambdas, word_start="▁")}
+
+def generate(state, constraints, max_length=500, seed=0):
+    decoder = Decoder(constraints, state['scorer'])
+    return list(generator.generate_tokens([], max_length, random.Random(seed), metered=False, state=state,
+                                          decoder=decoder))
+
+@pytest.mark.parametrize("max_tokens", [1, 2, 3, 10])
+def test_max_tokens_alone_ends_with_eot_within_budget(state, max_tokens):
+    for seed in range(50):
+        story = generate(state, Constraints(max_tokens=max_tokens), seed=seed)
+        assert story[-1] == "<EOT>" and len(story) <= max_tokens
+
+def test_max_tokens_with_endings_forces_an_ending_first(state):
+    for seed in range(50):
+        story = generate(state, Constraints(endings=["<EOP>"], min_tokens=3, max_tokens=10), seed=seed)
+        assert story[-2:] == ["<EOP>", "<EOT>"] and 3 < len(story) <= 10
+
+def test_banned_tokens_and_words_never_appear(state):
+    for seed in range(50):
+        story = generate(state, Constraints(banned_tokens=["▁اسکول"], banned_words=["لڑکا"], max_tokens=30),
+                         seed=seed)
+        assert "▁اسکول" not in story and "▁لڑکا" not in story
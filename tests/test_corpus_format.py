@@ -0,0 +1,57 @@
+"""Binary token-ID corpus: round trip against the text format, both ID widths"""
+
+import numpy as np
+import pytest
+
+import tokenizer
+from corpus_format import TokenCorpus, write_token_corpus
+
+CORPUS = [
+    "ایک دن ایک لڑکا  وہ اسکول گیا  ",
+    "بادشاہ نے کہا  ",
+    "ایک لڑکا اور ایک لڑکی اسکول گئے  ",
+]
+
+def read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.split() for line in f if line.strip()]
+
+def assert_matches_text(corpus, text_lines, vocab):
+    assert corpus.vocab == list(vocab)
+    assert len(corpus) == len(text_lines)
+    assert corpus.offsets.tolist() == np.cumsum([0] + [len(t) for t in text_lines]).tolist()
+    index = {tok: i for i, tok in enumerate(vocab)}
+    for i, tokens in enumerate(text_lines):
+        assert corpus.line(i).tolist() == [index[t] for t in tokens]
+        assert corpus.decode(corpus.line(i)) == tokens
+
+def test_tokenizer_output_round_trips_uint16(tmp_path):
+    src = tmp_path / "corpus.txt"
+    src.write_text("\n".join(CORPUS) + "\n", encoding="utf-8")
+    text_out, bin_out = tmp_path / "tokenized_corpus.txt", tmp_path / "tokenized_corpus.bin"
+    _, vocab = tokenizer.tokenize(src, vocab_size=40, text_out=text_out, bin_out=bin_out,
+                                  merges_out=tmp_path / "bpe_merges.json")
+
+    corpus = TokenCorpus(bin_out)
+    assert corpus.ids.dtype == np.dtype("<u2")
+    assert_matches_text(corpus, read_text(text_out), vocab)
+
+def test_wide_vocabulary_round_trips_uint32(tmp_path):
+    vocab = [f"t{i}" for i in range(0x10000 + 10)]   # one more ID than uint16 holds
+    rng = np.random.default_rng(0)
+    token_lines = [[vocab[i] for i in rng.integers(0, len(vocab), n)] for n in (5, 1, 12, 3)]
+    token_lines[0][0] = vocab[-1]
+    text_out, bin_out = tmp_path / "tokenized_corpus.txt", tmp_path / "tokenized_corpus.bin"
+    text_out.write_text("".join(" ".join(t) + "\n" for t in token_lines), encoding="utf-8")
+    write_token_corpus(bin_out, token_lines, vocab)
+
+    corpus = TokenCorpus(bin_out)
+    assert corpus.ids.dtype == np.dtype("<u4")
+    assert int(corpus.ids.max()) == len(vocab) - 1
+    assert_matches_text(corpus, read_text(text_out), vocab)
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not_a_corpus.bin"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        TokenCorpus(path)
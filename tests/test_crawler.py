@@ -0,0 +1,144 @@
+"""Crawler against a local stand-in for the story site serving fixture pages"""
+
+import asyncio
+import csv
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import crawler
+
+FIXTURES = Path(__file__).parent / "fixtures" / "crawler"
+CATEGORY = "/kids/category/moral-stories.html"
+STORY = "/kids/detail/moral-stories/"
+FLAKY = STORY + "mehnat-1004.html"      # answers 503 once, then the page
+MISSING = STORY + "missing-1003.html"   # no fixture: 404
+
+EXPECTED = {
+    "sachai-ka-inaam-1001.html": ("سچائی کا انعام", "ایک دن ایک لڑکا جنگل میں گیا۔\nاس نے ہمیشہ سچ بولا۔"),
+    "lalchi-kutta-1002.html": ("لالچی کتا", "ایک کتے کو ہڈی ملی۔\nلالچ بری بلا ہے۔"),
+    "mehnat-1004.html": ("محنت", "محنت کامیابی کی کنجی ہے۔"),
+}
+
+class StorySite(ThreadingHTTPServer):
+    """Serves the fixture pages on localhost, counting requests per path"""
+
+    def __init__(self, failures):
+        self.hits = Counter()
+        self.failures = dict(failures)   # path → 503s to answer before the page
+        self.pages = {}                  # fixture name → replacement page (an edited story)
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        site = self.server
+        with site.lock:
+            site.hits[self.path] += 1
+            fail = site.failures.get(self.path, 0) > 0
+            if fail:
+                site.failures[self.path] -= 1
+        if fail:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        name = "category.html" if self.path == CATEGORY else \
+            self.path[len(STORY):] if self.path.startswith(STORY) else ""
+        page = FIXTURES / name
+        if not name or not page.is_file():
+            self.send_error(404)
+            return
+        body = site.pages.get(name) or page.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def site():
+    server = StorySite({FLAKY: 1})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def fetch(site, path):
+    async def run():
+        async with crawler.Fetcher(rate=0, retries=3, backoff=0) as fetcher:
+            return await fetcher.get(site.base_url + path)
+    return asyncio.run(run())
+
+def test_selectors_extract_links_and_story_rows():
+    links = crawler.extract_story_links((FIXTURES / "category.html").read_text(encoding="utf-8"), "http://site")
+    assert links == [f"http://site{STORY}{name}" for name in
+                     ("sachai-ka-inaam-1001.html", "lalchi-kutta-1002.html", "missing-1003.html", "mehnat-1004.html")]
+    for name, row in EXPECTED.items():
+        assert crawler.extract_story_data((FIXTURES / name).read_text(encoding="utf-8")) == row
+
+def test_retries_503(site):
+    html = fetch(site, FLAKY)
+    assert crawler.extract_story_data(html) == EXPECTED["mehnat-1004.html"]
+    assert site.hits[FLAKY] == 2
+
+def test_skips_404_without_retrying(site):
+    assert fetch(site, MISSING) is None
+    assert site.hits[MISSING] == 1
+
+def crawl(site, out, **kwargs):
+    return asyncio.run(crawler.crawl("moral", max_pages=1, output_file=out, rate=0, base_url=site.base_url,
+                                     **kwargs))
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["title", "content", "url"]
+    return {url: (title, content) for title, content, url in rows[1:]}, len(rows) - 1
+
+def expected_rows(site, **changed):
+    rows = {site.base_url + STORY + name: row for name, row in EXPECTED.items()}
+    rows.update({site.base_url + STORY + name: row for name, row in changed.items()})
+    return rows
+
+def test_crawl_writes_rows_and_skips_missing_story(site, tmp_path):
+    out = tmp_path / "stories.csv"
+    assert crawl(site, out) == (3, 1)
+    assert read_rows(out) == (expected_rows(site), 3)
+    assert site.hits[FLAKY] == 2 and site.hits[MISSING] == 1
+
+def test_revalidate_replaces_changed_row(site, tmp_path):
+    out = tmp_path / "stories.csv"
+    crawl(site, out)
+    name = "lalchi-kutta-1002.html"
+    site.pages[name] = (FIXTURES / name).read_bytes().replace("ہڈی".encode(), "روٹی".encode())
+    assert crawl(site, out, revalidate=True)[0] == 1
+    changed = ("لالچی کتا", "ایک کتے کو روٹی ملی۔\nلالچ بری بلا ہے۔")
+    assert read_rows(out) == (expected_rows(site, **{name: changed}), 3)
+
+def test_resume_without_state_file_adds_no_duplicates(site, tmp_path):
+    out = tmp_path / "stories.csv"
+    crawl(site, out)
+    out.with_suffix(".crawl.sqlite").unlink()
+    assert crawl(site, out)[0] == 0
+    assert read_rows(out) == (expected_rows(site), 3)
+
+def test_csv_without_url_column_is_upgraded_not_duplicated(site, tmp_path):
+    out = tmp_path / "stories.csv"
+    with open(out, "w", newline="", encoding="utf-8-sig") as f:
+        csv.writer(f).writerows([["title", "content"], *EXPECTED.values(), ["پرانی کہانی", "ایک پرانی کہانی۔"]])
+    assert crawl(site, out)[0] == 0
+    rows, n = read_rows(out)
+    assert n == 4 and rows.pop("") == ("پرانی کہانی", "ایک پرانی کہانی۔")
+    assert rows == expected_rows(site)
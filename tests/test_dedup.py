@@ -0,0 +1,30 @@
+"""Near-duplicate removal writes a separate corpus unless asked to rewrite its input"""
+
+import pytest
+
+import dedup
+
+STORY = "ایک دن ایک لڑکا اسکول گیا اور اس نے اپنے دوست سے کہا کہ آج ہم کھیلیں گے"
+CORPUS = [STORY, STORY + " پھر", "بادشاہ نے اپنے وزیر کو بلایا اور کہا کہ شہر میں اعلان کرو"]
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "corpus.txt"
+    path.write_text("\n".join(CORPUS) + "\n", encoding="utf-8")
+    return path
+
+def test_writes_separate_output(corpus, tmp_path):
+    out = tmp_path / "corpus.dedup.txt"
+    report = dedup.dedup(corpus, out, tmp_path / "report.json")
+    assert corpus.read_text(encoding="utf-8").splitlines() == CORPUS
+    assert out.read_text(encoding="utf-8").splitlines() == CORPUS[1:]
+    assert report["dropped"] == 1
+
+def test_refuses_to_overwrite_input_implicitly(corpus, tmp_path):
+    with pytest.raises(ValueError):
+        dedup.dedup(corpus, corpus, tmp_path / "report.json")
+    assert corpus.read_text(encoding="utf-8").splitlines() == CORPUS
+
+def test_in_place_rewrites_input(corpus, tmp_path):
+    dedup.dedup(corpus, report_file=tmp_path / "report.json", in_place=True)
+    assert corpus.read_text(encoding="utf-8").splitlines() == CORPUS[1:]
@@ -0,0 +1,44 @@
+"""Vectorized n-gram counts agree exactly with the per-token loop"""
+
+import numpy as np
+import pytest
+
+import ngram_counts
+from corpus_format import TokenCorpus, write_token_corpus
+
+# 7: bincount at every order; 300: sort + unique for trigrams; 2000: trigram keys need int64
+VOCAB_SIZES = [7, 300, 2000]
+
+def make_lines(vocab_size, seed=0):
+    """Lines of 1 and 2 tokens (shorter than a trigram) among longer ones, with repeats across lines"""
+    rng = np.random.default_rng(seed)
+    lengths = [1, 2, 1, 5, 40, 2, 3, 17, 1, 60, 2, 8] * 3
+    return [rng.integers(0, vocab_size, n).astype(np.int64) for n in lengths]
+
+def assert_exact(counts, lines):
+    got, want = counts.to_dicts(), ngram_counts.loop_counts(lines)
+    for n, (g, w) in enumerate(zip(got, want), 1):
+        assert g == w, f"{n}-gram counts differ"
+
+@pytest.mark.parametrize("vocab_size", VOCAB_SIZES)
+@pytest.mark.parametrize("chunk_tokens", [1, 4, 30, 1 << 20])   # 1 and 4: chunks split between short lines
+def test_count_lines(vocab_size, chunk_tokens):
+    lines = make_lines(vocab_size)
+    assert_exact(ngram_counts.count_lines(lines, vocab_size, chunk_tokens=chunk_tokens), lines)
+
+@pytest.fixture(params=VOCAB_SIZES)
+def corpus(request, tmp_path):
+    vocab = [f"t{i}" for i in range(request.param)]
+    lines = make_lines(request.param, seed=1)
+    write_token_corpus(tmp_path / "corpus.bin", ([vocab[i] for i in line] for line in lines), vocab)
+    return TokenCorpus(tmp_path / "corpus.bin"), lines
+
+@pytest.mark.parametrize("start, stop", [(0, None), (0, 1), (3, 4), (5, 20), (13, None)])
+@pytest.mark.parametrize("chunk_tokens", [1, 10, 1 << 20])   # 10: smaller than the 17, 40 and 60-token lines
+def test_count_corpus_range(corpus, start, stop, chunk_tokens):
+    corpus, lines = corpus
+    counts = ngram_counts.count_corpus(corpus, start, stop, chunk_tokens=chunk_tokens)
+    assert_exact(counts, lines[start:stop])
+
+def test_key_dtype_widens_for_large_vocabularies():
+    assert ngram_counts.key_dtype(1625) is np.uint32 and ngram_counts.key_dtype(1626) is np.int64
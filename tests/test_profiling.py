@@ -0,0 +1,51 @@
+"""Per-request profiling: anonymous clients get timers only; sampling and dumps need the admin token"""
+
+import os
+import time
+
+import pytest
+
+import profiling
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    return "secret"
+
+def run(profile, directory):
+    profile.start_sampling()
+    profile.lap()
+    time.sleep(0.02)
+    profile.lap("generate")
+    return profile.finish(directory)
+
+def test_anonymous_sample_is_downgraded_and_not_written(admin_token, tmp_path):
+    profile = profiling.start("test", "sample", admin=profiling.authorized(None))
+    summary = run(profile, tmp_path)
+    assert not profile.sample and profile._sampler is None
+    assert "generate" in summary["phases"] and "file" not in summary
+    assert list(tmp_path.iterdir()) == []
+
+def test_admin_may_sample_and_dump(admin_token, tmp_path):
+    profile = profiling.start("test", "sample", admin=profiling.authorized(admin_token))
+    summary = run(profile, tmp_path)
+    assert profile.sample and summary["samples"] > 0
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".folded", ".json"]
+
+def test_authorized_needs_a_configured_matching_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert not profiling.authorized("") and not profiling.authorized("anything")
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert profiling.authorized("secret") and not profiling.authorized("wrong") and not profiling.authorized(None)
+
+def test_global_mode_dumps_are_capped(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 3)
+    profiling.set_mode("timers")
+    try:
+        for i in range(5):
+            summary = profiling.start("test").finish(tmp_path)
+            os.utime(summary["file"][:-len(".folded")] + ".json", (i, i))   # distinct, increasing ages
+            profiling.prune(tmp_path)
+    finally:
+        profiling.set_mode("off")
+    assert len(list(tmp_path.glob("*.json"))) == 3 and len(list(tmp_path.glob("*.folded"))) == 3
@@ -0,0 +1,82 @@
+"""Quantized backoff tables: exact before quantization, close after, and tied to their model file"""
+
+import os
+import random
+import shutil
+from collections import Counter, defaultdict
+
+import numpy as np
+import pytest
+
+import quantize
+from scoring import Scorer
+
+UNI = {"▁ایک": 3, "▁دن": 2, "<EOS>": 2, "<EOT>": 1}
+BI = {("▁ایک", "▁دن"): 2, ("▁دن", "<EOS>"): 2, ("<EOS>", "▁ایک"): 1, ("<EOS>", "<EOT>"): 1}
+TRI = {("▁ایک", "▁دن", "<EOS>"): 2, ("▁دن", "<EOS>", "▁ایک"): 1, ("▁دن", "<EOS>", "<EOT>"): 1}
+LAMBDAS = {"lambda3": 0.6, "lambda2": 0.3, "lambda1": 0.1}
+
+@pytest.fixture(scope="module")
+def scorer():
+    """A model with enough distinct probabilities that 8 bits must round them"""
+    rng = random.Random(0)
+    vocab = [f"▁t{i}" for i in range(40)]
+    uni, bi, tri = Counter(), defaultdict(int), defaultdict(int)
+    for _ in range(200):
+        t = [rng.choice(vocab[:rng.randint(5, 40)]) for _ in range(rng.randint(1, 30))]
+        uni.update(t)
+        for i in range(1, len(t)):
+            bi[(t[i - 1], t[i])] += 1
+        for i in range(2, len(t)):
+            tri[(t[i - 2], t[i - 1], t[i])] += 1
+    return Scorer(uni, bi, tri, LAMBDAS)
+
+def contexts(scorer):
+    """Every (a, b) of token IDs, the unseen ID included"""
+    return [(a, b) for a in range(scorer.size) for b in range(scorer.size)]
+
+def test_quantize_is_exact_with_few_distinct_values():
+    values = np.log(np.array([0.5, 0.25, 0.5, 0.125, 0.25, 0.125]))
+    for bits in (8, 16):
+        codebook, codes = quantize.quantize(values, bits)
+        assert len(codebook) == 3 and codes.dtype == (np.uint8 if bits == 8 else np.uint16)
+        assert np.array_equal(codebook[codes], values.astype(np.float32))
+
+def test_backoff_form_matches_the_interpolated_model(scorer):
+    rng = np.random.default_rng(0)
+    lengths = np.array([1, 2, 3, 40, 17], dtype=np.int64)
+    w = rng.integers(0, scorer.size, lengths.sum())   # ID scorer.unk: an unseen token
+    np.testing.assert_allclose(quantize.export(scorer, None).log_probs(w, lengths), scorer.log_probs(w, lengths),
+                               rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize("bits, tolerance", [(8, 0.02), (16, 1e-6)])
+def test_quantized_weights_stay_close(scorer, bits, tolerance):
+    q = quantize.export(scorer, bits)
+    for a, b in contexts(scorer):
+        want = scorer.next_weights(a, b)
+        got = q.next_weights(a, b)
+        assert np.abs(got / got.sum() - want / want.sum()).max() < tolerance
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "trigram_model.pkl"
+    path.write_bytes(b"model bytes")
+    quantize.export(Scorer(UNI, BI, TRI, LAMBDAS), 8, tmp_path / quantize.QUANTIZED_TABLES, path)
+    return path
+
+def test_unchanged_model_is_accepted_without_hashing(model, monkeypatch):
+    monkeypatch.setattr(quantize, "file_sha256", lambda path: pytest.fail("hashed an unchanged model"))
+    tables = quantize.load_tables(model)
+    assert tables is not None and tables.model_stamp == quantize.file_stamp(model)
+
+def test_copied_model_is_checked_by_hash(model, tmp_path):
+    copy = tmp_path / "copy" / model.name
+    copy.parent.mkdir()
+    shutil.copy(model, copy)
+    shutil.copy(model.with_name(quantize.QUANTIZED_TABLES), copy.with_name(quantize.QUANTIZED_TABLES))
+    os.utime(copy, ns=(0, 0))
+    assert quantize.load_tables(copy) is not None
+
+def test_changed_model_is_rejected(model):
+    model.write_bytes(b"other model")
+    assert quantize.load_tables(model) is None
@@ -0,0 +1,114 @@
+"""Sharded serving against two local shard_server.py processes: same weights as the single-node scorer"""
+
+import random
+import socket
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+import pytest
+
+from scoring import Scorer
+from shard_router import ShardedModel, start_shards
+from shard_server import export
+
+LAMBDAS = {"lambda3": 0.6, "lambda2": 0.3, "lambda1": 0.1}
+
+def make_scorer():
+    rng = random.Random(0)
+    vocab = [f"▁t{i}" for i in range(30)] + ["<EOS>", "<EOT>"]
+    uni, bi, tri = Counter(), defaultdict(int), defaultdict(int)
+    for _ in range(100):
+        t = [rng.choice(vocab[:rng.randint(5, len(vocab))]) for _ in range(rng.randint(1, 25))] + ["<EOT>"]
+        uni.update(t)
+        for i in range(1, len(t)):
+            bi[(t[i - 1], t[i])] += 1
+        for i in range(2, len(t)):
+            tri[(t[i - 2], t[i - 1], t[i])] += 1
+    return Scorer(uni, bi, tri, LAMBDAS, word_start="▁")
+
+def free_port_pair():
+    """A port p with p and p + 1 both free (start_shards uses consecutive ports)"""
+    for _ in range(50):
+        with socket.socket() as a:
+            a.bind(("localhost", 0))
+            port = a.getsockname()[1]
+            try:
+                with socket.socket() as b:
+                    b.bind(("localhost", port + 1))
+                    return port
+            except OSError:
+                continue
+    pytest.skip("no two consecutive free ports")
+
+@pytest.fixture(scope="module")
+def shards(tmp_path_factory):
+    scorer = make_scorer()
+    model_dir = tmp_path_factory.mktemp("shards")
+    export(scorer, 2, model_dir)
+    procs, addresses = start_shards(model_dir, 2, free_port_pair())
+    try:
+        ShardedModel(addresses, model_dir).wait_ready(30)
+        yield scorer, addresses, model_dir
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+def contexts(scorer):
+    """Every (a, b) of token IDs, the unseen ID included"""
+    return [(a, b) for a in range(scorer.size) for b in range(scorer.size)]
+
+def assert_same_weights(model, scorer, a, b, rows):
+    np.testing.assert_allclose(model.next_weights(a, b, rows), scorer.next_weights(a, b), rtol=0, atol=1e-12)
+
+def test_weights_match_on_cache_misses_and_hits(shards):
+    scorer, addresses, model_dir = shards
+    model = ShardedModel(addresses, model_dir)
+    for expect_hits in (False, True):   # cold cache, then every context cached
+        before = model.hits, model.misses, model.rpcs
+        for a, b in contexts(scorer):
+            assert_same_weights(model, scorer, a, b, model.lookup([k for k in model.keys(a, b) if k is not None]))
+        hits, misses, rpcs = model.hits - before[0], model.misses - before[1], model.rpcs - before[2]
+        assert (misses == 0 and rpcs == 0 and hits > 0) if expect_hits else (misses > 0 and rpcs > 0)
+
+def test_weights_match_without_cache(shards):
+    scorer, addresses, model_dir = shards
+    model = ShardedModel(addresses, model_dir, cache_size=0)
+    for a, b in contexts(scorer)[::7]:
+        assert_same_weights(model, scorer, a, b, model.lookup([k for k in model.keys(a, b) if k is not None]))
+    assert model.hits == 0 and not model.cache
+
+def test_shared_fetches_return_each_caller_its_rows(shards):
+    scorer, addresses, model_dir = shards
+    model = ShardedModel(addresses, model_dir, cache_size=0)
+    errors = []
+
+    def run(pairs):
+        try:
+            for a, b in pairs:
+                keys = [k for k in model.keys(a, b) if k is not None]
+                assert_same_weights(model, scorer, a, b, model.fetch_shared(keys) if keys else {})
+        except Exception as e:
+            errors.append(e)
+
+    pairs = contexts(scorer)
+    threads = [threading.Thread(target=run, args=(pairs[i::8],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+def test_sample_and_prefix_tokens(shards):
+    scorer, addresses, model_dir = shards
+    model = ShardedModel(addresses, model_dir)
+    story = []
+    rng = random.Random(0)
+    for _ in range(200):
+        story.append(model.sample(story, rng))
+        if story[-1] == "<EOT>":
+            break
+    assert set(story) <= set(scorer.vocab)
+    assert model.tokens("▁t1 ▁t2") == ["▁t1", "▁t2"]   # no merges file: split on spaces
@@ -0,0 +1,85 @@
+"""HttpStoryClient against a local stand-in for app.py: per-call deadlines and SSE error codes"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from story_client import HttpStoryClient, StoryClientError
+
+def event(**data):
+    return f"data: {json.dumps(data)}\n\n".encode()
+
+CHUNK = event(chunk="ایک", isFinal=False, numTokens=1, sessionId="s", model="default")
+FINAL = event(chunk=" دن", isFinal=True, numTokens=2, sessionId="s", model="default")
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # prefix → SSE events; a float is a pause in seconds
+    STREAMS = {
+        "ok": [CHUNK, FINAL],
+        "slow": [CHUNK, 0.5, FINAL],
+        "deadline": [CHUNK, event(error="generation deadline exceeded", code="DEADLINE_EXCEEDED", isFinal=True)],
+        "internal": [event(error="generation failed", code="INTERNAL", isFinal=True)],
+        "legacy": [event(error="something", isFinal=True)],
+    }
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/predict":
+            time.sleep(float(body["context"] or 0))
+            payload = json.dumps({"predictions": [{"token": "▁دن", "probability": 1.0}], "contextOrder": 1}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for part in self.STREAMS[body["prefix"]]:
+            if isinstance(part, float):
+                time.sleep(part)
+            else:
+                self.wfile.write(part)
+                self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with HttpStoryClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=5) as c:
+        yield c
+    server.shutdown()
+    server.server_close()
+
+def error_code(call):
+    with pytest.raises(StoryClientError) as e:
+        call()
+    return e.value.code
+
+def test_stream_reads_deltas(client):
+    story = client.generate("ok", timeout=2)
+    assert story.result() == "ایک دن" and story.num_tokens == 2 and story.done
+
+def test_generate_timeout_is_a_deadline(client):
+    assert error_code(lambda: client.generate("slow", timeout=0.2).result()) == "DEADLINE_EXCEEDED"
+    assert client.generate("slow", timeout=2).result() == "ایک دن"
+    assert client.generate("slow").result() == "ایک دن"   # no deadline: each read within 5s
+
+@pytest.mark.parametrize("prefix, code", [("deadline", "DEADLINE_EXCEEDED"), ("internal", "INTERNAL"),
+                                          ("legacy", "UNKNOWN")])
+def test_stream_errors_keep_the_server_code(client, prefix, code):
+    assert error_code(lambda: client.generate(prefix).result()) == code
+
+def test_unary_timeout_is_a_deadline(client):
+    assert error_code(lambda: client.predict("0.5", timeout=0.2)) == "DEADLINE_EXCEEDED"
+    assert client.predict("0", timeout=2) == ([("▁دن", 1.0)], 1)
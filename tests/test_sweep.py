@@ -0,0 +1,144 @@
+"""Sweep pieces: pruning, grid lambdas, per-word perplexity and the quality/speed frontier"""
+
+import json
+import math
+import random
+from collections import Counter, defaultdict
+
+import numpy as np
+import pytest
+
+import sweep
+import tokenizer
+import train_model
+from ngram_counts import loop_counts
+from scoring import Scorer
+
+def test_prune_counts():
+    counts = defaultdict(int, {("a", "b"): 1, ("b", "c"): 2, ("c", "d"): 5})
+    assert sweep.prune_counts(counts, 0) is counts and sweep.prune_counts(counts, 1) is counts
+    pruned = sweep.prune_counts(counts, 2)
+    assert dict(pruned) == {("b", "c"): 2, ("c", "d"): 5} and pruned[("a", "b")] == 0
+    assert not sweep.prune_counts(counts, 6)
+    assert len(counts) == 3   # the input is left alone
+
+def make_model(rng):
+    """ID-keyed counts of training lines and held-out dev lines (half their tokens follow from the previous one)"""
+    vocab = [f"▁t{i}" for i in range(40)] + [f"t{i}" for i in range(10)] + ["<EOT>"]
+    V = len(vocab) - 1
+    lines = []
+    for _ in range(300):
+        line = [rng.randrange(V)]
+        for _ in range(rng.randint(0, 30)):
+            line.append((line[-1] * 7 + 3) % V if rng.random() < 0.5 else rng.randrange(V))
+        lines.append(line + [V])
+    dev, train = lines[:40], lines[40:]
+    return vocab, dev, loop_counts(np.array(line) for line in train)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_grid_lambdas_beat_or_tie_tuned(seed):
+    vocab, dev, (uni, bi, tri) = make_model(random.Random(seed))
+    tuned = train_model.tune_lambdas(dev, uni, bi, tri)
+    scorer = Scorer(*train_model.to_strings(vocab, uni, bi, tri), tuned, word_start="▁")
+    w, lengths, _ = sweep.dev_arrays(dev, vocab, scorer)
+    tuned_logp = scorer.log_probs(w, lengths).sum()
+
+    grid = sweep.grid_lambdas(scorer, w, lengths, 3)
+    scorer.l3, scorer.l2, scorer.l1 = grid['lambda3'], grid['lambda2'], grid['lambda1']
+    assert scorer.log_probs(w, lengths).sum() >= tuned_logp
+    assert math.isclose(sum(grid.values()), 1.0) and grid['lambda1'] > 0
+
+def test_grid_lambdas_keep_a_better_starting_point():
+    vocab, dev, (uni, bi, tri) = make_model(random.Random(0))
+    scorer = Scorer(*train_model.to_strings(vocab, uni, bi, tri), {'lambda3': 0, 'lambda2': 0, 'lambda1': 1},
+                    word_start="▁")
+    w, lengths, _ = sweep.dev_arrays(dev, vocab, scorer)
+    grid = sweep.grid_lambdas(scorer, w, lengths, 3)
+
+    # Off the grid, around the grid's best: weights that do better than any grid point
+    logps = {}
+    for i3 in range(-4, 5):
+        for i2 in range(-4, 5):
+            l3, l2 = grid['lambda3'] + i3 / 100, grid['lambda2'] + i2 / 100
+            if min(l3, l2, 1 - l3 - l2) > 0:
+                scorer.l3, scorer.l2, scorer.l1 = l3, l2, 1 - l3 - l2
+                logps[l3, l2] = scorer.log_probs(w, lengths).sum()
+    l3, l2 = max(logps, key=logps.get)
+    scorer.l3, scorer.l2, scorer.l1 = grid['lambda3'], grid['lambda2'], grid['lambda1']
+    assert logps[l3, l2] > scorer.log_probs(w, lengths).sum()
+
+    scorer.l3, scorer.l2, scorer.l1 = l3, l2, 1 - l3 - l2
+    assert sweep.grid_lambdas(scorer, w, lengths, 3) == {'lambda3': l3, 'lambda2': l2, 'lambda1': 1 - l3 - l2}
+
+@pytest.mark.parametrize("order", [1, 2])
+def test_grid_lambdas_respect_the_order(order):
+    vocab, dev, (uni, bi, tri) = make_model(random.Random(0))
+    lambdas = {'lambda3': 0.0, 'lambda2': 0.0, 'lambda1': 1.0}
+    scorer = Scorer(*train_model.to_strings(vocab, uni, bi, tri), lambdas, word_start="▁")
+    w, lengths, _ = sweep.dev_arrays(dev, vocab, scorer)
+    grid = sweep.grid_lambdas(scorer, w, lengths, order)
+    assert grid['lambda3'] == 0 and (order >= 2 or grid['lambda2'] == 0)
+
+def test_dev_arrays_map_ids_and_count_words():
+    uni = Counter({"▁a": 3, "b": 2, "▁c": 1, "<EOT>": 1})
+    scorer = Scorer(uni, defaultdict(int), defaultdict(int), {'lambda3': 0, 'lambda2': 0, 'lambda1': 1},
+                    word_start="▁")
+    corpus_vocab = ["<EOT>", "b", "▁a", "▁c", "▁unseen", "d"]   # corpus IDs, not the scorer's
+    dev = [[2, 1, 3], [4, 5, 0], [2]]
+    w, lengths, words = sweep.dev_arrays(dev, corpus_vocab, scorer)
+    ids = scorer.ids
+    assert w.tolist() == [ids["▁a"], ids["b"], ids["▁c"], scorer.unk, scorer.unk, ids["<EOT>"], ids["▁a"]]
+    assert lengths.tolist() == [3, 3, 1]
+    assert words == 5   # ▁a·b ▁c | ▁unseen·d <EOT> | ▁a
+
+    scorer.word_start = ""   # no markers: every token is a word
+    assert sweep.dev_arrays(dev, corpus_vocab, scorer)[2] == 7
+
+DEV_FRACTION = 0.2
+
+@pytest.fixture(scope="module")
+def tokenized(tmp_path_factory):
+    """The corpus's first lines, BPE-tokenized at two vocab sizes: (dev text lines, {vocab size: tokens dir})"""
+    lines = tokenizer.load_lines()[:60]
+    root = tmp_path_factory.mktemp("sweep")
+    text = root / "corpus.txt"
+    text.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    dirs = {}
+    for vocab_size in (100, 200):
+        d = dirs[vocab_size] = root / f"tok-{vocab_size}"
+        d.mkdir()
+        tokenizer.tokenize(text, vocab_size, text_out=d / "tokenized_corpus.txt",
+                           bin_out=d / "tokenized_corpus.bin", merges_out=d / "bpe_merges.json")
+    return lines[:int(len(lines) * DEV_FRACTION)], dirs
+
+def run_trial(tokens, out, smoothing, prune=0):
+    out.mkdir()
+    params = {"order": 3, "prune": prune, "smoothing": smoothing, "dev_fraction": DEV_FRACTION}
+    sweep._train_trial({"tokens": tokens / "tokenized_corpus.bin"}, params, out, {})
+    return json.loads((out / "eval.json").read_text(encoding="utf-8"))
+
+def test_word_perplexity_is_per_word_of_the_dev_text(tokenized, tmp_path):
+    dev_text, dirs = tokenized
+    dev_words = sum(len(line.split()) for line in dev_text)
+    for vocab_size, tokens in dirs.items():
+        ev = run_trial(tokens, tmp_path / str(vocab_size), "tuned")
+        assert ev["dev_words"] == dev_words   # the same text at any vocab size
+        assert ev["dev_tokens"] > dev_words
+        # Same total log-probability, spread over words instead of tokens
+        assert math.isclose(math.log(ev["word_perplexity"]) * ev["dev_words"],
+                            math.log(ev["perplexity"]) * ev["dev_tokens"], rel_tol=1e-9)
+
+def test_grid_trial_beats_or_ties_tuned_trial(tokenized, tmp_path):
+    tokens = tokenized[1][100]
+    tuned, grid = (run_trial(tokens, tmp_path / s, s, prune=2) for s in ("tuned", "grid"))
+    assert grid["perplexity"] <= tuned["perplexity"] and grid["dev_tokens"] == tuned["dev_tokens"]
+    assert tuned["trigrams"] == grid["trigrams"] > 0
+
+def row(ppl, tps):
+    return {"word_perplexity": ppl, "tokens_per_second": tps}
+
+def test_frontier():
+    rows = sweep.frontier([row(10, 100), row(12, 200), row(11, 150), row(12, 150), row(9, 50), row(10, 90),
+                           row(12, 200)])
+    assert [r["frontier"] for r in rows] == [True, True, True, False, True, False, True]
+    assert sweep.frontier([row(5, 5)])[0]["frontier"] and sweep.frontier([]) == []
@@ -2,25 +2,32 @@
 
 from collections import Counter
 from pathlib import Path
+import argparse
+import json
 import sys
 
+from corpus_format import TOKEN_CORPUS, write_token_corpus
+
 CORPUS = Path("corpus.txt")
+TOKENIZED = Path("tokenized_corpus.txt")
+MERGES = Path("bpe_merges.json")
 VOCAB_SIZE = 250
 SPECIAL = {"\uE000": "<EOS>", "\uE001": "<EOP>", "\uE002": "<EOT>"}
-sys.stdout.reconfigure(encoding="utf-8")
+WORD_START = "\u2581"  # "▁" starts the first piece of each word, so pieces can be joined back into words
 
-# Load corpus
-lines = [l.strip() for l in CORPUS.read_text(encoding="utf-8").splitlines() if l.strip()]
-freq = Counter(w for ln in lines for w in ln.split())
+def load_lines(corpus=CORPUS):
+    """Read non-empty corpus lines"""
+    return [l.strip() for l in Path(corpus).read_text(encoding="utf-8").splitlines() if l.strip()]
 
-def to_syms(w):
-    return (w,) if w.startswith("<") and w.endswith(">") else tuple(list(w))
+def is_special(w, special=SPECIAL):
+    return (w.startswith("<") and w.endswith(">")) or w in special
 
-vocab = {to_syms(w): n for w, n in freq.items()}
-symbols = {s for w in vocab for s in w}
-merges = []
+def to_syms(w, word_start="", special=SPECIAL):
+    if is_special(w, special):
+        return (w,)
+    return (word_start,) + tuple(w) if word_start else tuple(w)
 
-def pair_stats():
+def pair_stats(vocab):
     """Count occurrence of adjacent symbol pairs"""
     counts = Counter()
     for w, n in vocab.items():
@@ -28,9 +35,8 @@ def pair_stats():
             counts[(w[i], w[i + 1])] += n
     return counts
 
-def merge(pair):
+def merge(vocab, pair):
     """Merge a pair of symbols in vocabulary"""
-    global vocab
     merged = "".join(pair)
     new_vocab = {}
     for w, n in vocab.items():
@@ -43,23 +49,29 @@ def merge(pair):
                 out.append(w[i])
                 i += 1
         new_vocab[tuple(out)] = n
-    vocab = new_vocab
-
-# Learn BPE merges
-max_merges = VOCAB_SIZE - len(symbols)
-while len(merges) < max_merges:
-    stats = pair_stats()
-    if not stats:
-        break
-    best = stats.most_common(1)[0][0]
-    merges.append(best)
-    merge(best)
-
-def encode(word):
-    """Encode a word using learned BPE merges"""
-    if word.startswith("<") and word.endswith(">"):
-        return [word]
-    syms = list(word)
+    return new_vocab
+
+def learn_merges(freq, vocab_size=VOCAB_SIZE, word_start="", special=SPECIAL):
+    """Learn BPE merges from word frequencies (word_start: marker symbol prepended to each word)"""
+    vocab = {to_syms(w, word_start, special): n for w, n in freq.items()}
+    symbols = {s for w in vocab for s in w}
+    merges = []
+
+    max_merges = vocab_size - len(symbols)
+    while len(merges) < max_merges:
+        stats = pair_stats(vocab)
+        if not stats:
+            break
+        best = stats.most_common(1)[0][0]
+        merges.append(best)
+        vocab = merge(vocab, best)
+    return merges
+
+def encode(word, merges, word_start="", special=SPECIAL):
+    """Encode a word using learned BPE merges (learned with the same word_start marker)"""
+    syms = list(to_syms(word, word_start, special))
+    if len(syms) == 1:
+        return syms
     for a, b in merges:
         merged = a + b
         out, i = [], 0
@@ -73,24 +85,50 @@ def encode(word):
         syms = out
     return syms
 
-# Tokenize corpus
-token_lines = []
-for line in lines:
-    tokens = []
-    for word in line.split():
-        tokens.extend(encode(word))
-    token_lines.append(" ".join(tokens))
+def save_merges(merges, special=SPECIAL, path=MERGES, word_start=WORD_START):
+    """Write learned merges, special-token map and word-start marker so text can be encoded as in training"""
+    Path(path).write_text(json.dumps({"merges": [list(m) for m in merges], "special": special,
+                                      "word_start": word_start}, ensure_ascii=False), encoding="utf-8")
+
+def load_merges(path=MERGES):
+    """Read merges saved by tokenize(); returns (merges, special, word_start)
+
+    Files written before word-start markers have no "word_start" (""): their
+    pieces carry no word boundaries.
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [tuple(m) for m in data["merges"]], data["special"], data.get("word_start", "")
+
+def tokenize(corpus=CORPUS, vocab_size=VOCAB_SIZE, special=SPECIAL, text_out=TOKENIZED, bin_out=TOKEN_CORPUS,
+             merges_out=MERGES, word_start=WORD_START):
+    """Learn BPE on a corpus and write the tokenized corpus (text and binary) and the merges"""
+    lines = load_lines(corpus)
+    freq = Counter(w for ln in lines for w in ln.split())
+    merges = learn_merges(freq, vocab_size, word_start, special)
+
+    # Encode each distinct word once
+    pieces = {w: [special.get(t, t) for t in encode(w, merges, word_start, special)] for w in freq}
+    token_lines = [[t for word in line.split() for t in pieces[word]] for line in lines]
+    vocab = sorted({t for toks in pieces.values() for t in toks})
 
-def show(token):
-    return SPECIAL.get(token, token)
+    print(f"BPE Tokenization Complete:")
+    print(f"  Merges: {len(merges)} | Vocabulary: {len(vocab)} | Lines: {len(token_lines)}")
 
-token_lines = [" ".join(show(t) for t in ln.split()) for ln in token_lines]
-vocab_dict = {tok: i for i, tok in enumerate(sorted({show(t) for ln in token_lines for t in ln.split()}))}
+    # Save tokenized corpus
+    with open(text_out, "w", encoding="utf-8") as f:
+        for tokens in token_lines:
+            f.write(" ".join(tokens) + "\n")
 
-print(f"BPE Tokenization Complete:")
-print(f"  Merges: {len(merges)} | Vocabulary: {len(vocab_dict)} | Lines: {len(token_lines)}")
+    # Save binary token-ID corpus for training/evaluation
+    write_token_corpus(bin_out, token_lines, vocab)
+    print(f"  Token IDs → {bin_out}")
+    save_merges(merges, special, merges_out, word_start)
+    print(f"  Merges → {merges_out}")
+    return merges, vocab
 
-# Save tokenized corpus
-with open("tokenized_corpus.txt", "w", encoding="utf-8") as f:
-    for line in token_lines:
-        f.write(line + "\n")
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Learn BPE and write the tokenized corpus")
+    parser.add_argument("--corpus", default=str(CORPUS), help="e.g. corpus.dedup.txt after dedup.py")
+    args = parser.parse_args()
+    tokenize(args.corpus)
@@ -3,122 +3,138 @@
 from collections import defaultdict, Counter
 import random
 import sys
-from model import save_model
-
-sys.stdout.reconfigure(encoding="utf-8")
-
-# Load tokenized corpus
-print("[*] Loading tokenized corpus...")
-with open("tokenized_corpus.txt", "r", encoding="utf-8") as f:
-    lines = [line.strip().split() for line in f if line.strip()]
-
-print(f"    Total lines: {len(lines)}")
-
-# Split into train (90%) and dev (10%)
-n_dev = len(lines) // 10
-dev_lines = lines[:n_dev]
-train_lines = lines[n_dev:]
-
-print(f"    Train: {len(train_lines)} | Dev: {len(dev_lines)}")
-
-# Build n-gram counts from training data
-print("\n[*] Building n-gram counts...")
-
-uni_count = Counter()
-bi_count = defaultdict(int)
-tri_count = defaultdict(int)
-
-for line in train_lines:
-    for i, word in enumerate(line):
-        uni_count[word] += 1
-        if i >= 1:
-            bi_count[(line[i - 1], word)] += 1
-        if i >= 2:
-            tri_count[(line[i - 2], line[i - 1], word)] += 1
-
-total_uni = sum(uni_count.values())
-print(f"    Unigrams: {len(uni_count)} | Bigrams: {len(bi_count)} | Trigrams: {len(tri_count)}")
-
-# Calculate lambda values using dev set
-print("\n[*] Tuning lambda values...")
-
-tri_wins = bi_wins = uni_wins = 0
-
-for line in dev_lines:
-    for i in range(2, len(line)):
-        w_prev2, w_prev1, w_curr = line[i - 2], line[i - 1], line[i]
-        
-        p_tri = (tri_count[(w_prev2, w_prev1, w_curr)] / bi_count[(w_prev2, w_prev1)]) \
-            if bi_count[(w_prev2, w_prev1)] > 0 else 0
-        p_bi = (bi_count[(w_prev1, w_curr)] / uni_count[w_prev1]) \
-            if uni_count[w_prev1] > 0 else 0
-        p_uni = uni_count[w_curr] / total_uni
-        
-        max_p = max(p_tri, p_bi, p_uni)
-        if max_p == p_tri and max_p > 0:
-            tri_wins += 1
-        elif max_p == p_bi and max_p > 0:
-            bi_wins += 1
-        elif max_p == p_uni and max_p > 0:
-            uni_wins += 1
-
-total_pos = tri_wins + bi_wins + uni_wins
-lambda3 = tri_wins / total_pos if total_pos > 0 else 1/3
-lambda2 = bi_wins / total_pos if total_pos > 0 else 1/3
-lambda1 = uni_wins / total_pos if total_pos > 0 else 1/3
-
-print(f"    λ₃ (Trigram): {lambda3:.4f}")
-print(f"    λ₂ (Bigram): {lambda2:.4f}")
-print(f"    λ₁ (Unigram): {lambda1:.4f}")
-
-def generate_story(prefix="", max_length=500):
+from corpus_format import TOKEN_CORPUS, TokenCorpus
+from model import MODEL_PATH, save_model
+from ngram_counts import count_corpus, count_lines
+
+DEV_FRACTION = 0.1
+
+def split_corpus(corpus, dev_fraction=DEV_FRACTION):
+    """Split into dev (first lines) and train (rest); returns (dev_lines, train_lines)"""
+    n_dev = int(len(corpus) * dev_fraction)
+    dev_lines = [ids.tolist() for ids in corpus.lines(0, n_dev)]
+    return dev_lines, corpus.lines(n_dev)
+
+def count_ngrams(train_lines, vocab_size):
+    """Build n-gram counts from training data (keyed by token ID; see ngram_counts)"""
+    return count_lines(train_lines, vocab_size).to_dicts()
+
+def tune_lambdas(dev_lines, uni_count, bi_count, tri_count):
+    """Calculate lambda values using dev set"""
+    total_uni = sum(uni_count.values())
+    tri_wins = bi_wins = uni_wins = 0
+
+    for line in dev_lines:
+        for i in range(2, len(line)):
+            w_prev2, w_prev1, w_curr = line[i - 2], line[i - 1], line[i]
+
+            # .get: indexing the defaultdicts would insert zero counts for every unseen dev n-gram
+            bi_ab = bi_count.get((w_prev2, w_prev1), 0)
+            p_tri = tri_count.get((w_prev2, w_prev1, w_curr), 0) / bi_ab if bi_ab > 0 else 0
+            p_bi = (bi_count.get((w_prev1, w_curr), 0) / uni_count[w_prev1]) \
+                if uni_count[w_prev1] > 0 else 0
+            p_uni = uni_count[w_curr] / total_uni
+
+            max_p = max(p_tri, p_bi, p_uni)
+            if max_p == p_tri and max_p > 0:
+                tri_wins += 1
+            elif max_p == p_bi and max_p > 0:
+                bi_wins += 1
+            elif max_p == p_uni and max_p > 0:
+                uni_wins += 1
+
+    total_pos = tri_wins + bi_wins + uni_wins
+    lambda3 = tri_wins / total_pos if total_pos > 0 else 1/3
+    lambda2 = bi_wins / total_pos if total_pos > 0 else 1/3
+    lambda1 = uni_wins / total_pos if total_pos > 0 else 1/3
+    return {'lambda3': lambda3, 'lambda2': lambda2, 'lambda1': lambda1}
+
+def to_strings(vocab_list, uni_count, bi_count, tri_count):
+    """Map ID-keyed counts back to token strings for generation and saving"""
+    uni_count = Counter({vocab_list[w]: n for w, n in uni_count.items()})
+    bi_count = defaultdict(int, {(vocab_list[a], vocab_list[b]): n for (a, b), n in bi_count.items()})
+    tri_count = defaultdict(int, {tuple(vocab_list[w] for w in k): n for k, n in tri_count.items()})
+    return uni_count, bi_count, tri_count
+
+def train(corpus_path=TOKEN_CORPUS, dev_fraction=DEV_FRACTION, model_path=MODEL_PATH):
+    """Train the interpolated trigram model and save it
+
+    Returns:
+        (uni_count, bi_count, tri_count, lambdas), string-keyed
+    """
+    # Load tokenized corpus (memory-mapped token IDs)
+    print("[*] Loading tokenized corpus...")
+    corpus = TokenCorpus(corpus_path)
+    print(f"    Total lines: {len(corpus)}")
+
+    # Split into train and dev
+    dev_lines, _ = split_corpus(corpus, dev_fraction)
+    print(f"    Train: {len(corpus) - len(dev_lines)} | Dev: {len(dev_lines)}")
+
+    print("\n[*] Building n-gram counts...")
+    uni_count, bi_count, tri_count = count_corpus(corpus, len(dev_lines)).to_dicts()
+    print(f"    Unigrams: {len(uni_count)} | Bigrams: {len(bi_count)} | Trigrams: {len(tri_count)}")
+
+    print("\n[*] Tuning lambda values...")
+    lambdas = tune_lambdas(dev_lines, uni_count, bi_count, tri_count)
+    print(f"    λ₃ (Trigram): {lambdas['lambda3']:.4f}")
+    print(f"    λ₂ (Bigram): {lambdas['lambda2']:.4f}")
+    print(f"    λ₁ (Unigram): {lambdas['lambda1']:.4f}")
+
+    uni_count, bi_count, tri_count = to_strings(corpus.vocab, uni_count, bi_count, tri_count)
+
+    print("\n" + "=" * 70)
+    print("MODEL TRAINING COMPLETE")
+    print("=" * 70)
+    print(f"Vocabulary Size: {len(uni_count)}")
+
+    # Save model
+    print("\n[*] Saving model...")
+    save_model(uni_count, bi_count, tri_count, lambdas, set(uni_count.keys()), path=model_path)
+    print("=" * 70)
+    return uni_count, bi_count, tri_count, lambdas
+
+def generate_story(uni_count, bi_count, tri_count, lambdas, prefix="", max_length=500):
     """Generate story using interpolated trigram model"""
+    lambda3, lambda2, lambda1 = lambdas['lambda3'], lambdas['lambda2'], lambdas['lambda1']
+    total_uni = sum(uni_count.values())
     tokens = prefix.split() if prefix else []
-    
+
     if not tokens:
-        tokens.append(random.choices(list(uni_count.keys()), 
+        tokens.append(random.choices(list(uni_count.keys()),
                                     weights=[uni_count[t] for t in uni_count])[0])
-    
+
     for _ in range(max_length):
         if len(tokens) < 2:
-            next_tok = random.choices(list(uni_count.keys()), 
+            next_tok = random.choices(list(uni_count.keys()),
                                      weights=[uni_count[t] for t in uni_count])[0]
         else:
             w_prev2, w_prev1 = tokens[-2], tokens[-1]
             probs = {}
-            
+
             for w_curr in uni_count.keys():
                 p_tri = (tri_count[(w_prev2, w_prev1, w_curr)] / bi_count[(w_prev2, w_prev1)]) \
                     if bi_count[(w_prev2, w_prev1)] > 0 else 0
                 p_bi = (bi_count[(w_prev1, w_curr)] / uni_count[w_prev1]) \
                     if uni_count[w_prev1] > 0 else 0
                 p_uni = uni_count[w_curr] / total_uni
-                
+
                 probs[w_curr] = lambda3 * p_tri + lambda2 * p_bi + lambda1 * p_uni
-            
+
             total_prob = sum(probs.values())
             if total_prob > 0:
                 probs = {w: p / total_prob for w, p in probs.items()}
                 next_tok = random.choices(list(probs.keys()), weights=list(probs.values()))[0]
             else:
-                next_tok = random.choices(list(uni_count.keys()), 
+                next_tok = random.choices(list(uni_count.keys()),
                                          weights=[uni_count[t] for t in uni_count])[0]
-        
+
         tokens.append(next_tok)
         if next_tok == "<EOT>":
             break
-    
+
     return " ".join(tokens)
 
 if __name__ == "__main__":
-    print("\n" + "=" * 70)
-    print("MODEL TRAINING COMPLETE")
-    print("=" * 70)
-    print(f"Vocabulary Size: {len(uni_count)}")
-    
-    # Save model
-    print("\n[*] Saving model...")
-    save_model(uni_count, bi_count, tri_count, 
-               {'lambda3': lambda3, 'lambda2': lambda2, 'lambda1': lambda1},
-               set(uni_count.keys()))
-    print("=" * 70)
+    sys.stdout.reconfigure(encoding="utf-8")
+    train()